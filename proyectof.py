@@ -2,18 +2,39 @@
 # Proyecto de Árboles - Estructura de Datos
 # Días 1-11 completos: Árbol general, Trie, Papelera, Interfaz, Pruebas de Integración
 
+import csv
+import gc
+import io
 import json
+import atexit
+import hashlib
 import uuid
+import weakref
+import zlib
 import os
+import platform
 import shutil
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import struct
 import sys
+import tempfile
+import threading
 import time
+import tracemalloc
 import random
 import string
+import re
+import fnmatch
 import statistics
-from datetime import datetime
-from typing import Optional, Dict, Any, List, Set, Tuple, Callable
-from collections import defaultdict, deque
+import math
+import heapq
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable, Iterable
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager, ContextDecorator, redirect_stdout, redirect_stderr
+from itertools import islice, accumulate
 from enum import Enum
 
 # ==================== CONSTANTES Y CONFIGURACIÓN ====================
@@ -44,73 +65,455 @@ class ErrorType(Enum):
 
 # ==================== ESTRUCTURA TRIE ====================
 class TrieNode:
-    def __init__(self):
-        self.children = {}
-        self.is_end_of_word = False
-        self.node_ids = set()
+    """Nodo de un trie comprimido (radix): la arista entrante guarda un fragmento de la clave."""
+    __slots__ = ("label", "children", "node_ids", "count")
+    
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.children = None    # primer carácter -> TrieNode, se crea al primer hijo
+        self.node_ids = None    # solo los nodos terminales tienen conjunto de ids
+        self.count = 0          # ids en todo el subárbol
+    
+    @property
+    def is_end_of_word(self) -> bool:
+        return bool(self.node_ids)
 
 class Trie:
+    ORDEN_LEXICOGRAFICO = "lexicografico"
+    ORDEN_POPULARIDAD = "popularidad"
+    
     def __init__(self):
         self.root = TrieNode()
     
-    def insert(self, palabra: str, node_id: str):
+    def __len__(self):
+        return self.root.count
+    
+    def _camino(self, clave: str) -> Optional[List[TrieNode]]:
+        """Nodos desde la raíz hasta el nodo que representa exactamente `clave`."""
         nodo = self.root
-        for char in palabra.lower():
-            if char not in nodo.children:
-                nodo.children[char] = TrieNode()
-            nodo = nodo.children[char]
-        nodo.is_end_of_word = True
-        nodo.node_ids.add(node_id)
+        camino = [nodo]
+        i = 0
+        while i < len(clave):
+            hijo = nodo.children.get(clave[i]) if nodo.children else None
+            if hijo is None or not clave.startswith(hijo.label, i):
+                return None
+            nodo = hijo
+            camino.append(nodo)
+            i += len(hijo.label)
+        return camino
     
-    def search_exact(self, palabra: str) -> Set[str]:
+    def _localizar_prefijo(self, prefijo: str) -> Tuple[Optional[TrieNode], str]:
+        """Devuelve el nodo más alto cuyo subárbol contiene todas las claves con `prefijo` y su clave."""
         nodo = self.root
-        for char in palabra.lower():
-            if char not in nodo.children:
-                return set()
-            nodo = nodo.children[char]
-        return nodo.node_ids if nodo.is_end_of_word else set()
+        i = 0
+        while i < len(prefijo):
+            hijo = nodo.children.get(prefijo[i]) if nodo.children else None
+            if hijo is None:
+                return None, ""
+            label = hijo.label
+            restante = len(prefijo) - i
+            if restante < len(label):
+                if label.startswith(prefijo[i:]):
+                    return hijo, prefijo[:i] + label
+                return None, ""
+            if not prefijo.startswith(label, i):
+                return None, ""
+            nodo = hijo
+            i += len(label)
+        return nodo, prefijo
     
-    def search_prefix(self, prefijo: str) -> Set[str]:
+    def insert(self, palabra: str, node_id: str):
+        self.insert_many(palabra, (node_id,))
+    
+    def insert_many(self, palabra: str, node_ids: Iterable[str]) -> int:
+        """Asocia varios ids a `palabra` recorriendo el trie una sola vez; devuelve cuántos eran nuevos."""
+        clave = palabra.lower()
         nodo = self.root
-        for char in prefijo.lower():
-            if char not in nodo.children:
-                return set()
-            nodo = nodo.children[char]
+        camino = [nodo]
+        i = 0
+        while i < len(clave):
+            if nodo.children is None:
+                nodo.children = {}
+            hijo = nodo.children.get(clave[i])
+            if hijo is None:
+                hijo = TrieNode(clave[i:])
+                nodo.children[clave[i]] = hijo
+                camino.append(hijo)
+                nodo = hijo
+                break
+            
+            label = hijo.label
+            limite = min(len(label), len(clave) - i)
+            j = 1
+            while j < limite and label[j] == clave[i + j]:
+                j += 1
+            
+            if j < len(label):
+                # Partir la arista: el prefijo común pasa a un nodo intermedio
+                intermedio = TrieNode(label[:j])
+                intermedio.count = hijo.count
+                hijo.label = label[j:]
+                intermedio.children = {hijo.label[0]: hijo}
+                nodo.children[clave[i]] = intermedio
+                hijo = intermedio
+            
+            nodo = hijo
+            camino.append(nodo)
+            i += j
         
+        if nodo.node_ids is None:
+            nodo.node_ids = set()
+        antes = len(nodo.node_ids)
+        nodo.node_ids.update(node_ids)
+        nuevos = len(nodo.node_ids) - antes
+        if nuevos:
+            for visitado in camino:
+                visitado.count += nuevos
+        return nuevos
+    
+    def search_exact(self, palabra: str) -> Set[str]:
+        camino = self._camino(palabra.lower())
+        if camino is None or not camino[-1].node_ids:
+            return set()
+        return camino[-1].node_ids
+    
+    def search_prefix(self, prefijo: str) -> Set[str]:
+        nodo, _ = self._localizar_prefijo(prefijo.lower())
         ids = set()
-        self._collect_ids(nodo, ids)
+        if nodo is None:
+            return ids
+        pila = [nodo]
+        while pila:
+            actual = pila.pop()
+            if actual.node_ids:
+                ids.update(actual.node_ids)
+            if actual.children:
+                pila.extend(actual.children.values())
         return ids
     
-    def _collect_ids(self, nodo: TrieNode, ids: Set[str]):
-        if nodo.is_end_of_word:
-            ids.update(nodo.node_ids)
-        for child in nodo.children.values():
-            self._collect_ids(child, ids)
+    def top_k(self, prefijo: str, k: int, orden: str = ORDEN_LEXICOGRAFICO) -> List[Tuple[str, Set[str]]]:
+        """Primeras `k` claves distintas con `prefijo`, sin recorrer el resto del subárbol."""
+        if k <= 0:
+            return []
+        nodo, clave = self._localizar_prefijo(prefijo.lower())
+        if nodo is None or nodo.count == 0:
+            return []
+        
+        if orden == self.ORDEN_POPULARIDAD:
+            return self._top_k_popularidad(nodo, clave, k)
+        if orden != self.ORDEN_LEXICOGRAFICO:
+            raise ValueError(f"Orden desconocido: {orden}")
+        
+        resultados = []
+        pila = [(nodo, clave)]
+        while pila:
+            actual, clave_actual = pila.pop()
+            if actual.node_ids:
+                resultados.append((clave_actual, actual.node_ids))
+                if len(resultados) >= k:
+                    break
+            if actual.children:
+                for letra in sorted(actual.children, reverse=True):
+                    hijo = actual.children[letra]
+                    if hijo.count:
+                        pila.append((hijo, clave_actual + hijo.label))
+        return resultados
+    
+    def _top_k_popularidad(self, nodo: TrieNode, clave: str, k: int) -> List[Tuple[str, Set[str]]]:
+        # Búsqueda por el mejor primero: el contador de un subárbol acota el de cualquier
+        # clave que contenga, así que al sacar una clave del heap ninguna pendiente la supera.
+        resultados = []
+        heap = [(-nodo.count, 1, clave, nodo)]
+        while heap and len(resultados) < k:
+            _, es_subarbol, clave_actual, actual = heapq.heappop(heap)
+            if not es_subarbol:
+                resultados.append((clave_actual, actual.node_ids))
+                continue
+            if actual.node_ids:
+                heapq.heappush(heap, (-len(actual.node_ids), 0, clave_actual, actual))
+            if actual.children:
+                for hijo in actual.children.values():
+                    if hijo.count:
+                        heapq.heappush(heap, (-hijo.count, 1, clave_actual + hijo.label, hijo))
+        return resultados
+    
+    def search_fuzzy(self, palabra: str, max_distancia: int) -> List[Tuple[str, int, Set[str]]]:
+        """Claves a distancia de Levenshtein <= `max_distancia`, ordenadas por distancia.
+        
+        Cada nodo extiende la fila de programación dinámica de su padre con los
+        caracteres de su arista; si todos los valores superan la cota se poda la rama.
+        """
+        objetivo = palabra.lower()
+        primera_fila = list(range(len(objetivo) + 1))
+        resultados = []
+        if self.root.node_ids and primera_fila[-1] <= max_distancia:
+            resultados.append(("", primera_fila[-1], self.root.node_ids))
+        
+        pila = [(hijo, hijo.label, primera_fila) for hijo in (self.root.children or {}).values()]
+        while pila:
+            nodo, clave, fila = pila.pop()
+            for letra in nodo.label:
+                nueva = [fila[0] + 1]
+                for j in range(1, len(objetivo) + 1):
+                    coste = 0 if objetivo[j - 1] == letra else 1
+                    nueva.append(min(nueva[j - 1] + 1, fila[j] + 1, fila[j - 1] + coste))
+                fila = nueva
+                if min(fila) > max_distancia:
+                    break
+            else:
+                if nodo.node_ids and fila[-1] <= max_distancia:
+                    resultados.append((clave, fila[-1], nodo.node_ids))
+                if nodo.children:
+                    pila.extend((hijo, clave + hijo.label, fila) for hijo in nodo.children.values())
+        
+        resultados.sort(key=lambda r: (r[1], r[0]))
+        return resultados
     
     def delete(self, palabra: str, node_id: str) -> bool:
-        nodo = self.root
-        for char in palabra.lower():
-            if char not in nodo.children:
-                return False
-            nodo = nodo.children[char]
+        return self.delete_many(palabra, (node_id,)) > 0
+    
+    def delete_many(self, palabra: str, node_ids: Iterable[str]) -> int:
+        """Quita varios ids de `palabra` con un solo recorrido y una sola poda; devuelve cuántos había."""
+        camino = self._camino(palabra.lower())
+        if camino is None:
+            return 0
         
-        if nodo.is_end_of_word and node_id in nodo.node_ids:
-            nodo.node_ids.remove(node_id)
+        nodo = camino[-1]
+        if not nodo.node_ids:
+            return 0
+        antes = len(nodo.node_ids)
+        nodo.node_ids.difference_update(node_ids)
+        quitados = antes - len(nodo.node_ids)
+        if quitados:
             if not nodo.node_ids:
-                nodo.is_end_of_word = False
-            return True
-        return False
+                nodo.node_ids = None
+            for visitado in camino:
+                visitado.count -= quitados
+            self._podar(camino)
+        return quitados
+    
+    def _podar(self, camino: List[TrieNode]):
+        """Quita las ramas muertas al final de `camino` y fusiona el nodo que quede con un solo hijo."""
+        for idx in range(len(camino) - 1, 0, -1):
+            actual = camino[idx]
+            if actual.node_ids:
+                return
+            if not actual.children:
+                padre = camino[idx - 1]
+                del padre.children[actual.label[0]]
+                if not padre.children:
+                    padre.children = None
+                continue
+            if len(actual.children) == 1:
+                self._fusionar(actual)
+            return
+    
+    @staticmethod
+    def _fusionar(nodo: TrieNode):
+        (hijo,) = nodo.children.values()
+        nodo.label += hijo.label
+        nodo.children = hijo.children
+        nodo.node_ids = hijo.node_ids
+    
+    def compact(self) -> Dict[str, int]:
+        """Poda ramas sin ids y fusiona cadenas de un solo hijo; devuelve lo recuperado."""
+        antes = self.stats()
+        pila = [self.root]
+        while pila:
+            nodo = pila.pop()
+            if not nodo.children:
+                nodo.children = None
+                continue
+            for letra in [l for l, hijo in nodo.children.items() if hijo.count == 0]:
+                del nodo.children[letra]
+            for hijo in nodo.children.values():
+                while not hijo.node_ids and hijo.children and len(hijo.children) == 1:
+                    self._fusionar(hijo)
+                pila.append(hijo)
+            if not nodo.children:
+                nodo.children = None
+        despues = self.stats()
+        despues["nodos_liberados"] = antes["nodos"] - despues["nodos"]
+        despues["bytes_liberados"] = antes["bytes_estimados"] - despues["bytes_estimados"]
+        return despues
+    
+    def stats(self) -> Dict[str, int]:
+        """Número de nodos, claves e ids del trie y una estimación de los bytes que ocupa."""
+        nodos = claves = 0
+        total_bytes = 0
+        pila = [self.root]
+        while pila:
+            nodo = pila.pop()
+            nodos += 1
+            total_bytes += sys.getsizeof(nodo) + sys.getsizeof(nodo.label)
+            if nodo.node_ids:
+                claves += 1
+                total_bytes += sys.getsizeof(nodo.node_ids)
+            if nodo.children:
+                total_bytes += sys.getsizeof(nodo.children)
+                pila.extend(nodo.children.values())
+        return {
+            "nodos": nodos,
+            "claves": claves,
+            "ids": self.root.count,
+            "bytes_estimados": total_bytes
+        }
     
     def update(self, viejo_nombre: str, nuevo_nombre: str, node_id: str):
         self.delete(viejo_nombre, node_id)
         self.insert(nuevo_nombre, node_id)
 
+# ==================== ÍNDICE DE N-GRAMAS ====================
+class IndiceNgramas:
+    """Índice de trigramas sobre nombres para búsquedas por subcadena y glob."""
+    N = 3
+    _COMODINES = re.compile(r"\*|\?|\[[^\]]*\]")
+    
+    def __init__(self):
+        self.ngramas = defaultdict(set)     # trigrama en minúsculas -> nombres que lo contienen
+        self.nombres = set()
+    
+    @classmethod
+    def _trigramas(cls, texto: str) -> Set[str]:
+        return {texto[i:i + cls.N] for i in range(len(texto) - cls.N + 1)}
+    
+    def agregar(self, nombre: str):
+        if nombre not in self.nombres:
+            self.nombres.add(nombre)
+            for trigrama in self._trigramas(nombre.lower()):
+                self.ngramas[trigrama].add(nombre)
+    
+    def eliminar(self, nombre: str):
+        if nombre in self.nombres:
+            self.nombres.discard(nombre)
+            for trigrama in self._trigramas(nombre.lower()):
+                nombres = self.ngramas.get(trigrama)
+                if nombres is not None:
+                    nombres.discard(nombre)
+                    if not nombres:
+                        del self.ngramas[trigrama]
+    
+    def _candidatos(self, literales: List[str]):
+        """Nombres que contienen todos los trigramas de `literales`, o todos si no hay trigramas."""
+        trigramas = set()
+        for literal in literales:
+            trigramas |= self._trigramas(literal.lower())
+        if not trigramas:
+            return self.nombres
+        
+        listas = sorted((self.ngramas.get(t, ()) for t in trigramas), key=len)
+        if not listas[0]:
+            return ()
+        candidatos = set(listas[0])
+        for nombres in listas[1:]:
+            candidatos &= nombres
+            if not candidatos:
+                break
+        return candidatos
+    
+    @staticmethod
+    def es_glob(patron: str) -> bool:
+        return any(c in patron for c in "*?[")
+    
+    def buscar(self, patron: str, sensible_mayusculas: bool = False):
+        """Genera los nombres que contienen `patron` o, si es un glob, que encajan completos en él."""
+        if self.es_glob(patron):
+            regex = re.compile(fnmatch.translate(patron), 0 if sensible_mayusculas else re.IGNORECASE)
+            for nombre in self._candidatos(self._COMODINES.split(patron)):
+                if regex.match(nombre):
+                    yield nombre
+            return
+        
+        if sensible_mayusculas:
+            for nombre in self._candidatos([patron]):
+                if patron in nombre:
+                    yield nombre
+        else:
+            patron_lower = patron.lower()
+            for nombre in self._candidatos([patron]):
+                if patron_lower in nombre.lower():
+                    yield nombre
+
+# ==================== ÍNDICE DE CONTENIDO ====================
+class IndiceContenido:
+    """Índice invertido con posiciones sobre el contenido de los archivos."""
+    _TOKEN = re.compile(r"\w+")
+    _CONSULTA = re.compile(r'"([^"]*)"|(\S+)')
+    
+    def __init__(self):
+        self.postings = defaultdict(dict)   # término -> {id de archivo: [posiciones]}
+        self.longitudes = {}                # id de archivo -> número de términos
+    
+    @classmethod
+    def tokenizar(cls, texto: str) -> List[str]:
+        return [t.lower() for t in cls._TOKEN.findall(texto)]
+    
+    def agregar(self, id_nodo: str, texto: str):
+        terminos = self.tokenizar(texto)
+        if not terminos or id_nodo in self.longitudes:
+            return
+        self.longitudes[id_nodo] = len(terminos)
+        for posicion, termino in enumerate(terminos):
+            self.postings[termino].setdefault(id_nodo, []).append(posicion)
+    
+    def eliminar(self, id_nodo: str, texto: str):
+        if self.longitudes.pop(id_nodo, None) is None:
+            return
+        for termino in set(self.tokenizar(texto)):
+            documentos = self.postings.get(termino)
+            if documentos is not None:
+                documentos.pop(id_nodo, None)
+                if not documentos:
+                    del self.postings[termino]
+    
+    @staticmethod
+    def _contiene_frase(posiciones: List[List[int]]) -> bool:
+        siguientes = set(posiciones[0])
+        for desplazamiento, lista in enumerate(posiciones[1:], start=1):
+            presentes = set(lista)
+            siguientes = {p for p in siguientes if p + desplazamiento in presentes}
+            if not siguientes:
+                return False
+        return True
+    
+    def buscar(self, consulta: str, limite: int = 10) -> List[Tuple[str, float]]:
+        """Archivos que contienen todos los términos y frases (entre comillas) de `consulta`, por relevancia."""
+        frases = []
+        terminos = set()
+        for frase, palabra in self._CONSULTA.findall(consulta):
+            tokens = self.tokenizar(frase if frase else palabra)
+            terminos.update(tokens)
+            if frase and len(tokens) > 1:
+                frases.append(tokens)
+        if not terminos:
+            return []
+        
+        listas = sorted((self.postings.get(t, {}) for t in terminos), key=len)
+        candidatos = set(listas[0])
+        if not candidatos:
+            return []
+        for documentos in listas[1:]:
+            candidatos &= documentos.keys()
+            if not candidatos:
+                return []
+        
+        total = len(self.longitudes)
+        idf = {t: math.log(1 + total / len(self.postings[t])) for t in terminos}
+        puntuados = []
+        for id_nodo in candidatos:
+            if not all(self._contiene_frase([self.postings[t][id_nodo] for t in frase]) for frase in frases):
+                continue
+            puntuacion = sum(len(self.postings[t][id_nodo]) * idf[t] for t in terminos)
+            puntuados.append((id_nodo, puntuacion / math.sqrt(self.longitudes[id_nodo])))
+        return heapq.nlargest(limite, puntuados, key=lambda par: par[1])
+
 # ==================== PAPELERA TEMPORAL ====================
 class TrashItem:
-    def __init__(self, nodo, ruta_original, fecha_eliminacion):
+    def __init__(self, nodo, ruta_original, fecha_eliminacion, id_padre=None):
         self.nodo = nodo
         self.ruta_original = ruta_original
         self.fecha_eliminacion = fecha_eliminacion
+        self.id_padre = id_padre  # carpeta de la que salió, para restaurar sin recorrer la ruta
         self.id = str(uuid.uuid4())
     
     def to_dict(self):
@@ -118,33 +521,76 @@ class TrashItem:
             "id": self.id,
             "nodo": self.nodo.to_dict(),
             "ruta_original": self.ruta_original,
-            "fecha_eliminacion": self.fecha_eliminacion
+            "fecha_eliminacion": self.fecha_eliminacion,
+            "id_padre": self.id_padre
         }
     
     @staticmethod
     def from_dict(data):
         nodo = Nodo.from_dict(data["nodo"])
-        item = TrashItem(nodo, data["ruta_original"], data["fecha_eliminacion"])
+        item = TrashItem(nodo, data["ruta_original"], data["fecha_eliminacion"], data.get("id_padre"))
         item.id = data["id"]
         return item
 
 class TrashBin:
+    """Papelera con desalojo O(1), índices por id y ruta, y persistencia por lotes.
+    
+    En disco hay una instantánea (`trash.json`) y un registro de cambios de
+    solo-añadir (`trash.json.log`). Los cambios se acumulan en memoria y se
+    escriben juntos; el registro se pliega en la instantánea cuando crece.
+    Lo que quede pendiente se escribe al salir del intérprete.
+    """
+    
+    _abiertas = weakref.WeakSet()
+    _gancho_instalado = False
+    
+    @classmethod
+    def guardar_todas(cls):
+        for papelera in list(cls._abiertas):
+            papelera.guardar(forzar=True)
+    
     def __init__(self, capacidad_maxima=100):
-        self.items = []
+        self.items = OrderedDict()      # id -> TrashItem, del más antiguo al más reciente
+        self._por_ruta = defaultdict(list)
         self.capacidad_maxima = capacidad_maxima
         self.archivo_trash = "trash.json"
+        self.tamano_lote = 100
+        self._pendientes = []
+        self._registros_en_log = 0
+        TrashBin._abiertas.add(self)
+        if not TrashBin._gancho_instalado:
+            TrashBin._gancho_instalado = True
+            atexit.register(TrashBin.guardar_todas)
+    
+    @property
+    def archivo_log(self) -> str:
+        return self.archivo_trash + ".log"
+    
+    def _indexar(self, item: TrashItem):
+        self.items[item.id] = item
+        self._por_ruta[item.ruta_original].append(item.id)
+    
+    def _desindexar(self, item: TrashItem):
+        ids = self._por_ruta[item.ruta_original]
+        ids.remove(item.id)
+        if not ids:
+            del self._por_ruta[item.ruta_original]
     
     def agregar(self, nodo: 'Nodo', ruta_original: str):
         if len(self.items) >= self.capacidad_maxima:
-            self.items.pop(0)
+            _, desalojado = self.items.popitem(last=False)
+            self._desindexar(desalojado)
+            self._pendientes.append({"op": "del", "id": desalojado.id})
         
-        item = TrashItem(nodo, ruta_original, datetime.now().isoformat())
-        self.items.append(item)
+        item = TrashItem(nodo, ruta_original, datetime.now().isoformat(),
+                         nodo.parent.id if nodo.parent else None)
+        self._indexar(item)
+        self._pendientes.append({"op": "add", "item": item.to_dict()})
         return item
     
     def listar(self) -> List[Dict[str, Any]]:
         resultado = []
-        for i, item in enumerate(self.items):
+        for i, item in enumerate(self.items.values()):
             resultado.append({
                 "indice": i,
                 "nombre": item.nodo.nombre,
@@ -155,116 +601,1147 @@ class TrashBin:
             })
         return resultado
     
-    def restaurar(self, indice: int) -> Optional[Tuple['Nodo', str]]:
+    def restaurar(self, indice: int) -> Optional[TrashItem]:
         if 0 <= indice < len(self.items):
-            item = self.items.pop(indice)
-            return item.nodo, item.ruta_original
+            return self.restaurar_por_id(next(islice(self.items, indice, None)))
         return None
     
+    def restaurar_por_id(self, id_item: str) -> Optional[TrashItem]:
+        item = self.items.pop(id_item, None)
+        if item is None:
+            return None
+        self._desindexar(item)
+        self._pendientes.append({"op": "del", "id": item.id})
+        return item
+    
+    def restaurar_por_ruta(self, ruta_original: str) -> Optional[TrashItem]:
+        """Restaura el elemento más reciente que se eliminó desde `ruta_original`."""
+        ids = self._por_ruta.get(ruta_original)
+        if not ids:
+            return None
+        return self.restaurar_por_id(ids[-1])
+    
     def vaciar(self):
         self.items.clear()
+        self._por_ruta.clear()
+        self._pendientes = [{"op": "clear"}]
     
-    def guardar(self):
+    def marcar(self):
+        """Copia barata del estado en memoria (a lo sumo `capacidad_maxima` elementos) para `revertir`."""
+        return (OrderedDict(self.items), {ruta: list(ids) for ruta, ids in self._por_ruta.items()},
+                list(self._pendientes))
+    
+    def revertir(self, marca):
+        items, por_ruta, pendientes = marca
+        self.items = OrderedDict(items)
+        self._por_ruta = defaultdict(list, por_ruta)
+        self._pendientes = pendientes
+    
+    def guardar(self, forzar: bool = False):
+        """Escribe los cambios pendientes si llenan un lote (o siempre con `forzar`)."""
+        if not self._pendientes or (not forzar and len(self._pendientes) < self.tamano_lote):
+            return
+        try:
+            if any(registro["op"] == "clear" for registro in self._pendientes) \
+                    or self._registros_en_log > 2 * len(self.items) + self.tamano_lote:
+                self.compactar()
+                return
+            with open(self.archivo_log, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(registro) + "\n" for registro in self._pendientes))
+            self._registros_en_log += len(self._pendientes)
+            self._pendientes.clear()
+        except Exception:
+            pass
+    
+    def compactar(self):
+        """Reescribe la instantánea con el contenido actual y vacía el registro de cambios."""
         datos = {
             "capacidad_maxima": self.capacidad_maxima,
-            "items": [item.to_dict() for item in self.items]
+            "items": [item.to_dict() for item in self.items.values()]
         }
         try:
             with open(self.archivo_trash, "w", encoding="utf-8") as f:
-                json.dump(datos, f, indent=2)
+                json.dump(datos, f)
+            if os.path.exists(self.archivo_log):
+                os.remove(self.archivo_log)
+            self._registros_en_log = 0
+            self._pendientes.clear()
         except Exception:
             pass
     
     def cargar(self):
+        self.items = OrderedDict()
+        self._por_ruta = defaultdict(list)
+        self._pendientes = []
+        self._registros_en_log = 0
         try:
             if os.path.exists(self.archivo_trash):
                 with open(self.archivo_trash, "r", encoding="utf-8") as f:
                     datos = json.load(f)
                 self.capacidad_maxima = datos.get("capacidad_maxima", 100)
-                self.items = [TrashItem.from_dict(item) for item in datos.get("items", [])]
+                for item in datos.get("items", []):
+                    self._indexar(TrashItem.from_dict(item))
+            
+            if os.path.exists(self.archivo_log):
+                with open(self.archivo_log, "r", encoding="utf-8") as f:
+                    for linea in f:
+                        try:
+                            registro = json.loads(linea)
+                        except json.JSONDecodeError:
+                            break
+                        self._registros_en_log += 1
+                        if registro["op"] == "add":
+                            self._indexar(TrashItem.from_dict(registro["item"]))
+                        elif registro["op"] == "del" and registro["id"] in self.items:
+                            self._desindexar(self.items.pop(registro["id"]))
         except Exception:
-            self.items = []
+            self.items = OrderedDict()
+            self._por_ruta = defaultdict(list)
 
 # ==================== NODO ====================
+_TIPOS = {tipo.value: tipo.value for tipo in NodeType}
+
+class Agregados:
+    """Totales del subárbol de una carpeta, mantenidos al enlazar y desenlazar hijos.
+    
+    `hash_bloque` es el hash del último backup de la carpeta; cualquier cambio
+    debajo lo borra en ella y en sus ancestros.
+    """
+    __slots__ = ("tamano", "altura", "carpetas", "archivos", "bytes_contenido", "alturas_hijos",
+                 "hash_bloque")
+    
+    def __init__(self):
+        self.tamano = 1
+        self.altura = 0
+        self.carpetas = 1
+        self.archivos = 0
+        self.bytes_contenido = 0
+        self.alturas_hijos = {}     # altura de un hijo -> cuántos hijos la tienen
+        self.hash_bloque = None
+
 class Nodo:
+    __slots__ = ("id", "nombre", "tipo", "contenido", "_hijos", "_orden", "parent", "_agregados", "_ruta")
+    
+    RECORRIDO_PREORDEN = "preorden"
+    RECORRIDO_POSTORDEN = "postorden"
+    RECORRIDO_NIVELES = "niveles"
+    RECORRIDOS = (RECORRIDO_PREORDEN, RECORRIDO_POSTORDEN, RECORRIDO_NIVELES)
+    
     def __init__(self, id_nodo, nombre, tipo, contenido=None):
         self.id = id_nodo
-        self.nombre = nombre
-        self.tipo = tipo
+        self.nombre = sys.intern(nombre)
+        self.tipo = _TIPOS.get(tipo, tipo)   # siempre el mismo objeto str por tipo
         self.contenido = contenido
-        self.children = []
+        self._hijos = None  # nombre -> hijo en orden de inserción, creado con el primer hijo
+        self._orden = None  # id -> hijo en orden de listado, solo tras renombrar un hijo que no es el último
         self.parent = None
+        self._agregados = Agregados() if self.tipo == NodeType.FOLDER.value else None
+        self._ruta = None   # ruta absoluta cacheada por SistemaArchivos
     
-    def to_dict(self):
-        nodo_dict = {
+    @property
+    def children(self):
+        if self._orden is not None:
+            return self._orden.values()
+        return self._hijos.values() if self._hijos else ()
+    
+    # ==================== RECORRIDOS ====================
+    def recorrer(self, orden: str = RECORRIDO_PREORDEN):
+        """Genera los nodos del subárbol en preorden, postorden o por niveles.
+        
+        Usa una pila o cola explícita, así que la profundidad del árbol no
+        está limitada por la recursión de Python.
+        """
+        if orden == Nodo.RECORRIDO_PREORDEN:
+            pila = [self]
+            while pila:
+                nodo = pila.pop()
+                yield nodo
+                if nodo.tipo == NodeType.FOLDER.value:
+                    pila.extend(reversed(nodo.children))
+        elif orden == Nodo.RECORRIDO_POSTORDEN:
+            pila = [(self, False)]
+            while pila:
+                nodo, expandido = pila.pop()
+                if expandido or nodo.tipo != NodeType.FOLDER.value or not nodo.children:
+                    yield nodo
+                else:
+                    pila.append((nodo, True))
+                    pila.extend((hijo, False) for hijo in reversed(nodo.children))
+        elif orden == Nodo.RECORRIDO_NIVELES:
+            cola = deque([self])
+            while cola:
+                nodo = cola.popleft()
+                yield nodo
+                if nodo.tipo == NodeType.FOLDER.value:
+                    cola.extend(nodo.children)
+        else:
+            raise ValueError(f"orden de recorrido desconocido '{orden}'")
+    
+    def recorrer_con_rutas(self, orden: str = RECORRIDO_PREORDEN, ruta: str = ""):
+        """Como `recorrer`, pero genera pares (nodo, ruta) siendo `ruta` la de este nodo.
+    
+        Las rutas viajan en la pila o cola del recorrido: no se cachean en los
+        nodos ni se guarda una por cada nodo del árbol.
+        """
+        if orden == Nodo.RECORRIDO_PREORDEN:
+            pila = [(self, ruta)]
+            while pila:
+                nodo, ruta_nodo = pila.pop()
+                yield nodo, ruta_nodo
+                if nodo.tipo == NodeType.FOLDER.value:
+                    pila.extend((hijo, f"{ruta_nodo}/{hijo.nombre}") for hijo in reversed(nodo.children))
+        elif orden == Nodo.RECORRIDO_POSTORDEN:
+            pila = [(self, ruta, False)]
+            while pila:
+                nodo, ruta_nodo, expandido = pila.pop()
+                if expandido or nodo.tipo != NodeType.FOLDER.value or not nodo.children:
+                    yield nodo, ruta_nodo
+                else:
+                    pila.append((nodo, ruta_nodo, True))
+                    pila.extend((hijo, f"{ruta_nodo}/{hijo.nombre}", False) for hijo in reversed(nodo.children))
+        elif orden == Nodo.RECORRIDO_NIVELES:
+            cola = deque([(self, ruta)])
+            while cola:
+                nodo, ruta_nodo = cola.popleft()
+                yield nodo, ruta_nodo
+                if nodo.tipo == NodeType.FOLDER.value:
+                    cola.extend((hijo, f"{ruta_nodo}/{hijo.nombre}") for hijo in nodo.children)
+        else:
+            raise ValueError(f"orden de recorrido desconocido '{orden}'")
+    
+    def _dict_propio(self):
+        return {
             "id": self.id,
             "nombre": self.nombre,
             "tipo": self.tipo,
             "contenido": self.contenido,
         }
-        if self.tipo == NodeType.FOLDER.value:
-            nodo_dict["children"] = [child.to_dict() for child in self.children]
-        return nodo_dict
+    
+    def to_dict(self):
+        raiz = self._dict_propio()
+        pila = [(self, raiz)]
+        while pila:
+            nodo, nodo_dict = pila.pop()
+            if nodo.tipo == NodeType.FOLDER.value:
+                hijos = nodo_dict["children"] = []
+                for child in nodo.children:
+                    child_dict = child._dict_propio()
+                    hijos.append(child_dict)
+                    pila.append((child, child_dict))
+        return raiz
     
     @staticmethod
     def from_dict(data, parent=None):
-        nodo = Nodo(data["id"], data["nombre"], data["tipo"], data["contenido"])
-        nodo.parent = parent
-        if nodo.tipo == NodeType.FOLDER.value:
-            nodo.children = [Nodo.from_dict(child, parent=nodo) for child in data.get("children", [])]
-        return nodo
+        raiz = Nodo(data["id"], data["nombre"], data["tipo"], data["contenido"])
+        # Postorden: cada carpeta enlaza a sus hijos cuando ya están completos y
+        # antes de tener padre ella misma, así los agregados solo suben un nivel.
+        pila = [(data, raiz, None)]
+        while pila:
+            nodo_dict, nodo, hijos = pila.pop()
+            if hijos is not None:
+                for hijo in hijos:
+                    nodo.agregar_hijo(hijo)
+            elif nodo.tipo == NodeType.FOLDER.value and nodo_dict.get("children"):
+                pares = [(child, Nodo(child["id"], child["nombre"], child["tipo"], child["contenido"]))
+                         for child in nodo_dict["children"]]
+                pila.append((nodo_dict, nodo, [hijo for _, hijo in pares]))
+                pila.extend((child, hijo, None) for child, hijo in reversed(pares))
+        raiz.parent = parent
+        return raiz
     
-    def agregar_hijo(self, hijo):
+    def agregar_hijo(self, hijo, propagar: bool = True):
+        if self._hijos is None:
+            self._hijos = {}
+        elif hijo.nombre in self._hijos:
+            raise ValueError(f"Ya existe '{hijo.nombre}' en '{self.nombre}'")
         hijo.parent = self
-        self.children.append(hijo)
+        self._hijos[hijo.nombre] = hijo
+        if self._orden is not None:
+            self._orden[hijo.id] = hijo
+        self._invalidar_hash()
+        if propagar:
+            self._propagar(hijo, 1)
+    
+    def recalcular_agregados(self):
+        """Recalcula los agregados de esta carpeta a partir de los de sus hijos directos."""
+        agr = Agregados()
+        for hijo in self.children:
+            agr.tamano += hijo.calcular_tamano()
+            agr.carpetas += hijo.contar_carpetas()
+            agr.archivos += hijo.contar_archivos()
+            agr.bytes_contenido += hijo.calcular_bytes()
+            altura = hijo.calcular_altura()
+            agr.alturas_hijos[altura] = agr.alturas_hijos.get(altura, 0) + 1
+        agr.altura = max(agr.alturas_hijos) + 1 if agr.alturas_hijos else 0
+        self._agregados = agr
     
     def eliminar_hijo(self, hijo):
-        if hijo in self.children:
-            self.children.remove(hijo)
+        if self._hijos and self._hijos.get(hijo.nombre) is hijo:
+            del self._hijos[hijo.nombre]
+            if self._orden is not None:
+                del self._orden[hijo.id]
             hijo.parent = None
+            self._invalidar_hash()
+            self._propagar(hijo, -1)
             return True
         return False
     
+    def _invalidar_hash(self):
+        """Olvida el hash de backup de esta carpeta y de sus ancestros.
+        
+        Una carpeta con hash implica que todas sus descendientes lo tienen, así
+        que se puede parar en el primer ancestro que ya no lo tenga.
+        """
+        actual = self
+        while actual is not None:
+            agr = actual._agregados
+            if agr is None or agr.hash_bloque is None:
+                break
+            agr.hash_bloque = None
+            actual = actual.parent
+    
+    def _propagar(self, hijo, signo: int):
+        """Suma (signo=1) o resta (signo=-1) el subárbol de `hijo` en esta carpeta y sus ancestros."""
+        tamano = signo * hijo.calcular_tamano()
+        carpetas = signo * hijo.contar_carpetas()
+        archivos = signo * hijo.contar_archivos()
+        bytes_contenido = signo * hijo.calcular_bytes()
+        altura_vieja = altura_nueva = hijo.calcular_altura()
+        
+        actual = self
+        if signo > 0:
+            altura_vieja = None
+        else:
+            altura_nueva = None
+        
+        while actual is not None:
+            agr = actual._agregados
+            if agr is None:
+                break
+            agr.tamano += tamano
+            agr.carpetas += carpetas
+            agr.archivos += archivos
+            agr.bytes_contenido += bytes_contenido
+            
+            if altura_vieja != altura_nueva:
+                alturas = agr.alturas_hijos
+                if altura_vieja is not None:
+                    alturas[altura_vieja] -= 1
+                    if not alturas[altura_vieja]:
+                        del alturas[altura_vieja]
+                if altura_nueva is not None:
+                    alturas[altura_nueva] = alturas.get(altura_nueva, 0) + 1
+                altura_vieja = agr.altura
+                agr.altura = max(alturas) + 1 if alturas else 0
+                altura_nueva = agr.altura
+            
+            actual = actual.parent
+    
+    def renombrar_hijo(self, hijo, nuevo_nombre):
+        """Cambia la clave del hijo en O(1) conservando su posición en el listado.
+        
+        `_hijos` pierde el orden al reinsertar la clave, así que la primera vez
+        que se renombra un hijo que no es el último se copia el orden a `_orden`,
+        indexado por id, que no cambia al renombrar.
+        """
+        if self._orden is None and next(reversed(self._hijos)) != hijo.nombre:
+            self._orden = {h.id: h for h in self._hijos.values()}
+        del self._hijos[hijo.nombre]
+        hijo.nombre = sys.intern(nuevo_nombre)
+        self._hijos[hijo.nombre] = hijo
+        self._invalidar_hash()
+    
     def buscar_por_nombre(self, nombre):
-        for child in self.children:
-            if child.nombre == nombre:
-                return child
-        return None
+        return self._hijos.get(nombre) if self._hijos else None
     
     def buscar_por_id(self, id_nodo):
-        if self.id == id_nodo:
-            return self
-        for child in self.children:
-            if child.tipo == NodeType.FOLDER.value:
-                encontrado = child.buscar_por_id(id_nodo)
-                if encontrado:
-                    return encontrado
-        return None
+        return next((nodo for nodo in self.recorrer() if nodo.id == id_nodo), None)
     
     def preorden(self, lista=None):
         if lista is None:
             lista = []
-        lista.append((self.nombre, self.tipo, self.id))
-        if self.tipo == NodeType.FOLDER.value:
-            for child in self.children:
-                child.preorden(lista)
+        lista.extend((nodo.nombre, nodo.tipo, nodo.id) for nodo in self.recorrer())
         return lista
     
     def calcular_tamano(self):
-        tamano = 1
-        if self.tipo == NodeType.FOLDER.value:
-            for child in self.children:
-                tamano += child.calcular_tamano()
-        return tamano
+        return self._agregados.tamano if self._agregados else 1
     
     def calcular_altura(self):
-        if self.tipo != NodeType.FOLDER.value or not self.children:
+        return self._agregados.altura if self._agregados else 0
+    
+    def contar_carpetas(self):
+        return self._agregados.carpetas if self._agregados else 0
+    
+    def contar_archivos(self):
+        return self._agregados.archivos if self._agregados else 1
+    
+    def calcular_bytes(self):
+        if self._agregados:
+            return self._agregados.bytes_contenido
+        return len(self.contenido.encode("utf-8")) if self.contenido else 0
+
+# ==================== DIARIO DE OPERACIONES ====================
+class DiarioOperaciones:
+    """Diario de solo-añadir junto a una instantánea: un registro JSON por línea."""
+    
+    def __init__(self, base: str):
+        self.base = base
+        self.archivo = base + ".journal"
+        self.pendientes = []
+        self.registros_en_disco = 0
+    
+    def es_base(self, archivo: str) -> bool:
+        return os.path.abspath(archivo) == os.path.abspath(self.base)
+    
+    def registrar(self, op: str, **datos):
+        datos["op"] = op
+        self.pendientes.append(datos)
+    
+    def volcar(self) -> int:
+        """Añade las operaciones pendientes al archivo del diario y devuelve cuántas eran."""
+        cantidad = len(self.pendientes)
+        if cantidad:
+            with open(self.archivo, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(registro, ensure_ascii=False) + "\n"
+                                for registro in self.pendientes))
+                f.flush()
+                os.fsync(f.fileno())
+            self.registros_en_disco += cantidad
+            self.pendientes.clear()
+        return cantidad
+    
+    def leer(self):
+        """Genera (registro, fin) por cada línea completa, con `fin` el byte en que acaba.
+        
+        Para en la primera línea a medio escribir (sin salto final o sin JSON válido).
+        """
+        if not os.path.exists(self.archivo):
+            return
+        fin = 0
+        with open(self.archivo, "rb") as f:
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    return
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    return
+                fin += len(linea)
+                yield registro, fin
+    
+    def recortar(self, fin: int) -> int:
+        """Descarta el diario a partir del byte `fin`; devuelve cuántos bytes quitó.
+        
+        Así lo siguiente que se vuelque no queda pegado a un registro roto.
+        """
+        if not os.path.exists(self.archivo):
             return 0
-        return 1 + max(child.calcular_altura() for child in self.children)
+        sobrante = os.path.getsize(self.archivo) - fin
+        if sobrante > 0:
+            with open(self.archivo, "r+b") as f:
+                f.truncate(fin)
+                f.flush()
+                os.fsync(f.fileno())
+        return max(sobrante, 0)
+    
+    def truncar(self):
+        self.pendientes.clear()
+        self.registros_en_disco = 0
+        if os.path.exists(self.archivo):
+            os.remove(self.archivo)
+
+# ==================== INSTANTÁNEA BINARIA ====================
+# Formato: cabecera | contenidos | cadenas | índice de cadenas | tabla de nodos.
+# La tabla está en orden por niveles, así los hijos de cada nodo son contiguos.
+_CABECERA = struct.Struct("<4sHHQQQQQQQ")
+_REGISTRO = struct.Struct("<IIB3xiIIQIIQQQQ")
+_CADENA = struct.Struct("<QI")
+_MAGIA = b"SAFS"
+_FORMATO_BINARIO = 1
+_BIT_CARPETA = 1
+_BIT_CONTENIDO = 2
+
+_CONTENIDO_SLOT = Nodo.contenido    # descriptor del slot, antes de que ArchivoDiferido lo tape
+
+class CarpetaDiferida(Nodo):
+    """Carpeta de una instantánea cuyos hijos se crean la primera vez que se consultan."""
+    __slots__ = ("_instantanea", "_indice")
+    
+    def _materializar(self):
+        if self._instantanea is not None:
+            instantanea, self._instantanea = self._instantanea, None
+            for hijo in instantanea.crear_hijos(self._indice):
+                Nodo.agregar_hijo(self, hijo, propagar=False)
+            self.recalcular_agregados()
+    
+    @property
+    def children(self):
+        self._materializar()
+        return Nodo.children.fget(self)
+    
+    def agregar_hijo(self, hijo, propagar: bool = True):
+        self._materializar()
+        Nodo.agregar_hijo(self, hijo, propagar)
+    
+    def eliminar_hijo(self, hijo):
+        self._materializar()
+        return Nodo.eliminar_hijo(self, hijo)
+    
+    def renombrar_hijo(self, hijo, nuevo_nombre):
+        self._materializar()
+        Nodo.renombrar_hijo(self, hijo, nuevo_nombre)
+    
+    def buscar_por_nombre(self, nombre):
+        self._materializar()
+        return Nodo.buscar_por_nombre(self, nombre)
+
+class ArchivoDiferido(Nodo):
+    """Archivo de una instantánea cuyo contenido se decodifica la primera vez que se lee."""
+    __slots__ = ("_instantanea", "_rango")
+    
+    @property
+    def contenido(self):
+        if self._instantanea is not None:
+            _CONTENIDO_SLOT.__set__(self, self._instantanea.leer_contenido(*self._rango))
+            self._instantanea = None
+        return _CONTENIDO_SLOT.__get__(self)
+    
+    @contenido.setter
+    def contenido(self, valor):
+        self._instantanea = None
+        _CONTENIDO_SLOT.__set__(self, valor)
+    
+    def calcular_bytes(self):
+        if self._instantanea is not None:
+            return self._rango[1]
+        return Nodo.calcular_bytes(self)
+
+class InstantaneaBinaria:
+    """Lectura perezosa de una instantánea binaria abierta con mmap."""
+    
+    def __init__(self, archivo: str):
+        self.archivo = os.path.abspath(archivo)
+        self._f = open(archivo, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            (magia, formato, _, self.num_nodos, self.next_id, self.version_cadena,
+             self._off_contenidos, self._off_cadenas, self._off_indice,
+             self._off_tabla) = _CABECERA.unpack_from(self._mm, 0)
+        except Exception:
+            self.cerrar()
+            raise
+        if magia != _MAGIA or formato != _FORMATO_BINARIO:
+            self.cerrar()
+            raise ValueError(f"'{archivo}' no es una instantánea binaria válida")
+    
+    def cerrar(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+    
+    def cadena(self, indice: int) -> str:
+        offset, longitud = _CADENA.unpack_from(self._mm, self._off_indice + indice * _CADENA.size)
+        inicio = self._off_cadenas + offset
+        return self._mm[inicio:inicio + longitud].decode("utf-8")
+    
+    def leer_contenido(self, offset: int, longitud: int) -> str:
+        inicio = self._off_contenidos + offset
+        return self._mm[inicio:inicio + longitud].decode("utf-8")
+    
+    def crear_nodo(self, indice: int) -> Nodo:
+        (id_cadena, nombre_cadena, banderas, _, primer_hijo, num_hijos, contenido_off,
+         contenido_len, altura, tamano, carpetas, archivos, bytes_contenido) = _REGISTRO.unpack_from(
+            self._mm, self._off_tabla + indice * _REGISTRO.size)
+        id_nodo = self.cadena(id_cadena)
+        nombre = self.cadena(nombre_cadena)
+        
+        if banderas & _BIT_CARPETA:
+            nodo = CarpetaDiferida(id_nodo, nombre, NodeType.FOLDER.value)
+            agr = nodo._agregados
+            agr.tamano, agr.altura, agr.carpetas = tamano, altura, carpetas
+            agr.archivos, agr.bytes_contenido = archivos, bytes_contenido
+            nodo._instantanea = self if num_hijos else None
+            nodo._indice = indice
+        elif banderas & _BIT_CONTENIDO and contenido_len:
+            nodo = ArchivoDiferido(id_nodo, nombre, NodeType.FILE.value)
+            nodo._instantanea = self
+            nodo._rango = (contenido_off, contenido_len)
+        else:
+            nodo = Nodo(id_nodo, nombre, NodeType.FILE.value, "" if banderas & _BIT_CONTENIDO else None)
+        return nodo
+    
+    def crear_hijos(self, indice: int) -> List[Nodo]:
+        primer_hijo, num_hijos = struct.unpack_from(
+            "<II", self._mm, self._off_tabla + indice * _REGISTRO.size + 16)
+        return [self.crear_nodo(i) for i in range(primer_hijo, primer_hijo + num_hijos)]
+    
+    @staticmethod
+    def escribir(archivo: str, raiz: Nodo, next_id: int, version: str):
+        """Escribe `raiz` en orden por niveles: contenidos primero, tabla de nodos al final."""
+        cadenas = {}
+        
+        def cadena(valor: str) -> int:
+            indice = cadenas.get(valor)
+            if indice is None:
+                indice = cadenas[valor] = len(cadenas)
+            return indice
+        
+        version_cadena = cadena(version)
+        orden = [raiz]
+        padres = [-1]
+        primeros = []
+        rangos = []
+        
+        with open(archivo, "wb") as f:
+            f.write(b"\0" * _CABECERA.size)
+            off_contenidos = f.tell()
+            posicion = 0
+            i = 0
+            while i < len(orden):
+                nodo = orden[i]
+                primeros.append(len(orden))
+                for hijo in nodo.children:
+                    orden.append(hijo)
+                    padres.append(i)
+                contenido = nodo.contenido if nodo.tipo == NodeType.FILE.value else None
+                if contenido:
+                    datos = contenido.encode("utf-8")
+                    f.write(datos)
+                    rangos.append((posicion, len(datos)))
+                    posicion += len(datos)
+                else:
+                    rangos.append((0, 0))
+                i += 1
+            
+            ids = [cadena(nodo.id) for nodo in orden]
+            nombres = [cadena(nodo.nombre) for nodo in orden]
+            
+            off_cadenas = f.tell()
+            indice_cadenas = []
+            posicion = 0
+            for valor in cadenas:
+                datos = valor.encode("utf-8")
+                f.write(datos)
+                indice_cadenas.append(_CADENA.pack(posicion, len(datos)))
+                posicion += len(datos)
+            
+            off_indice = f.tell()
+            f.write(b"".join(indice_cadenas))
+            
+            off_tabla = f.tell()
+            for i, nodo in enumerate(orden):
+                es_carpeta = nodo.tipo == NodeType.FOLDER.value
+                banderas = _BIT_CARPETA if es_carpeta else 0
+                if not es_carpeta and nodo.contenido is not None:
+                    banderas |= _BIT_CONTENIDO
+                num_hijos = (primeros[i + 1] if i + 1 < len(primeros) else len(orden)) - primeros[i]
+                f.write(_REGISTRO.pack(
+                    ids[i], nombres[i], banderas, padres[i], primeros[i], num_hijos,
+                    rangos[i][0], rangos[i][1], nodo.calcular_altura(), nodo.calcular_tamano(),
+                    nodo.contar_carpetas(), nodo.contar_archivos(), nodo.calcular_bytes()
+                ))
+            
+            f.seek(0)
+            f.write(_CABECERA.pack(_MAGIA, _FORMATO_BINARIO, 0, len(orden), next_id, version_cadena,
+                                   off_contenidos, off_cadenas, off_indice, off_tabla))
+
+# ==================== BACKUPS ====================
+class GestorBackups:
+    """Backups con direccionamiento por contenido, guardados en unos pocos archivos pack.
+    
+    Cada carpeta grande es un bloque identificado por su hash con las entradas
+    de sus hijos: los archivos y las subcarpetas pequeñas (hasta `LIMITE_EN_LINEA`
+    nodos) van dentro; las subcarpetas grandes, por hash. Un subárbol que no
+    cambió produce el mismo bloque y solo se escribe una vez; además la carpeta
+    recuerda su hash (`Agregados.hash_bloque`), así que ni se vuelve a recorrer.
+    
+    Los bloques nuevos de cada backup se añaden a un único `.pack`. El índice
+    (hash -> pack, posición, longitud y hashes a los que apunta) está en memoria
+    y en `objetos/indice`, de modo que la retención calcula qué bloques siguen
+    vivos sin leer ninguno.
+    """
+    
+    LIMITE_EN_LINEA = 64      # subcarpetas de hasta este tamaño van dentro del bloque del padre
+    MAX_ENTRADAS = 1024       # con más hijos, el bloque de la carpeta se parte en grupos
+    PACK_MINIMO = 1 << 20     # los packs más pequeños se juntan al aplicar la retención
+    
+    def __init__(self, directorio: str = "backups", mantener: int = 10, max_dias: Optional[int] = None,
+                 intervalo: Optional[float] = 600.0):
+        self.directorio = directorio
+        self.mantener = mantener
+        self.max_dias = max_dias
+        self.intervalo = intervalo     # segundos entre backups automáticos; None = solo a petición
+        self._indice = None            # hash -> (pack, offset, longitud, hashes referenciados)
+        self._ultimo = None            # fecha del backup más reciente
+    
+    @property
+    def dir_objetos(self) -> str:
+        return os.path.join(self.directorio, "objetos")
+    
+    @property
+    def archivo_indice(self) -> str:
+        return os.path.join(self.dir_objetos, "indice")
+    
+    def _cargar_indice(self) -> Dict[str, tuple]:
+        if self._indice is None:
+            self._indice = {}
+            if os.path.exists(self.archivo_indice):
+                with open(self.archivo_indice, "r", encoding="utf-8") as f:
+                    for linea in f:
+                        try:
+                            hash_bloque, pack, offset, longitud, refs = json.loads(linea)
+                        except ValueError:
+                            break   # última línea a medio escribir
+                        self._indice[hash_bloque] = (pack, offset, longitud, refs)
+        return self._indice
+    
+    def toca_automatico(self) -> bool:
+        """True si ha pasado `intervalo` desde el último backup (o no hay ninguno)."""
+        if self.intervalo is None:
+            return False
+        if self._ultimo is None:
+            manifiestos = self.listar()
+            if not manifiestos:
+                return True
+            self._ultimo = datetime.fromisoformat(manifiestos[0]["fecha"])
+        return (datetime.now() - self._ultimo).total_seconds() >= self.intervalo
+    
+    # ---------- escritura ----------
+    
+    def _bloque(self, datos: Dict[str, Any], refs: List[str], nuevos: list) -> str:
+        indice = self._cargar_indice()
+        bloque = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        hash_bloque = hashlib.sha256(bloque).hexdigest()
+        if hash_bloque not in indice and hash_bloque not in nuevos[0]:
+            nuevos[0].add(hash_bloque)
+            nuevos[1].append((hash_bloque, bloque, refs))
+        return hash_bloque
+    
+    @staticmethod
+    def _refs(entradas: List[Dict[str, Any]]) -> List[str]:
+        refs = []
+        pendientes = list(entradas)
+        while pendientes:
+            entrada = pendientes.pop()
+            if "bloque" in entrada:
+                refs.append(entrada["bloque"])
+            elif "hijos" in entrada:
+                pendientes.extend(entrada["hijos"])
+        return refs
+    
+    def _cerrar_carpeta(self, entradas: List[Dict[str, Any]], nuevos: list) -> str:
+        """Escribe el bloque de una carpeta grande; si tiene muchos hijos, en grupos."""
+        if len(entradas) <= self.MAX_ENTRADAS:
+            return self._bloque({"hijos": entradas}, self._refs(entradas), nuevos)
+    
+        # Cortes definidos por el contenido: insertar un hijo solo cambia su grupo
+        grupos, grupo = [], []
+        for entrada in entradas:
+            grupo.append(entrada)
+            if len(grupo) >= self.MAX_ENTRADAS or (
+                    len(grupo) >= 64 and zlib.crc32(entrada["id"].encode("utf-8")) & 255 == 0):
+                grupos.append(self._bloque({"hijos": grupo}, self._refs(grupo), nuevos))
+                grupo = []
+        if grupo:
+            grupos.append(self._bloque({"hijos": grupo}, self._refs(grupo), nuevos))
+        return self._bloque({"grupos": grupos}, grupos, nuevos)
+    
+    def _hashear(self, raiz: Nodo, nuevos: list) -> str:
+        """Hash del bloque de `raiz`, reaprovechando el de las carpetas que no cambiaron."""
+        indice = self._cargar_indice()
+        if raiz._agregados.hash_bloque in indice:
+            return raiz._agregados.hash_bloque
+        carpeta = NodeType.FOLDER.value
+        pila = [(raiz, iter(raiz.children), [])]
+        while True:
+            nodo, hijos, entradas = pila[-1]
+            for hijo in hijos:
+                if hijo.tipo != carpeta:
+                    entradas.append({"id": hijo.id, "nombre": hijo.nombre, "tipo": hijo.tipo,
+                                     "contenido": hijo.contenido})
+                    continue
+                hash_hijo = hijo._agregados.hash_bloque
+                if hash_hijo and (hash_hijo in indice or hash_hijo in nuevos[0]):
+                    entradas.append({"id": hijo.id, "nombre": hijo.nombre, "tipo": hijo.tipo,
+                                     "bloque": hash_hijo})
+                    continue
+                pila.append((hijo, iter(hijo.children), []))
+                break
+            else:
+                pila.pop()
+                agr = nodo._agregados
+                if not pila:
+                    agr.hash_bloque = self._cerrar_carpeta(entradas, nuevos)
+                    return agr.hash_bloque
+                entrada = {"id": nodo.id, "nombre": nodo.nombre, "tipo": nodo.tipo}
+                if agr.tamano > self.LIMITE_EN_LINEA:
+                    agr.hash_bloque = entrada["bloque"] = self._cerrar_carpeta(entradas, nuevos)
+                else:
+                    agr.hash_bloque = ""    # va dentro del bloque del padre
+                    entrada["hijos"] = entradas
+                pila[-1][2].append(entrada)
+    
+    def _escribir_pack(self, nombre: str, bloques: List[Tuple[str, bytes, List[str]]]):
+        """Añade `bloques` a un pack nuevo y después sus entradas al índice."""
+        indice = self._cargar_indice()
+        os.makedirs(self.dir_objetos, exist_ok=True)
+        pack = nombre + ".pack"
+        lineas = []
+        offset = 0
+        with open(os.path.join(self.dir_objetos, pack), "wb") as f:
+            for hash_bloque, bloque, refs in bloques:
+                f.write(bloque)
+                lineas.append(json.dumps([hash_bloque, pack, offset, len(bloque), refs]) + "\n")
+                indice[hash_bloque] = (pack, offset, len(bloque), refs)
+                offset += len(bloque)
+        with open(self.archivo_indice, "a", encoding="utf-8") as f:
+            f.write("".join(lineas))
+    
+    def crear(self, raiz: Nodo, next_id: int, version: str, archivo_origen: str) -> Dict[str, Any]:
+        nuevos = (set(), [])
+        hash_raiz = self._hashear(raiz, nuevos)
+    
+        ahora = datetime.now()
+        nombre = ahora.strftime("%Y%m%d_%H%M%S_%f")
+        if nuevos[1]:
+            self._escribir_pack(nombre, nuevos[1])
+        manifiesto = {
+            "nombre": nombre,
+            "fecha": ahora.isoformat(),
+            "archivo": archivo_origen,
+            "version": version,
+            "next_id": next_id,
+            "nodos": raiz.calcular_tamano(),
+            "bloques_nuevos": len(nuevos[1]),
+            "raiz_id": raiz.id,
+            "raiz_nombre": raiz.nombre,
+            "raiz": hash_raiz
+        }
+        with open(os.path.join(self.directorio, manifiesto["nombre"] + ".json"), "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        self._ultimo = ahora
+        return manifiesto
+    
+    # ---------- lectura ----------
+    
+    def listar(self) -> List[Dict[str, Any]]:
+        """Manifiestos de backup, del más reciente al más antiguo."""
+        if not os.path.isdir(self.directorio):
+            return []
+        manifiestos = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file() and entrada.name.endswith(".json"):
+                with open(entrada.path, "r", encoding="utf-8") as f:
+                    manifiestos.append(json.load(f))
+        manifiestos.sort(key=lambda m: m["nombre"], reverse=True)
+        return manifiestos
+    
+    def _leer_crudo(self, hash_bloque: str, abiertos: Dict[str, Any]) -> bytes:
+        pack, offset, longitud, _ = self._cargar_indice()[hash_bloque]
+        f = abiertos.get(pack)
+        if f is None:
+            f = abiertos[pack] = open(os.path.join(self.dir_objetos, pack), "rb")
+        f.seek(offset)
+        return f.read(longitud)
+    
+    def _leer_bloque(self, hash_bloque: str, abiertos: Dict[str, Any]) -> Dict[str, Any]:
+        return json.loads(self._leer_crudo(hash_bloque, abiertos).decode("utf-8"))
+    
+    def restaurar(self, manifiesto: Dict[str, Any]) -> Nodo:
+        """Reconstruye el árbol de un manifiesto a partir de sus bloques."""
+        abiertos = {}
+        try:
+            raiz = Nodo(manifiesto["raiz_id"], manifiesto["raiz_nombre"], NodeType.FOLDER.value)
+            carpetas = [(raiz, manifiesto["raiz"])]
+            pila = [(raiz, {"bloque": manifiesto["raiz"]})]
+            while pila:
+                padre, entrada = pila.pop()
+                if "bloque" in entrada:
+                    datos = self._leer_bloque(entrada["bloque"], abiertos)
+                    hijos = datos.get("hijos", [])
+                    for hash_grupo in datos.get("grupos", ()):
+                        hijos.extend(self._leer_bloque(hash_grupo, abiertos)["hijos"])
+                else:
+                    hijos = entrada["hijos"]
+                for datos_hijo in hijos:
+                    hijo = Nodo(datos_hijo["id"], datos_hijo["nombre"], datos_hijo["tipo"],
+                                datos_hijo.get("contenido"))
+                    padre.agregar_hijo(hijo, propagar=False)
+                    if hijo.tipo == NodeType.FOLDER.value:
+                        carpetas.append((hijo, datos_hijo.get("bloque", "")))
+                        pila.append((hijo, datos_hijo))
+        finally:
+            for f in abiertos.values():
+                f.close()
+        # Cada carpeta se añadió antes que sus descendientes; el hash sigue valiendo
+        for carpeta, hash_bloque in reversed(carpetas):
+            carpeta.recalcular_agregados()
+            carpeta._agregados.hash_bloque = hash_bloque
+        return raiz
+    
+    # ---------- retención ----------
+    
+    def aplicar_retencion(self) -> Tuple[int, int]:
+        """Borra los manifiestos que sobran según la política y los bloques que ya nadie usa.
+    
+        Los vivos se calculan sobre el índice en memoria. Los packs sin bloques
+        vivos se borran; los que tienen menos de la mitad vivos o son pequeños
+        se juntan en uno nuevo.
+        """
+        manifiestos = self.listar()
+        limite = datetime.now() - timedelta(days=self.max_dias) if self.max_dias is not None else None
+        conservar, borrar = [], []
+        for i, manifiesto in enumerate(manifiestos):
+            viejo = limite is not None and datetime.fromisoformat(manifiesto["fecha"]) < limite
+            (borrar if i >= self.mantener or viejo else conservar).append(manifiesto)
+        if not borrar:
+            return 0, 0
+    
+        for manifiesto in borrar:
+            os.remove(os.path.join(self.directorio, manifiesto["nombre"] + ".json"))
+    
+        indice = self._cargar_indice()
+        vivos = set()
+        pendientes = [m["raiz"] for m in conservar]
+        while pendientes:
+            hash_bloque = pendientes.pop()
+            if hash_bloque not in vivos and hash_bloque in indice:
+                vivos.add(hash_bloque)
+                pendientes.extend(indice[hash_bloque][3])
+    
+        huerfanos = [h for h in indice if h not in vivos]
+        if not huerfanos:
+            return len(borrar), 0
+    
+        total, vivo = defaultdict(int), defaultdict(int)
+        for hash_bloque, (pack, _, longitud, _) in indice.items():
+            total[pack] += longitud
+            if hash_bloque in vivos:
+                vivo[pack] += longitud
+        for hash_bloque in huerfanos:
+            del indice[hash_bloque]
+    
+        juntar = [pack for pack in total if vivo[pack] and
+                  (vivo[pack] < total[pack] / 2 or total[pack] < self.PACK_MINIMO)]
+        if len(juntar) == 1 and vivo[juntar[0]] >= total[juntar[0]] / 2:
+            juntar = []     # un único pack pequeño y sin huecos: reescribirlo no gana nada
+        if juntar:
+            abiertos = {}
+            try:
+                bloques = [(h, self._leer_crudo(h, abiertos), indice[h][3])
+                           for h, entrada in list(indice.items()) if entrada[0] in juntar]
+            finally:
+                for f in abiertos.values():
+                    f.close()
+            self._escribir_pack(datetime.now().strftime("%Y%m%d_%H%M%S_%f") + "_junto", bloques)
+    
+        temporal = self.archivo_indice + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps([h, *entrada]) + "\n" for h, entrada in indice.items()))
+        os.replace(temporal, self.archivo_indice)
+        for pack in total:
+            if pack in juntar or not vivo[pack]:
+                os.remove(os.path.join(self.dir_objetos, pack))
+        return len(borrar), len(huerfanos)
+
+# ==================== REGISTRO (LOG) ====================
+class NivelLog(Enum):
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+class RegistroAsincrono:
+    """Log con búfer circular en memoria y un hilo que lo vuelca a disco por lotes.
+    
+    `registrar` solo encola; el hilo escritor abre el archivo una vez por lote,
+    cada `intervalo` segundos o cuando se acumulan `tamano_lote` mensajes. Si el
+    búfer se llena, quien registra vuelca en el acto en vez de perder mensajes.
+    Al superar `max_bytes` el archivo rota a `.1`, `.2`... hasta `copias`.
+    Hay una instancia por archivo y todas se vuelcan al salir y ante una
+    excepción no controlada.
+    """
+    
+    _instancias: Dict[str, 'RegistroAsincrono'] = {}
+    _ganchos_instalados = False
+    
+    def __init__(self, archivo: str, capacidad: int = 10000, tamano_lote: int = 500,
+                 intervalo: float = 0.5, max_bytes: int = 5 * 1024 * 1024, copias: int = 3,
+                 nivel_minimo: NivelLog = NivelLog.INFO):
+        self.archivo = archivo
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self.copias = copias
+        self.nivel_minimo = nivel_minimo
+        self._buffer = deque(maxlen=capacidad)
+        self._condicion = threading.Condition()
+        self._escritura = threading.Lock()   # ordena los volcados del hilo y los síncronos
+        self._hilo = None
+        self._cerrado = False
+        self._bytes = None
+        self._segundo = None
+        self._marca = ""
+    
+    @classmethod
+    def para(cls, archivo: str) -> 'RegistroAsincrono':
+        """Registro compartido por todos los que escriben en `archivo`."""
+        clave = os.path.abspath(archivo)
+        registro = cls._instancias.get(clave)
+        if registro is None:
+            registro = cls._instancias[clave] = cls(clave)
+            cls._instalar_ganchos()
+        return registro
+    
+    @classmethod
+    def _instalar_ganchos(cls):
+        if cls._ganchos_instalados:
+            return
+        cls._ganchos_instalados = True
+        atexit.register(cls.cerrar_todos)
+        anterior = sys.excepthook
+        
+        def gancho(tipo, valor, traza):
+            for registro in list(cls._instancias.values()):
+                registro.registrar(f"Excepción no controlada: {tipo.__name__}: {valor}", NivelLog.ERROR)
+                registro.volcar()
+            anterior(tipo, valor, traza)
+        
+        sys.excepthook = gancho
+    
+    @classmethod
+    def cerrar_todos(cls):
+        for registro in list(cls._instancias.values()):
+            registro.cerrar()
+    
+    def registrar(self, mensaje: str, nivel: NivelLog = NivelLog.INFO):
+        if nivel.value < self.nivel_minimo.value:
+            return
+        with self._condicion:
+            lleno = len(self._buffer) >= self.capacidad
+        if lleno:
+            self.volcar()
+        with self._condicion:
+            self._buffer.append((time.time(), nivel, mensaje))
+            if len(self._buffer) >= self.tamano_lote:
+                self._condicion.notify()
+            arrancar = self._hilo is None and not self._cerrado
+            if arrancar:
+                self._hilo = threading.Thread(target=self._escritor, name="registro-log", daemon=True)
+        if arrancar:
+            self._hilo.start()
+        elif self._cerrado:
+            # Mensajes posteriores al cierre (p. ej. desde otros ganchos de salida)
+            self.volcar()
+    
+    def volcar(self):
+        """Escribe ya todo lo pendiente, desde el hilo que llama."""
+        with self._escritura:
+            with self._condicion:
+                registros = list(self._buffer)
+                self._buffer.clear()
+            if registros:
+                self._escribir(registros)
+    
+    def cerrar(self):
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify()
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=5)
+        self.volcar()
+    
+    def _escritor(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: self._cerrado or len(self._buffer) >= self.tamano_lote,
+                                         timeout=self.intervalo)
+                cerrado = self._cerrado
+            self.volcar()
+            if cerrado:
+                return
+    
+    def _formatear(self, instante: float, nivel: NivelLog, mensaje: str) -> str:
+        segundo = int(instante)
+        if segundo != self._segundo:
+            # strftime una vez por segundo, no por mensaje
+            self._segundo = segundo
+            self._marca = datetime.fromtimestamp(segundo).strftime("%Y-%m-%d %H:%M:%S")
+        return f"[{self._marca}] [{nivel.name}] {mensaje}\n"
+    
+    def _escribir(self, registros: List[Tuple[float, NivelLog, str]]):
+        datos = "".join(self._formatear(*registro) for registro in registros).encode("utf-8")
+        try:
+            if self._bytes is None:
+                self._bytes = os.path.getsize(self.archivo) if os.path.exists(self.archivo) else 0
+            if self._bytes and self._bytes + len(datos) > self.max_bytes:
+                self._rotar()
+            with open(self.archivo, "ab") as f:
+                f.write(datos)
+            self._bytes += len(datos)
+        except OSError:
+            pass
+    
+    def _rotar(self):
+        if self.copias > 0:
+            for i in range(self.copias - 1, 0, -1):
+                anterior = f"{self.archivo}.{i}"
+                if os.path.exists(anterior):
+                    os.replace(anterior, f"{self.archivo}.{i + 1}")
+            os.replace(self.archivo, self.archivo + ".1")
+        else:
+            os.remove(self.archivo)
+        self._bytes = 0
+
+# ==================== LOTES ====================
+class Lote:
+    """Estado de un lote abierto con `SistemaArchivos.lote()`: lo necesario para confirmarlo o revertirlo."""
+    
+    def __init__(self, sistema: 'SistemaArchivos'):
+        self.nuevos = []         # nodos creados en el lote, se indexan juntos al confirmar
+        self.deshacer = []       # (función, argumentos) inversos de cada operación
+        self.lineas_log = []     # (mensaje, nivel), se registran solo si el lote se confirma
+        self.nodo_actual = sistema.nodo_actual
+        self.ruta_actual = list(sistema.ruta_actual)
+        self.next_id = sistema.next_id
+        self.marca_papelera = sistema.papelera.marcar()
+        self.diario = sistema.diario
+        self.registros_diario = len(sistema.diario.pendientes) if sistema.diario else 0
+    
+    @property
+    def operaciones(self) -> int:
+        return len(self.deshacer)
+
+@contextmanager
+def _gc_pausado():
+    """Pausa el recolector cíclico durante una carga masiva (también sirve como decorador).
+    
+    Cargar solo crea objetos vivos, pero cada pasada de la generación más vieja
+    recorre todo lo creado hasta entonces y el coste total crece de forma cuadrática.
+    """
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo:
+            gc.enable()
 
 # ==================== SISTEMA DE ARCHIVOS PRINCIPAL ====================
 class SistemaArchivos:
-    def __init__(self):
+    """Árbol de archivos con índices, papelera, diario y backups.
+    
+    Sin `presentador` no imprime nada: las operaciones devuelven datos (nodos,
+    listas de diccionarios) y los errores se informan devolviendo False/None.
+    Con `modo_biblioteca` los errores se lanzan como SistemaError. Con
+    `instrumentacion` (por defecto) cada operación pública registra su latencia
+    y contadores en `self.monitor`; ver `rendimiento()`.
+    """
+    
+    def __init__(self, presentador: Optional['PresentadorConsola'] = None, modo_biblioteca: bool = False,
+                 instrumentacion: bool = True):
         self.raiz = Nodo(str(uuid.uuid4()), "root", NodeType.FOLDER.value)
         self.nodo_actual = self.raiz
         self.ruta_actual = ["root"]
@@ -274,11 +1751,27 @@ class SistemaArchivos:
         self.archivo_persistencia = "sistema.json"
         self.log_activo = False
         self.log_file = "sistema.log"
+        self._registro = None
+        self._registro_archivo = None
+        self._lote = None   # Lote abierto, si lo hay
+        self.monitor = None
+        self._medicion = None   # [nodos, entradas de índice] de la operación medida en curso
+        self.presentador = presentador
+        self.modo_biblioteca = modo_biblioteca
         
         # Índices
-        self.trie = Trie()
-        self.indice_nombre = defaultdict(set)
-        self.indice_id = {}
+        self._reiniciar_indices()
+        
+        # Instantánea binaria abierta y si los índices aún no cubren todo el árbol
+        self._instantanea = None
+        self._indices_pendientes = False
+        
+        # Diario de operaciones sobre la última instantánea guardada o cargada
+        self.diario = None
+        self.umbral_compactacion = 10000
+        
+        # Backups deduplicados con política de retención
+        self.backups = GestorBackups()
         
         # Papelera
         self.papelera = TrashBin()
@@ -286,6 +1779,15 @@ class SistemaArchivos:
         
         # Inicializar
         self._actualizar_indices(self.raiz)
+        
+        # Latencias y contadores por operación (ver INSTRUMENTACIÓN)
+        self.instrumentar(instrumentacion)
+    
+    EXTENSIONES_NDJSON = (".ndjson", ".jsonl")
+    EXTENSIONES_BINARIAS = (".bin", ".snap")
+    # Por encima de esta altura el JSON se escribe como lista plana de nodos:
+    # json.dump/json.load recursan por cada nivel anidado y no pasan de ~1000
+    PROFUNDIDAD_JSON_ANIDADO = 200
     
     # ==================== MANEJO DE ERRORES ====================
     class SistemaError(Exception):
@@ -294,55 +1796,236 @@ class SistemaArchivos:
             self.detalle = detalle
             super().__init__(f"{tipo.value}: {detalle}")
     
-    def _manejar_error(self, error: Exception, operacion: str):
-        if isinstance(error, self.SistemaError):
-            mensaje = f"{Colors.RED}Error: {error}{Colors.RESET}"
-        else:
-            mensaje = f"{Colors.RED}Error inesperado en {operacion}: {error}{Colors.RESET}"
-        
-        print(mensaje)
-        
-        if self.log_activo:
-            self._log(f"ERROR en {operacion}: {error}")
+    def _manejar_error(self, error: Exception, operacion: str):
+        if self.log_activo:
+            self._log(f"ERROR en {operacion}: {error}", NivelLog.ERROR)
+        
+        if self._lote is not None or self.modo_biblioteca:
+            # En un lote el error se propaga para revertirlo entero
+            raise error
+        
+        if self.presentador is not None:
+            self.presentador.error(error, operacion)
+    
+    def _log(self, mensaje: str, nivel: NivelLog = NivelLog.INFO):
+        if not self.log_activo:
+            return
+        if self._lote is not None:
+            self._lote.lineas_log.append((mensaje, nivel))
+        else:
+            self.registro.registrar(mensaje, nivel)
+    
+    @property
+    def registro(self) -> RegistroAsincrono:
+        if self._registro is None or self._registro_archivo != self.log_file:
+            self._registro = RegistroAsincrono.para(self.log_file)
+            self._registro_archivo = self.log_file
+        return self._registro
+    
+    def _notificar(self, mensaje: str, color: str = Colors.GREEN):
+        """Mensaje de éxito o aviso de una operación para el presentador; se omite dentro de un lote."""
+        if self._lote is None and self.presentador is not None:
+            self.presentador.mensaje(mensaje, color)
+    
+    # ==================== LOTES ====================
+    @contextmanager
+    def lote(self):
+        """Agrupa operaciones en una transacción.
+        
+        Dentro del lote no se imprime nada, los errores se lanzan en vez de
+        informarse, los nodos nuevos se indexan juntos al final y el log y la
+        papelera se escriben una sola vez. Si algo falla se deshace todo el lote.
+        Los lotes anidados se suman al exterior.
+        """
+        if self._lote is not None:
+            yield self._lote
+            return
+        
+        lote = Lote(self)
+        self._lote = lote
+        try:
+            yield lote
+        except BaseException as e:
+            self._lote = None
+            self._revertir_lote(lote)
+            self._log(f"Lote revertido tras {lote.operaciones} operaciones: {e}", NivelLog.WARNING)
+            raise
+        self._lote = None
+        self._confirmar_lote(lote)
+    
+    def _confirmar_lote(self, lote: Lote):
+        self._indexar_nodos(lote.nuevos)
+        lote.nuevos = []
+        self.papelera.guardar(forzar=True)
+        for mensaje, nivel in lote.lineas_log:
+            self._log(mensaje, nivel)
+        self._notificar(f"Lote aplicado: {lote.operaciones} operaciones.")
+    
+    def _revertir_lote(self, lote: Lote):
+        lote.nuevos = []
+        for funcion, argumentos in reversed(lote.deshacer):
+            funcion(*argumentos)
+        self.nodo_actual = lote.nodo_actual
+        self.ruta_actual = lote.ruta_actual
+        self.next_id = lote.next_id
+        self.papelera.revertir(lote.marca_papelera)
+        if self.diario is lote.diario and self.diario:
+            del self.diario.pendientes[lote.registros_diario:]
+    
+    def _al_deshacer(self, funcion: Callable, *argumentos):
+        if self._lote is not None:
+            self._lote.deshacer.append((funcion, argumentos))
+    
+    def _indexar_alta(self, nodo: Nodo):
+        self._contar(indices=1)
+        if self._lote is not None:
+            self._lote.nuevos.append(nodo)
+        else:
+            self._indexar(nodo)
+    
+    def _volcar_indices_lote(self):
+        """Indexa ya los nodos pendientes del lote (antes de quitar nodos o de buscar)."""
+        if self._lote is not None and self._lote.nuevos:
+            self._indexar_nodos(self._lote.nuevos)
+            self._lote.nuevos = []
+    
+    def _deshacer_alta(self, nodo: Nodo, nombre_original: Optional[str] = None):
+        self._invalidar_rutas(nodo)
+        nodo.parent.eliminar_hijo(nodo)
+        self._actualizar_indices(nodo, eliminar=True)
+        if nombre_original is not None:
+            nodo.nombre = nombre_original
+    
+    def _deshacer_baja(self, nodo: Nodo, padre: Nodo):
+        padre.agregar_hijo(nodo)
+        self._actualizar_indices(nodo)
     
-    def _log(self, mensaje: str):
-        if self.log_activo:
-            try:
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    f.write(f"[{timestamp}] {mensaje}\n")
-            except Exception:
-                pass
+    def _deshacer_renombre(self, nodo: Nodo, nombre_original: str):
+        nombre_nuevo = nodo.nombre
+        self._invalidar_rutas(nodo)
+        nodo.parent.renombrar_hijo(nodo, nombre_original)
+        self._actualizar_indices_renombre(nodo, nombre_nuevo)
+    
+    def _deshacer_movimiento(self, nodo: Nodo, padre_original: Nodo):
+        self._invalidar_rutas(nodo)
+        nodo.parent.eliminar_hijo(nodo)
+        padre_original.agregar_hijo(nodo)
     
     # ==================== MANEJO DE ÍNDICES ====================
+    def _reiniciar_indices(self):
+        self.trie = Trie()
+        self.indice_nombre = defaultdict(set)
+        self.indice_id = {}
+        self.indice_ngramas = IndiceNgramas()
+        self.indice_contenido = IndiceContenido()
+        self.indice_ruta = {}   # ruta absoluta -> nodo, se llena al resolver o calcular rutas
+    
+    _INDICES = ("trie", "indice_nombre", "indice_id", "indice_ngramas", "indice_contenido", "indice_ruta")
+    
+    def _guardar_indices(self) -> tuple:
+        """Índices actuales, para devolverlos si una carga falla después de `_reiniciar_indices`."""
+        return tuple(getattr(self, nombre) for nombre in self._INDICES)
+    
+    def _devolver_indices(self, estado: tuple):
+        for nombre, indice in zip(self._INDICES, estado):
+            setattr(self, nombre, indice)
+    
+    def _indexar(self, nodo: Nodo):
+        self.trie.insert(nodo.nombre, nodo.id)
+        self._agregar_nombre(nodo.nombre, nodo.id)
+        self.indice_id[nodo.id] = nodo
+        if nodo.tipo == NodeType.FILE.value and nodo.contenido:
+            self.indice_contenido.agregar(nodo.id, nodo.contenido)
+    
+    def _desindexar(self, nodo: Nodo):
+        self.trie.delete(nodo.nombre, nodo.id)
+        self._quitar_nombre(nodo.nombre, nodo.id)
+        if nodo.id in self.indice_id:
+            del self.indice_id[nodo.id]
+        if nodo.tipo == NodeType.FILE.value and nodo.contenido:
+            self.indice_contenido.eliminar(nodo.id, nodo.contenido)
+    
+    def _agregar_nombre(self, nombre: str, id_nodo: str):
+        ids = self.indice_nombre[nombre]
+        if not ids:
+            self.indice_ngramas.agregar(nombre)
+        ids.add(id_nodo)
+    
+    def _quitar_nombre(self, nombre: str, id_nodo: str):
+        ids = self.indice_nombre.get(nombre)
+        if ids is None:
+            return
+        ids.discard(id_nodo)
+        if not ids:
+            del self.indice_nombre[nombre]
+            self.indice_ngramas.eliminar(nombre)
+    
     def _actualizar_indices(self, nodo: Nodo, eliminar: bool = False):
+        """Indexa (o desindexa) el subárbol de `nodo` en bloque."""
+        nodos = list(nodo.recorrer())
+        self._contar(nodos=len(nodos))
+        self._indexar_nodos(nodos, eliminar)
+    
+    def _indexar_nodos(self, nodos: List[Nodo], eliminar: bool = False):
+        """Indexa (o desindexa) varios nodos a la vez.
+        
+        Los ids se agrupan por nombre para recorrer el trie y tocar `indice_nombre`
+        una vez por nombre distinto, y `indice_id` se actualiza de una sola vez.
+        """
+        self._contar(indices=len(nodos))
+        por_nombre = defaultdict(list)
+        for actual in nodos:
+            por_nombre[actual.nombre].append(actual.id)
+        
         if eliminar:
-            self.trie.delete(nodo.nombre, nodo.id)
-            self.indice_nombre[nodo.nombre].discard(nodo.id)
-            if not self.indice_nombre[nodo.nombre]:
-                del self.indice_nombre[nodo.nombre]
-            if nodo.id in self.indice_id:
-                del self.indice_id[nodo.id]
+            for actual in nodos:
+                self.indice_id.pop(actual.id, None)
+            for nombre, ids in por_nombre.items():
+                self.trie.delete_many(nombre, ids)
+                actuales = self.indice_nombre.get(nombre)
+                if actuales is not None:
+                    actuales.difference_update(ids)
+                    if not actuales:
+                        del self.indice_nombre[nombre]
+                        self.indice_ngramas.eliminar(nombre)
         else:
-            self.trie.insert(nodo.nombre, nodo.id)
-            self.indice_nombre[nodo.nombre].add(nodo.id)
-            self.indice_id[nodo.id] = nodo
+            self.indice_id.update((actual.id, actual) for actual in nodos)
+            for nombre, ids in por_nombre.items():
+                self.trie.insert_many(nombre, ids)
+                actuales = self.indice_nombre[nombre]
+                if not actuales:
+                    self.indice_ngramas.agregar(nombre)
+                actuales.update(ids)
         
-        if nodo.tipo == NodeType.FOLDER.value:
-            for child in nodo.children:
-                self._actualizar_indices(child, eliminar)
+        for actual in nodos:
+            if actual.tipo == NodeType.FILE.value and actual.contenido:
+                if eliminar:
+                    self.indice_contenido.eliminar(actual.id, actual.contenido)
+                else:
+                    self.indice_contenido.agregar(actual.id, actual.contenido)
     
     def _actualizar_indices_renombre(self, nodo: Nodo, viejo_nombre: str):
+        self._contar(indices=1)
         self.trie.update(viejo_nombre, nodo.nombre, nodo.id)
-        self.indice_nombre[viejo_nombre].discard(nodo.id)
-        if not self.indice_nombre[viejo_nombre]:
-            del self.indice_nombre[viejo_nombre]
-        self.indice_nombre[nodo.nombre].add(nodo.id)
+        self._quitar_nombre(viejo_nombre, nodo.id)
+        self._agregar_nombre(nodo.nombre, nodo.id)
+    
+    def _asegurar_indices(self):
+        """Tras cargar una instantánea binaria, indexa el árbol completo la primera vez que hace falta."""
+        self._volcar_indices_lote()
+        if self._indices_pendientes:
+            self._indices_pendientes = False
+            self._actualizar_indices(self.raiz)
     
     # ==================== OPERACIONES BÁSICAS ====================
+    @staticmethod
+    def _nombre_valido(nombre: str) -> bool:
+        """Ni vacío ni solo espacios, sin '/' y distinto de '.' y '..', que son parte de las rutas."""
+        return bool(nombre and nombre.strip()) and '/' not in nombre and nombre not in (".", "..")
+    
     def crear_carpeta(self, nombre: str):
         try:
-            if not nombre or '/' in nombre:
+            if not self._nombre_valido(nombre):
                 raise self.SistemaError(ErrorType.INVALID_PATH, "Nombre inválido")
             
             if self.nodo_actual.buscar_por_nombre(nombre):
@@ -351,10 +2034,12 @@ class SistemaArchivos:
             nueva_carpeta = Nodo(str(self.next_id), nombre, NodeType.FOLDER.value)
             self.next_id += 1
             self.nodo_actual.agregar_hijo(nueva_carpeta)
-            self._actualizar_indices(nueva_carpeta)
+            self._indexar_alta(nueva_carpeta)
+            self._registrar("mkdir", padre=self.nodo_actual.id, id=nueva_carpeta.id, nombre=nombre)
+            self._al_deshacer(self._deshacer_alta, nueva_carpeta)
             
             self._log(f"Carpeta creada: {nombre}")
-            print(f"{Colors.GREEN}Carpeta '{nombre}' creada exitosamente.{Colors.RESET}")
+            self._notificar(f"Carpeta '{nombre}' creada exitosamente.")
             return nueva_carpeta
             
         except self.SistemaError as e:
@@ -366,7 +2051,7 @@ class SistemaArchivos:
     
     def crear_archivo(self, nombre: str, contenido: str = ""):
         try:
-            if not nombre or '/' in nombre:
+            if not self._nombre_valido(nombre):
                 raise self.SistemaError(ErrorType.INVALID_PATH, "Nombre inválido")
             
             if self.nodo_actual.buscar_por_nombre(nombre):
@@ -375,10 +2060,13 @@ class SistemaArchivos:
             nuevo_archivo = Nodo(str(self.next_id), nombre, NodeType.FILE.value, contenido)
             self.next_id += 1
             self.nodo_actual.agregar_hijo(nuevo_archivo)
-            self._actualizar_indices(nuevo_archivo)
+            self._indexar_alta(nuevo_archivo)
+            self._registrar("touch", padre=self.nodo_actual.id, id=nuevo_archivo.id,
+                            nombre=nombre, contenido=contenido)
+            self._al_deshacer(self._deshacer_alta, nuevo_archivo)
             
             self._log(f"Archivo creado: {nombre}")
-            print(f"{Colors.GREEN}Archivo '{nombre}' creado exitosamente.{Colors.RESET}")
+            self._notificar(f"Archivo '{nombre}' creado exitosamente.")
             return nuevo_archivo
             
         except self.SistemaError as e:
@@ -400,17 +2088,25 @@ class SistemaArchivos:
             if mover_a_papelera:
                 ruta_original = self._obtener_ruta(nodo)
                 self.papelera.agregar(nodo, ruta_original)
-                self.papelera.guardar()
+                if self._lote is None:
+                    self.papelera.guardar()
                 mensaje = f"'{nombre}' movido a la papelera"
             else:
-                self._actualizar_indices(nodo, eliminar=True)
                 mensaje = f"'{nombre}' eliminado permanentemente"
             
-            nodo.parent.eliminar_hijo(nodo)
+            # Lo que está en la papelera no aparece en búsquedas; se reindexa al restaurar.
+            # Los altas pendientes del lote se indexan antes para no dejar nodos sueltos.
+            self._volcar_indices_lote()
+            self._actualizar_indices(nodo, eliminar=True)
+            self._invalidar_rutas(nodo)
+            padre = nodo.parent
+            padre.eliminar_hijo(nodo)
+            self._registrar("rm", id=nodo.id, papelera=mover_a_papelera)
+            self._al_deshacer(self._deshacer_baja, nodo, padre)
             
             self._log(f"Nodo eliminado: {nombre}")
-            print(f"{Colors.YELLOW}{mensaje}.{Colors.RESET}")
-            return True
+            self._notificar(f"{mensaje}.", Colors.YELLOW)
+            return nodo
             
         except self.SistemaError as e:
             self._manejar_error(e, "eliminar_nodo")
@@ -421,7 +2117,7 @@ class SistemaArchivos:
     
     def renombrar_nodo(self, nombre_actual: str, nuevo_nombre: str):
         try:
-            if not nuevo_nombre or '/' in nuevo_nombre:
+            if not self._nombre_valido(nuevo_nombre):
                 raise self.SistemaError(ErrorType.INVALID_PATH, "Nombre inválido")
             
             nodo = self.nodo_actual.buscar_por_nombre(nombre_actual)
@@ -432,12 +2128,15 @@ class SistemaArchivos:
                 raise self.SistemaError(ErrorType.ALREADY_EXISTS, f"'{nuevo_nombre}'")
             
             viejo_nombre = nodo.nombre
-            nodo.nombre = nuevo_nombre
+            self._invalidar_rutas(nodo)
+            self.nodo_actual.renombrar_hijo(nodo, nuevo_nombre)
             self._actualizar_indices_renombre(nodo, viejo_nombre)
+            self._registrar("rename", id=nodo.id, nombre=nuevo_nombre)
+            self._al_deshacer(self._deshacer_renombre, nodo, viejo_nombre)
             
             self._log(f"Nodo renombrado: {viejo_nombre} -> {nuevo_nombre}")
-            print(f"{Colors.GREEN}'{nombre_actual}' renombrado a '{nuevo_nombre}'.{Colors.RESET}")
-            return True
+            self._notificar(f"'{nombre_actual}' renombrado a '{nuevo_nombre}'.")
+            return nodo
             
         except self.SistemaError as e:
             self._manejar_error(e, "renombrar_nodo")
@@ -452,21 +2151,32 @@ class SistemaArchivos:
             if not nodo_origen:
                 raise self.SistemaError(ErrorType.NOT_FOUND, f"'{origen}'")
             
-            nodo_destino = self.nodo_actual.buscar_por_nombre(destino_nombre)
-            if not nodo_destino or nodo_destino.tipo != NodeType.FOLDER.value:
+            # El destino se resuelve como en cd: nombre, ruta relativa, '..' o ruta absoluta
+            nodo_destino = self._resolver_ruta(destino_nombre)
+            if nodo_destino.tipo != NodeType.FOLDER.value:
                 raise self.SistemaError(ErrorType.INVALID_TYPE, f"'{destino_nombre}' no es carpeta")
             
+            ancestro = nodo_destino
+            while ancestro is not None:
+                if ancestro is nodo_origen:
+                    raise self.SistemaError(ErrorType.INVALID_PATH,
+                                          f"'{origen}' no se puede mover dentro de sí mismo")
+                ancestro = ancestro.parent
+            
             if nodo_destino.buscar_por_nombre(nodo_origen.nombre):
                 raise self.SistemaError(ErrorType.ALREADY_EXISTS, 
                                       f"'{nodo_origen.nombre}' en '{destino_nombre}'")
             
-            if nodo_origen.parent:
-                nodo_origen.parent.eliminar_hijo(nodo_origen)
+            self._invalidar_rutas(nodo_origen)
+            padre_original = nodo_origen.parent
+            padre_original.eliminar_hijo(nodo_origen)
             nodo_destino.agregar_hijo(nodo_origen)
+            self._registrar("mv", id=nodo_origen.id, destino=nodo_destino.id)
+            self._al_deshacer(self._deshacer_movimiento, nodo_origen, padre_original)
             
             self._log(f"Nodo movido: {origen} -> {destino_nombre}")
-            print(f"{Colors.GREEN}'{origen}' movido a '{destino_nombre}'.{Colors.RESET}")
-            return True
+            self._notificar(f"'{origen}' movido a '{destino_nombre}'.")
+            return nodo_origen
             
         except self.SistemaError as e:
             self._manejar_error(e, "mover_nodo")
@@ -475,57 +2185,113 @@ class SistemaArchivos:
             self._manejar_error(e, "mover_nodo")
             return False
     
+    @_gc_pausado()
+    def montar_nodos(self, nodos: Iterable[Nodo], padre: Optional[Nodo] = None) -> int:
+        """Carga en bloque subárboles ya construidos bajo `padre` (por defecto, la carpeta actual).
+    
+        Solo se validan los nombres de primer nivel. Los agregados de cada subárbol
+        se calculan en una pasada y todo se indexa junto, en vez de pagar crear_*
+        por nodo. Los ids numéricos avanzan `next_id`. Devuelve el número de nodos añadidos.
+        """
+        try:
+            padre = padre or self.nodo_actual
+            nodos = list(nodos)
+            if padre.tipo != NodeType.FOLDER.value:
+                raise self.SistemaError(ErrorType.INVALID_TYPE, f"'{padre.nombre}' no es carpeta")
+            nombres = set()
+            for nodo in nodos:
+                if not self._nombre_valido(nodo.nombre):
+                    raise self.SistemaError(ErrorType.INVALID_PATH, f"Nombre inválido '{nodo.nombre}'")
+                if nodo.nombre in nombres or padre.buscar_por_nombre(nodo.nombre):
+                    raise self.SistemaError(ErrorType.ALREADY_EXISTS, f"'{nodo.nombre}'")
+                nombres.add(nodo.nombre)
+    
+            todos = []
+            for nodo in nodos:
+                subarbol = list(nodo.recorrer())
+                # En preorden cada carpeta va antes que sus descendientes
+                for actual in reversed(subarbol):
+                    if actual.tipo == NodeType.FOLDER.value:
+                        actual.recalcular_agregados()
+                padre.agregar_hijo(nodo)
+                todos.extend(subarbol)
+                if self.diario:
+                    self._registrar("restore", padre=padre.id, nodo=nodo.to_dict())
+                self._al_deshacer(self._deshacer_alta, nodo)
+    
+            ids = [int(actual.id) for actual in todos if actual.id.isdigit()]
+            if ids:
+                self.next_id = max(self.next_id, max(ids) + 1)
+            self._contar(nodos=len(todos))
+            if self._lote is not None:
+                self._lote.nuevos.extend(todos)
+            else:
+                self._indexar_nodos(todos)
+    
+            self._log(f"Montados {len(todos)} nodos en {padre.nombre}")
+            self._notificar(f"{len(todos)} nodos cargados en '{padre.nombre}'.")
+            return len(todos)
+    
+        except self.SistemaError as e:
+            self._manejar_error(e, "montar_nodos")
+            return 0
+        except Exception as e:
+            self._manejar_error(e, "montar_nodos")
+            return 0
+    
     # ==================== PAPELERA ====================
-    def mostrar_papelera(self):
+    def mostrar_papelera(self) -> List[Dict[str, Any]]:
         items = self.papelera.listar()
-        if not items:
-            print(f"{Colors.YELLOW}La papelera está vacía.{Colors.RESET}")
-            return
-        
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.RESET}")
-        print(f"{Colors.BOLD}PAPELERA ({len(items)} elementos):{Colors.RESET}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.RESET}")
-        
-        for item in items:
-            tipo = "[DIR]" if item["tipo"] == NodeType.FOLDER.value else "[FILE]"
-            color = Colors.BLUE if item["tipo"] == NodeType.FOLDER.value else Colors.WHITE
-            print(f"{Colors.YELLOW}{item['indice']:3}.{Colors.RESET} {color}{tipo} {item['nombre']}{Colors.RESET}")
-            print(f"     Ruta original: {item['ruta_original']}")
-            print(f"     Fecha eliminación: {item['fecha']}")
-            print()
+        if self.presentador is not None:
+            self.presentador.papelera(items)
+        return items
     
-    def restaurar_de_papelera(self, indice: int):
+    def restaurar_de_papelera(self, indice):
+        """Restaura por posición (int), o por id de elemento o ruta original (str)."""
         try:
-            resultado = self.papelera.restaurar(indice)
+            if isinstance(indice, int):
+                resultado = self.papelera.restaurar(indice)
+            elif indice in self.papelera.items:
+                resultado = self.papelera.restaurar_por_id(indice)
+            else:
+                resultado = self.papelera.restaurar_por_ruta(indice)
             if not resultado:
-                raise self.SistemaError(ErrorType.NOT_FOUND, f"Índice {indice} en papelera")
+                raise self.SistemaError(ErrorType.NOT_FOUND, f"'{indice}' en papelera")
             
-            nodo, ruta_original = resultado
+            nodo = resultado.nodo
+            self._asegurar_indices()
             
-            partes = ruta_original.split("/")[1:-1]
-            destino = self.raiz
-            
-            for parte in partes:
-                if parte:
-                    encontrado = destino.buscar_por_nombre(parte)
-                    if not encontrado or encontrado.tipo != NodeType.FOLDER.value:
-                        print(f"{Colors.YELLOW}Advertencia: Carpeta original no encontrada. Restaurando en /root{Colors.RESET}")
-                        destino = self.raiz
-                        break
-                    destino = encontrado
+            # indice_id solo contiene nodos enlazados al árbol: si el padre original
+            # sigue ahí se restaura en O(1); si no, se intenta por la ruta original.
+            destino = self.indice_id.get(resultado.id_padre) if resultado.id_padre else None
+            if destino is None:
+                destino = self.buscar_por_ruta(resultado.ruta_original.rsplit("/", 1)[0] or "/")
+            if not destino or destino.tipo != NodeType.FOLDER.value:
+                self._notificar("Advertencia: Carpeta original no encontrada. Restaurando en /root", Colors.YELLOW)
+                destino = self.raiz
             
+            nombre_original = None
             if destino.buscar_por_nombre(nodo.nombre):
+                nombre_original = nodo.nombre
                 nuevo_nombre = f"{nodo.nombre}_restaurado"
-                print(f"{Colors.YELLOW}Advertencia: Ya existe '{nodo.nombre}'. Renombrando a '{nuevo_nombre}'{Colors.RESET}")
+                copia = 1
+                while destino.buscar_por_nombre(nuevo_nombre):
+                    copia += 1
+                    nuevo_nombre = f"{nombre_original}_restaurado_{copia}"
+                self._notificar(f"Advertencia: Ya existe '{nodo.nombre}'. Renombrando a '{nuevo_nombre}'", Colors.YELLOW)
                 nodo.nombre = nuevo_nombre
             
             destino.agregar_hijo(nodo)
             self._actualizar_indices(nodo)
-            self.papelera.guardar()
+            if self._lote is None:
+                self.papelera.guardar()
+            if self.diario:  # serializar un subárbol grande solo si hay diario que lo guarde
+                self._registrar("restore", padre=destino.id, nodo=nodo.to_dict())
+            self._al_deshacer(self._deshacer_alta, nodo, nombre_original)
             
             self._log(f"Restaurado de papelera: {nodo.nombre}")
-            print(f"{Colors.GREEN}'{nodo.nombre}' restaurado exitosamente.{Colors.RESET}")
-            return True
+            self._notificar(f"'{nodo.nombre}' restaurado exitosamente.")
+            return nodo
             
         except self.SistemaError as e:
             self._manejar_error(e, "restaurar_de_papelera")
@@ -541,11 +2307,12 @@ class SistemaArchivos:
             
             cantidad = len(self.papelera.items)
             self.papelera.vaciar()
-            self.papelera.guardar()
+            if self._lote is None:
+                self.papelera.guardar(forzar=True)
             
             self._log(f"Papelera vaciada ({cantidad} elementos)")
-            print(f"{Colors.YELLOW}Papelera vaciada ({cantidad} elementos eliminados permanentemente).{Colors.RESET}")
-            return True
+            self._notificar(f"Papelera vaciada ({cantidad} elementos eliminados permanentemente).", Colors.YELLOW)
+            return cantidad
             
         except self.SistemaError as e:
             self._manejar_error(e, "vaciar_papelera")
@@ -560,45 +2327,26 @@ class SistemaArchivos:
             if ruta == "/":
                 self.nodo_actual = self.raiz
                 self.ruta_actual = ["root"]
-                print(f"{Colors.BLUE}Ruta cambiada a /root{Colors.RESET}")
-                return True
+                self._notificar("Ruta cambiada a /root", Colors.BLUE)
+                return self.nodo_actual
             
             if ruta == "..":
                 if self.nodo_actual.parent:
                     self.nodo_actual = self.nodo_actual.parent
                     self.ruta_actual.pop()
-                    print(f"{Colors.BLUE}Ruta cambiada a directorio padre.{Colors.RESET}")
+                    self._notificar("Ruta cambiada a directorio padre.", Colors.BLUE)
                 else:
-                    print(f"{Colors.YELLOW}Ya estás en la raíz.{Colors.RESET}")
-                return True
-            
-            partes = ruta.split("/")
-            nodo_temp = self.nodo_actual
-            ruta_temp = self.ruta_actual.copy()
+                    self._notificar("Ya estás en la raíz.", Colors.YELLOW)
+                return self.nodo_actual
             
-            if partes[0] == "":
-                nodo_temp = self.raiz
-                ruta_temp = ["root"]
-                partes = partes[1:]
-            
-            for parte in partes:
-                if parte == "." or parte == "":
-                    continue
-                
-                encontrado = nodo_temp.buscar_por_nombre(parte)
-                if not encontrado:
-                    raise self.SistemaError(ErrorType.NOT_FOUND, f"'{parte}'")
-                
-                if encontrado.tipo != NodeType.FOLDER.value:
-                    raise self.SistemaError(ErrorType.INVALID_TYPE, f"'{parte}' no es carpeta")
-                
-                nodo_temp = encontrado
-                ruta_temp.append(parte)
+            nodo = self._resolver_ruta(ruta)
+            if nodo.tipo != NodeType.FOLDER.value:
+                raise self.SistemaError(ErrorType.INVALID_TYPE, f"'{nodo.nombre}' no es carpeta")
             
-            self.nodo_actual = nodo_temp
-            self.ruta_actual = ruta_temp
-            print(f"{Colors.BLUE}Ruta cambiada a {self.ruta_completa()}{Colors.RESET}")
-            return True
+            self.nodo_actual = nodo
+            self.ruta_actual = ["root"] if nodo is self.raiz else ["root"] + self._obtener_ruta(nodo)[1:].split("/")
+            self._notificar(f"Ruta cambiada a {self.ruta_completa()}", Colors.BLUE)
+            return self.nodo_actual
             
         except self.SistemaError as e:
             self._manejar_error(e, "cambiar_directorio")
@@ -609,233 +2357,916 @@ class SistemaArchivos:
     
     # ==================== BÚSQUEDA ====================
     def buscar_exacto(self, nombre: str) -> List[Nodo]:
+        self._asegurar_indices()
         ids = self.indice_nombre.get(nombre, set())
+        self._contar(nodos=len(ids), indices=1 + len(ids))
         return [self.indice_id[id_] for id_ in ids if id_ in self.indice_id]
     
     def buscar_por_id(self, id_nodo: str) -> Optional[Nodo]:
+        self._asegurar_indices()
         return self.indice_id.get(id_nodo)
     
-    def autocompletar(self, prefijo: str, limite: int = 10) -> List[str]:
-        ids = self.trie.search_prefix(prefijo)
+    def autocompletar(self, prefijo: str, limite: int = 10, 
+                      orden: str = Trie.ORDEN_LEXICOGRAFICO) -> List[str]:
+        self._asegurar_indices()
         nombres = set()
         resultados = []
+        candidatos = self.trie.top_k(prefijo, limite, orden)
+        self._contar(nodos=len(candidatos), indices=len(candidatos))
         
-        for id_ in ids:
-            if id_ in self.indice_id:
-                nombre = self.indice_id[id_].nombre
-                if nombre not in nombres:
-                    nombres.add(nombre)
-                    resultados.append(nombre)
-                    if len(resultados) >= limite:
-                        break
+        for _, ids in candidatos:
+            for id_ in ids:
+                if id_ in self.indice_id:
+                    nombre = self.indice_id[id_].nombre
+                    if nombre not in nombres:
+                        nombres.add(nombre)
+                        resultados.append(nombre)
+                        if len(resultados) >= limite:
+                            return resultados
         
         return resultados
     
-    def buscar_por_patron(self, patron: str, tipo: str = None) -> List[Dict[str, Any]]:
+    def buscar_por_patron(self, patron: str, tipo: str = None, limite: Optional[int] = None,
+                          sensible_mayusculas: bool = False) -> List[Dict[str, Any]]:
+        resultados = list(islice(self.iterar_por_patron(patron, tipo, sensible_mayusculas), limite))
+        self._contar(nodos=len(resultados), indices=len(resultados))
+        return resultados
+    
+    def iterar_por_patron(self, patron: str, tipo: str = None, sensible_mayusculas: bool = False):
+        """Genera los resultados de una búsqueda por subcadena o glob (`*.txt`, `dir_??`) a medida que aparecen."""
+        self._asegurar_indices()
+        for nombre in self.indice_ngramas.buscar(patron, sensible_mayusculas):
+            for id_ in self.indice_nombre.get(nombre, ()):
+                nodo = self.indice_id.get(id_)
+                if nodo is not None and (tipo is None or nodo.tipo == tipo):
+                    yield {
+                        "id": nodo.id,
+                        "nombre": nodo.nombre,
+                        "tipo": nodo.tipo,
+                        "ruta": self._obtener_ruta(nodo)
+                    }
+    
+    def buscar_difuso(self, nombre: str, max_distancia: int = 2, limite: int = 10) -> List[Dict[str, Any]]:
+        """Nodos cuyo nombre está a distancia de edición <= `max_distancia`, los más cercanos primero."""
+        self._asegurar_indices()
         resultados = []
-        patron_lower = patron.lower()
-        
-        for nombre, ids in self.indice_nombre.items():
-            if patron_lower in nombre.lower():
-                for id_ in ids:
-                    if id_ in self.indice_id:
-                        nodo = self.indice_id[id_]
-                        if tipo is None or nodo.tipo == tipo:
-                            resultados.append({
-                                "id": nodo.id,
-                                "nombre": nodo.nombre,
-                                "tipo": nodo.tipo,
-                                "ruta": self._obtener_ruta(nodo)
-                            })
-        
+        candidatos = self.trie.search_fuzzy(nombre, max_distancia)
+        self._contar(nodos=len(candidatos), indices=len(candidatos))
+        for _, distancia, ids in candidatos:
+            for id_ in sorted(ids):
+                nodo = self.indice_id.get(id_)
+                if nodo is not None:
+                    resultados.append({
+                        "id": nodo.id,
+                        "nombre": nodo.nombre,
+                        "tipo": nodo.tipo,
+                        "ruta": self._obtener_ruta(nodo),
+                        "distancia": distancia
+                    })
+                    if len(resultados) >= limite:
+                        return resultados
+        return resultados
+    
+    def buscar_contenido(self, consulta: str, limite: int = 10) -> List[Dict[str, Any]]:
+        """Archivos cuyo contenido contiene los términos (o frases entre comillas), ordenados por relevancia."""
+        self._asegurar_indices()
+        resultados = []
+        for id_, puntuacion in self.indice_contenido.buscar(consulta, limite):
+            nodo = self.indice_id.get(id_)
+            if nodo is not None:
+                resultados.append({
+                    "id": nodo.id,
+                    "nombre": nodo.nombre,
+                    "ruta": self._obtener_ruta(nodo),
+                    "puntuacion": puntuacion
+                })
+        self._contar(nodos=len(resultados), indices=len(resultados))
         return resultados
     
+    # ==================== RUTAS ====================
     def _obtener_ruta(self, nodo: Nodo) -> str:
-        partes = []
+        """Ruta absoluta de `nodo`; se cachea en él y en sus ancestros enlazados a la raíz."""
+        if nodo._ruta is not None:
+            return nodo._ruta
+        
+        cadena = []
         actual = nodo
-        while actual and actual.nombre != "root":
-            partes.append(actual.nombre)
+        while actual is not None and actual._ruta is None and actual is not self.raiz:
+            cadena.append(actual)
             actual = actual.parent
-        partes.reverse()
-        return "/" + "/".join(partes) if partes else "/root"
+        cadena.reverse()
+        
+        if actual is None:
+            # Nodo desenganchado (p. ej. en la papelera): se calcula sin cachear
+            return "/" + "/".join(n.nombre for n in cadena)
+        
+        ruta = "" if actual is self.raiz else actual._ruta
+        for n in cadena:
+            ruta = f"{ruta}/{n.nombre}"
+            n._ruta = ruta
+            self.indice_ruta[ruta] = n
+        return ruta or "/root"
     
-    # ==================== VISUALIZACIÓN ====================
-    def listar_hijos(self, detallado: bool = False):
-        if not self.nodo_actual.children:
-            print(f"{Colors.YELLOW}(vacío){Colors.RESET}")
+    def _invalidar_rutas(self, nodo: Nodo):
+        """Olvida las rutas cacheadas del subárbol de `nodo` antes de renombrarlo, moverlo o quitarlo.
+        
+        Un nodo solo tiene ruta cacheada si su padre también la tiene, así que el
+        recorrido se corta en el primer nodo sin caché y cuesta lo mismo que lo cacheado.
+        """
+        if nodo._ruta is None:
             return
+        pila = [nodo]
+        while pila:
+            actual = pila.pop()
+            if self.indice_ruta.get(actual._ruta) is actual:
+                del self.indice_ruta[actual._ruta]
+            actual._ruta = None
+            if actual._hijos:
+                pila.extend(h for h in actual._hijos.values() if h._ruta is not None)
+    
+    def _resolver_ruta(self, ruta: str, base: Optional[Nodo] = None) -> Nodo:
+        """Devuelve el nodo de `ruta` (absoluta, o relativa a `base`); lanza SistemaError si no existe."""
+        nodo = self.indice_ruta.get(ruta.rstrip("/"))
+        if nodo is not None and ruta.startswith("/"):
+            self._contar(nodos=1, indices=1)
+            return nodo
         
-        for child in self.nodo_actual.children:
-            if child.tipo == NodeType.FOLDER.value:
-                icono = "📁"
-                color = Colors.BLUE
-            else:
-                icono = "📄"
-                color = Colors.WHITE
-            
-            if detallado:
-                tamaño = child.calcular_tamano() if child.tipo == NodeType.FOLDER.value else "1"
-                print(f"{color}{icono} {child.nombre:<30} {child.tipo:<10} ID: {child.id:<8} Tamaño: {tamaño}{Colors.RESET}")
-            else:
-                print(f"{color}{icono} {child.nombre}{Colors.RESET}")
+        if not ruta.startswith("/"):
+            base = base or self.nodo_actual
+            prefijo = self._obtener_ruta(base) if base is not self.raiz else ""
+            ruta = f"{prefijo}/{ruta}"
+        
+        partes = []
+        for parte in ruta.split("/"):
+            if parte == "..":
+                if partes:
+                    partes.pop()
+            elif parte and parte != ".":
+                partes.append(parte)
+        if not partes:
+            return self.raiz
+        
+        normalizada = "/" + "/".join(partes)
+        nodo = self.indice_ruta.get(normalizada)
+        if nodo is not None:
+            self._contar(nodos=1, indices=2)
+            return nodo
+        self._contar(nodos=len(partes), indices=2)
+        
+        nodo = self.raiz
+        for parte in partes:
+            if nodo.tipo != NodeType.FOLDER.value:
+                raise self.SistemaError(ErrorType.INVALID_TYPE, f"'{nodo.nombre}' no es carpeta")
+            siguiente = nodo.buscar_por_nombre(parte)
+            if not siguiente:
+                raise self.SistemaError(ErrorType.NOT_FOUND, f"'{parte}'")
+            nodo = siguiente
+        self._obtener_ruta(nodo)
+        return nodo
+    
+    def buscar_por_ruta(self, ruta: str) -> Optional[Nodo]:
+        try:
+            return self._resolver_ruta(ruta)
+        except self.SistemaError:
+            return None
+    
+    def encontrar(self, objetivo: str) -> List[Dict[str, Any]]:
+        """Resuelve `objetivo` como ruta si contiene '/', si no como nombre exacto."""
+        if "/" in objetivo:
+            nodo = self.buscar_por_ruta(objetivo)
+            nodos = [nodo] if nodo else []
+        else:
+            nodos = self.buscar_exacto(objetivo)
+        return [{"id": nodo.id, "nombre": nodo.nombre, "tipo": nodo.tipo, "ruta": self._obtener_ruta(nodo)}
+                for nodo in nodos]
     
-    def mostrar_arbol(self, nodo: Optional[Nodo] = None, prefijo: str = "", es_ultimo: bool = True):
+    # ==================== VISUALIZACIÓN ====================
+    def listar_hijos(self, detallado: bool = False) -> List[Dict[str, Any]]:
+        """Hijos de la carpeta actual como diccionarios; el presentador, si hay, los muestra."""
+        hijos = [{
+            "id": child.id,
+            "nombre": child.nombre,
+            "tipo": child.tipo,
+            "tamano": child.calcular_tamano() if child.tipo == NodeType.FOLDER.value else 1
+        } for child in self.nodo_actual.children]
+        if self.presentador is not None:
+            self.presentador.listado(hijos, detallado)
+        return hijos
+    
+    def lineas_arbol(self, nodo: Optional[Nodo] = None):
+        """Genera (prefijo, nodo) por cada línea de `tree`, en preorden y sin recursión."""
+        if nodo is None:
+            nodo = self.nodo_actual
+        pila = [(nodo, "", True)]
+        while pila:
+            actual, prefijo, es_ultimo = pila.pop()
+            yield prefijo + ("└── " if es_ultimo else "├── "), actual
+            if actual.tipo == NodeType.FOLDER.value and actual.children:
+                nuevo_prefijo = prefijo + ("    " if es_ultimo else "│   ")
+                hijos = list(actual.children)
+                ultimo = len(hijos) - 1
+                for i in range(ultimo, -1, -1):
+                    pila.append((hijos[i], nuevo_prefijo, i == ultimo))
+    
+    def mostrar_arbol(self, nodo: Optional[Nodo] = None) -> int:
+        """Pasa las líneas al presentador según se generan; devuelve cuántas son.
+        
+        No se guardan: cada prefijo mide lo que la profundidad, y la lista entera
+        crecería con nodos × profundidad. Para obtenerlas, `lineas_arbol`.
+        """
         if nodo is None:
             nodo = self.nodo_actual
+        if self.presentador is not None:
+            self.presentador.arbol(self.lineas_arbol(nodo), self.nodo_actual)
+        return nodo.calcular_tamano()
+    
+    def ruta_completa(self):
+        return "/" + "/".join(self.ruta_actual)
+    
+    # ==================== EXPORTACIÓN ====================
+    FORMATOS_EXPORTACION = ("txt", "csv", "ndjson")
+    
+    def exportar(self, archivo: str = "preorden.txt", orden: str = Nodo.RECORRIDO_PREORDEN,
+                 formato: Optional[str] = None, subarbol: bool = False) -> int:
+        """Exporta el árbol (o el subárbol del directorio actual) recorriéndolo en `orden`.
+    
+        Las líneas se generan y escriben sobre la marcha con un búfer grande, sin
+        construir antes la lista completa. `formato` es txt, csv o ndjson; si no
+        se indica se deduce de la extensión. csv y ndjson incluyen la ruta
+        completa de cada nodo. Devuelve el número de nodos exportados (0 si falla).
+        """
+        try:
+            if formato is None:
+                extension = os.path.splitext(archivo)[1].lstrip(".").lower()
+                formato = extension if extension in self.FORMATOS_EXPORTACION else "txt"
+            if formato not in self.FORMATOS_EXPORTACION:
+                raise self.SistemaError(ErrorType.INVALID_TYPE, f"formato de exportación '{formato}'")
+            if orden not in Nodo.RECORRIDOS:
+                raise self.SistemaError(ErrorType.INVALID_TYPE, f"orden de recorrido '{orden}'")
+    
+            inicio = self.nodo_actual if subarbol else self.raiz
+            ruta_inicio = "" if inicio is self.raiz else self._obtener_ruta(inicio)
+            recorrido = inicio.recorrer_con_rutas(orden, ruta_inicio)
+            contador = [0]
+    
+            def filas():
+                for nodo, ruta in recorrido:
+                    contador[0] += 1
+                    yield nodo, ruta or "/root"
+    
+            with open(archivo, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+                if formato == "txt":
+                    f.writelines(f"{nodo.tipo.upper()}: {nodo.nombre} (ID: {nodo.id})\n" for nodo, _ in filas())
+                elif formato == "csv":
+                    escritor = csv.writer(f, lineterminator="\n")
+                    escritor.writerow(("id", "nombre", "tipo", "ruta"))
+                    escritor.writerows((nodo.id, nodo.nombre, nodo.tipo, ruta) for nodo, ruta in filas())
+                else:
+                    cadena = json.encoder.encode_basestring   # escapa como json.dumps(..., ensure_ascii=False)
+                    f.writelines(f'{{"id": {cadena(nodo.id)}, "nombre": {cadena(nodo.nombre)}, '
+                                 f'"tipo": {cadena(nodo.tipo)}, "ruta": {cadena(ruta)}}}\n'
+                                 for nodo, ruta in filas())
+    
+            self._contar(nodos=contador[0])
+            self._log(f"Exportado {orden} ({formato}, {contador[0]} nodos) a {archivo}")
+            self._notificar(f"Recorrido en {orden} exportado a '{archivo}' ({contador[0]} nodos).", Colors.GREEN)
+            return contador[0]
+        except Exception as e:
+            self._manejar_error(e, "exportar")
+            return 0
+    
+    def exportar_preorden(self, archivo: str = "preorden.txt", subarbol: bool = False) -> bool:
+        return self.exportar(archivo, Nodo.RECORRIDO_PREORDEN, "txt", subarbol) > 0
+    
+    # ==================== ESTADÍSTICAS ====================
+    def estadisticas(self) -> Dict[str, Any]:
+        self._asegurar_indices()
+        return {
+            "altura": self.raiz.calcular_altura(),
+            "tamano": self.raiz.calcular_tamano(),
+            "carpetas": self.raiz.contar_carpetas(),
+            "archivos": self.raiz.contar_archivos(),
+            "bytes_contenido": self.raiz.calcular_bytes(),
+            "papelera": len(self.papelera.items),
+            "nombres_unicos": len(self.indice_nombre),
+            "trie": self.trie.stats(),
+            "version": self.version,
+        }
+    
+    def mostrar_estadisticas(self) -> Dict[str, Any]:
+        datos = self.estadisticas()
+        if self.presentador is not None:
+            self.presentador.estadisticas(datos)
+        return datos
+    
+    # ==================== INSTRUMENTACIÓN ====================
+    OPERACIONES_INSTRUMENTADAS = (
+        "crear_carpeta", "crear_archivo", "eliminar_nodo", "renombrar_nodo", "mover_nodo", "montar_nodos",
+        "cambiar_directorio", "buscar_exacto", "buscar_por_patron", "buscar_difuso",
+        "buscar_contenido", "encontrar", "autocompletar", "guardar", "cargar",
+        "restaurar_de_papelera", "vaciar_papelera", "restaurar_backup", "exportar",
+    )
+    
+    def instrumentar(self, activo: bool = True) -> bool:
+        """Activa o desactiva la medición de las operaciones públicas.
         
-        connector = "└── " if es_ultimo else "├── "
+        Activa, cada operación de OPERACIONES_INSTRUMENTADAS se sustituye en la
+        instancia por un envoltorio que mide su latencia y los contadores. Al
+        desactivarla se quitan los envoltorios y los métodos vuelven a ser los
+        de la clase, sin coste alguno. Los datos acumulados se conservan.
+        """
+        for nombre in self.OPERACIONES_INSTRUMENTADAS:
+            self.__dict__.pop(nombre, None)
+        self._medicion = None
+        if activo:
+            if self.monitor is None:
+                self.monitor = PerformanceMonitor()
+            for nombre in self.OPERACIONES_INSTRUMENTADAS:
+                setattr(self, nombre, self._envoltorio_medido(nombre, getattr(self, nombre)))
+        return activo
+    
+    @property
+    def instrumentado(self) -> bool:
+        return "crear_carpeta" in self.__dict__
+    
+    def _envoltorio_medido(self, nombre: str, metodo: Callable) -> Callable:
+        # El sistema no es seguro entre hilos, así que la serie se actualiza sin cerrojo
+        histograma, contadores = self.monitor.series(nombre)
+        reloj = time.perf_counter_ns
         
-        if nodo == self.nodo_actual:
-            color = Colors.GREEN + Colors.BOLD
-        elif nodo.tipo == NodeType.FOLDER.value:
-            color = Colors.BLUE
-        else:
-            color = Colors.WHITE
+        def medido(*args, **kwargs):
+            anterior = self._medicion
+            medicion = self._medicion = [0, 0]   # nodos visitados, entradas de índice
+            inicio = reloj()
+            try:
+                return metodo(*args, **kwargs)
+            finally:
+                histograma.record(reloj() - inicio)
+                contadores["nodos_visitados"] = contadores.get("nodos_visitados", 0) + medicion[0]
+                contadores["entradas_indice"] = contadores.get("entradas_indice", 0) + medicion[1]
+                self._medicion = anterior
+                if anterior is not None:   # lo de una operación anidada también cuenta en la externa
+                    anterior[0] += medicion[0]
+                    anterior[1] += medicion[1]
         
-        icono = "📁" if nodo.tipo == NodeType.FOLDER.value else "📄"
+        medido.__name__ = nombre
+        medido.__doc__ = metodo.__doc__
+        return medido
+    
+    def _contar(self, nodos: int = 0, indices: int = 0):
+        """Suma a la operación medida en curso; se llama una vez por operación, no por nodo."""
+        medicion = self._medicion
+        if medicion is not None:
+            medicion[0] += nodos
+            medicion[1] += indices
+    
+    def rendimiento(self) -> Dict[str, Any]:
+        """Instantánea de latencias (ms, con percentiles) y contadores por operación."""
+        return {
+            "activo": self.instrumentado,
+            "operaciones": self.monitor.all_statistics() if self.monitor else [],
+        }
+    
+    def mostrar_rendimiento(self) -> Dict[str, Any]:
+        datos = self.rendimiento()
+        if self.presentador is not None:
+            self.presentador.rendimiento(datos)
+        return datos
+    
+    def reiniciar_rendimiento(self):
+        if self.monitor is not None:
+            self.monitor.reset()
+        self._notificar("Métricas de rendimiento reiniciadas.", Colors.YELLOW)
+    
+    def exportar_rendimiento(self, archivo: str = "rendimiento.json") -> bool:
+        """Guarda la instantánea de rendimiento en JSON o, si la extensión es .csv, en CSV."""
+        if self.monitor is None:
+            self._notificar("La instrumentación nunca se ha activado.", Colors.YELLOW)
+            return False
+        try:
+            if archivo.lower().endswith(".csv"):
+                self.monitor.export_csv(archivo)
+            else:
+                self.monitor.export_json(archivo)
+            self._notificar(f"Métricas de rendimiento exportadas a '{archivo}'.", Colors.GREEN)
+            return True
+        except Exception as e:
+            self._manejar_error(e, "exportar_rendimiento")
+            return False
+    
+    # ==================== PERSISTENCIA ====================
+    def guardar_a_json(self, archivo: Optional[str] = None) -> bool:
+        if archivo is None:
+            archivo = self.archivo_persistencia
         
-        print(f"{prefijo}{connector}{color}{icono} {nodo.nombre}{Colors.RESET}")
+        datos = {
+            "version": self.version,
+            "fecha_guardado": datetime.now().isoformat(),
+            "next_id": self.next_id
+        }
         
-        if nodo.tipo == NodeType.FOLDER.value:
-            extension = "    " if es_ultimo else "│   "
-            nuevo_prefijo = prefijo + extension
+        temporal = archivo + ".tmp"
+        try:
+            # Se escribe aparte y se sustituye de una vez: un fallo a medias no toca el archivo anterior
+            with open(temporal, "w", encoding="utf-8") as f:
+                if self.raiz.calcular_altura() <= self.PROFUNDIDAD_JSON_ANIDADO:
+                    datos["raiz"] = self.raiz.to_dict()
+                    json.dump(datos, f, indent=2, ensure_ascii=False)
+                else:
+                    # Árbol profundo: un nodo por línea con el id de su padre, sin anidar
+                    cabecera = json.dumps(datos, indent=2, ensure_ascii=False)
+                    f.write(cabecera[:-2] + ',\n  "nodos": [')
+                    separador = "\n    "
+                    for registro in self._registros_planos():
+                        f.write(separador + json.dumps(registro, ensure_ascii=False))
+                        separador = ",\n    "
+                    f.write("\n  ]\n}\n")
+            os.replace(temporal, archivo)
             
-            for i, child in enumerate(nodo.children):
-                es_ultimo_hijo = (i == len(nodo.children) - 1)
-                self.mostrar_arbol(child, nuevo_prefijo, es_ultimo_hijo)
+            self._tras_guardar(archivo)
+            return True
+        except Exception as e:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            self._manejar_error(e, "guardar_a_json")
+            return False
     
-    def ruta_completa(self):
-        return "/" + "/".join(self.ruta_actual)
+    def cargar_desde_json(self, archivo: Optional[str] = None) -> bool:
+        if archivo is None:
+            archivo = self.archivo_persistencia
+        
+        if not os.path.exists(archivo):
+            self._notificar(f"Archivo '{archivo}' no encontrado. Se inicia sistema vacío.", Colors.YELLOW)
+            return False
+        
+        estado_anterior = None
+        try:
+            with open(archivo, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            
+            if not self._validar_estructura_json(datos):
+                self._notificar("Error: El archivo JSON tiene estructura inválida.", Colors.RED)
+                return False
+            
+            if "nodos" in datos:
+                estado_anterior = self._guardar_indices()
+                self._reiniciar_indices()
+                raiz = self._construir_desde_registros(enumerate(datos["nodos"], start=1), archivo)
+            else:
+                raiz = Nodo.from_dict(datos["raiz"])
+                estado_anterior = self._guardar_indices()
+                self._reiniciar_indices()
+                self._actualizar_indices(raiz)
+            
+            self._soltar_instantanea(conservar_arbol=False)
+            self._indices_pendientes = False
+            self.version = datos.get("version", "1.0")
+            self.next_id = datos["next_id"]
+            self.raiz = raiz
+            self.nodo_actual = self.raiz
+            self.ruta_actual = ["root"]
+            self._tras_cargar(archivo)
+            return True
+            
+        except Exception as e:
+            if estado_anterior is not None:
+                self._devolver_indices(estado_anterior)
+            self._manejar_error(e, "cargar_desde_json")
+            return False
     
-    # ==================== EXPORTACIÓN ====================
-    def exportar_preorden(self, archivo: str = "preorden.txt"):
+    def guardar(self, archivo: Optional[str] = None) -> bool:
+        """Guarda eligiendo el formato por la extensión del archivo.
+        
+        Si `archivo` es la instantánea base del diario, solo se añaden al diario
+        las operaciones pendientes en lugar de reescribir el árbol completo.
+        """
+        archivo = archivo or self.archivo_persistencia
+        if self.diario and self.diario.es_base(archivo) and os.path.exists(archivo):
+            if self.diario.registros_en_disco + len(self.diario.pendientes) <= self.umbral_compactacion:
+                return self._guardar_incremental(archivo)
+        if archivo.endswith(self.EXTENSIONES_BINARIAS):
+            return self.guardar_a_binario(archivo)
+        if archivo.endswith(self.EXTENSIONES_NDJSON):
+            return self.guardar_a_ndjson(archivo)
+        return self.guardar_a_json(archivo)
+    
+    def cargar(self, archivo: Optional[str] = None) -> bool:
+        """Carga eligiendo el formato por la extensión del archivo."""
+        archivo = archivo or self.archivo_persistencia
+        if archivo.endswith(self.EXTENSIONES_BINARIAS):
+            return self.cargar_desde_binario(archivo)
+        if archivo.endswith(self.EXTENSIONES_NDJSON):
+            return self.cargar_desde_ndjson(archivo)
+        return self.cargar_desde_json(archivo)
+    
+    def _guardar_incremental(self, archivo: str) -> bool:
+        try:
+            cantidad = self.diario.volcar()
+            self.papelera.guardar(forzar=True)
+            self.historial.append({
+                "accion": "guardar_incremental",
+                "archivo": archivo,
+                "fecha": datetime.now().isoformat(),
+                "operaciones": cantidad
+            })
+            self._log(f"{cantidad} operaciones añadidas al diario de {archivo}")
+            self._notificar(f"Sistema guardado en '{archivo}' "
+                            f"({cantidad} operaciones añadidas al diario).", Colors.GREEN)
+            return True
+        except Exception as e:
+            self._manejar_error(e, "guardar_incremental")
+            return False
+    
+    def compactar_diario(self) -> bool:
+        """Reescribe la instantánea base con el estado actual y vacía su diario."""
+        if not self.diario:
+            self._notificar("No hay diario activo: guarde o cargue un sistema primero.", Colors.YELLOW)
+            return False
+        archivo = self.diario.base
+        if archivo.endswith(self.EXTENSIONES_BINARIAS):
+            return self.guardar_a_binario(archivo)
+        if archivo.endswith(self.EXTENSIONES_NDJSON):
+            return self.guardar_a_ndjson(archivo)
+        return self.guardar_a_json(archivo)
+    
+    def _tras_guardar(self, archivo: str):
+        """Pasos comunes después de escribir una instantánea completa en `archivo`."""
+        # La instantánea ya incluye todo lo que estaba en el diario
+        self.diario = DiarioOperaciones(archivo)
+        self.diario.truncar()
+        
+        self.papelera.guardar(forzar=True)
+        if self.backups.toca_automatico():
+            self._crear_backup(archivo)
+        self._contar(nodos=self.raiz.calcular_tamano())
+        
+        self.historial.append({
+            "accion": "guardar",
+            "archivo": archivo,
+            "fecha": datetime.now().isoformat(),
+            "nodos_totales": self.raiz.calcular_tamano()
+        })
+        
+        self._log(f"Sistema guardado en {archivo}")
+        self._notificar(f"Sistema guardado exitosamente en '{archivo}'.", Colors.GREEN)
+    
+    def _tras_cargar(self, archivo: str):
+        """Pasos comunes después de leer una instantánea: papelera, diario e historial."""
+        self.papelera.cargar()
+        
+        self.diario = DiarioOperaciones(archivo)
+        aplicadas = self._reproducir_diario()
+        self._contar(nodos=self.raiz.calcular_tamano())
+        
+        self.historial.append({
+            "accion": "cargar",
+            "archivo": archivo,
+            "fecha": datetime.now().isoformat(),
+            "nodos_totales": self.raiz.calcular_tamano()
+        })
+        
+        self._log(f"Sistema cargado desde {archivo}")
+        if aplicadas:
+            self._notificar(f"{aplicadas} operaciones del diario reaplicadas.", Colors.CYAN)
+        self._notificar(f"Sistema cargado exitosamente desde '{archivo}'.", Colors.GREEN)
+    
+    def _reproducir_diario(self) -> int:
+        aplicadas = 0
+        valido = 0
+        for registro, fin in self.diario.leer():
+            if aplicadas == 0:
+                self._asegurar_indices()
+            try:
+                self._aplicar_registro(registro)
+            except Exception as e:
+                self._notificar("Advertencia: diario detenido en la operación "
+                      f"{aplicadas + 1} ({e}).", Colors.YELLOW)
+                break
+            aplicadas += 1
+            valido = fin
+        # Lo que no se pudo aplicar se descarta: si no, los próximos guardados se añadirían detrás
+        descartados = self.diario.recortar(valido)
+        if descartados:
+            self._log(f"{descartados} bytes descartados al final de {self.diario.archivo}", NivelLog.WARNING)
+            self._notificar(f"Advertencia: se descartaron {descartados} bytes no aplicables "
+                            "al final del diario.", Colors.YELLOW)
+        self.diario.registros_en_disco = aplicadas
+        return aplicadas
+    
+    def _aplicar_registro(self, registro: Dict[str, Any]):
+        """Repite sobre el árbol una operación leída del diario, sin validar ni imprimir."""
+        op = registro["op"]
+        if op in ("mkdir", "touch"):
+            tipo = NodeType.FOLDER.value if op == "mkdir" else NodeType.FILE.value
+            nodo = Nodo(registro["id"], registro["nombre"], tipo, registro.get("contenido"))
+            self.indice_id[registro["padre"]].agregar_hijo(nodo)
+            self._indexar(nodo)
+            if nodo.id.isdigit():
+                self.next_id = max(self.next_id, int(nodo.id) + 1)
+        elif op == "rm":
+            nodo = self.indice_id[registro["id"]]
+            self._invalidar_rutas(nodo)
+            nodo.parent.eliminar_hijo(nodo)
+            self._actualizar_indices(nodo, eliminar=True)
+        elif op == "rename":
+            nodo = self.indice_id[registro["id"]]
+            viejo_nombre = nodo.nombre
+            self._invalidar_rutas(nodo)
+            nodo.parent.renombrar_hijo(nodo, registro["nombre"])
+            self._actualizar_indices_renombre(nodo, viejo_nombre)
+        elif op == "mv":
+            nodo = self.indice_id[registro["id"]]
+            self._invalidar_rutas(nodo)
+            nodo.parent.eliminar_hijo(nodo)
+            self.indice_id[registro["destino"]].agregar_hijo(nodo)
+        elif op == "restore":
+            nodo = Nodo.from_dict(registro["nodo"])
+            self.indice_id[registro["padre"]].agregar_hijo(nodo)
+            self._actualizar_indices(nodo)
+        else:
+            raise ValueError(f"operación desconocida '{op}'")
+    
+    def _registrar(self, op: str, **datos):
+        if self.diario:
+            self.diario.registrar(op, **datos)
+    
+    def guardar_a_binario(self, archivo: Optional[str] = None) -> bool:
+        if archivo is None:
+            archivo = self.archivo_persistencia
+        
+        temporal = archivo + ".tmp"
+        try:
+            if self._instantanea and self._instantanea.archivo == os.path.abspath(archivo):
+                # No se puede reescribir el archivo que está mapeado: se trae todo a memoria antes
+                self._soltar_instantanea()
+            
+            InstantaneaBinaria.escribir(temporal, self.raiz, self.next_id, self.version)
+            os.replace(temporal, archivo)
+            
+            self._tras_guardar(archivo)
+            return True
+        except Exception as e:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            self._manejar_error(e, "guardar_a_binario")
+            return False
+    
+    def cargar_desde_binario(self, archivo: Optional[str] = None) -> bool:
+        """Abre la instantánea con mmap y solo crea la raíz; el resto se crea al recorrerlo."""
+        if archivo is None:
+            archivo = self.archivo_persistencia
+        
+        if not os.path.exists(archivo):
+            self._notificar(f"Archivo '{archivo}' no encontrado. Se inicia sistema vacío.", Colors.YELLOW)
+            return False
+        
+        estado_anterior = None
+        instantanea = None
         try:
-            lista = self.raiz.preorden()
-            with open(archivo, "w", encoding="utf-8") as f:
-                for nombre, tipo, id_nodo in lista:
-                    f.write(f"{tipo.upper()}: {nombre} (ID: {id_nodo})\n")
+            instantanea = InstantaneaBinaria(archivo)
+            raiz = instantanea.crear_nodo(0)
             
-            self._log(f"Exportado preorden a {archivo}")
-            print(f"{Colors.GREEN}Recorrido en preorden exportado a '{archivo}'.{Colors.RESET}")
+            self._soltar_instantanea(conservar_arbol=False)
+            self._instantanea = instantanea
+            estado_anterior = self._guardar_indices()
+            self._reiniciar_indices()
+            self._indices_pendientes = True
+            
+            self.version = instantanea.cadena(instantanea.version_cadena)
+            self.next_id = instantanea.next_id
+            self.raiz = raiz
+            self.nodo_actual = self.raiz
+            self.ruta_actual = ["root"]
+            self._indexar(self.raiz)
+            self._tras_cargar(archivo)
             return True
+            
         except Exception as e:
-            self._manejar_error(e, "exportar_preorden")
+            if instantanea is not None and instantanea is not self._instantanea:
+                instantanea.cerrar()
+            if estado_anterior is not None:
+                self._devolver_indices(estado_anterior)
+            self._manejar_error(e, "cargar_desde_binario")
             return False
     
-    # ==================== ESTADÍSTICAS ====================
-    def mostrar_estadisticas(self):
-        altura = self.raiz.calcular_altura()
-        tamano = self.raiz.calcular_tamano()
-        carpetas = sum(1 for id_ in self.indice_id.values() if id_.tipo == NodeType.FOLDER.value)
-        archivos = sum(1 for id_ in self.indice_id.values() if id_.tipo == NodeType.FILE.value)
+    def _soltar_instantanea(self, conservar_arbol: bool = True):
+        """Crea en memoria todo lo que aún dependa de la instantánea abierta y la cierra.
         
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.RESET}")
-        print(f"{Colors.BOLD}ESTADÍSTICAS DEL SISTEMA:{Colors.RESET}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.RESET}")
-        print(f"{Colors.WHITE}Altura del árbol: {Colors.GREEN}{altura}{Colors.RESET}")
-        print(f"{Colors.WHITE}Tamaño total (nodos): {Colors.GREEN}{tamano}{Colors.RESET}")
-        print(f"{Colors.WHITE}Carpetas: {Colors.BLUE}{carpetas}{Colors.RESET}")
-        print(f"{Colors.WHITE}Archivos: {Colors.WHITE}{archivos}{Colors.RESET}")
-        print(f"{Colors.WHITE}Elementos en papelera: {Colors.YELLOW}{len(self.papelera.items)}{Colors.RESET}")
-        print(f"{Colors.WHITE}Tamaño del índice: {Colors.MAGENTA}{len(self.indice_nombre)} nombres únicos{Colors.RESET}")
-        print(f"{Colors.WHITE}Versión del sistema: {Colors.CYAN}{self.version}{Colors.RESET}")
+        Si el árbol se va a sustituir (`conservar_arbol=False`) solo se trae la papelera.
+        """
+        if self._instantanea is None:
+            return
+        pendientes = [item.nodo for item in self.papelera.items.values()]
+        if conservar_arbol:
+            pendientes.append(self.raiz)
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo.tipo == NodeType.FOLDER.value:
+                pendientes.extend(nodo.children)
+            else:
+                nodo.contenido
+        self._instantanea.cerrar()
+        self._instantanea = None
     
-    # ==================== PERSISTENCIA ====================
-    def guardar_a_json(self, archivo: Optional[str] = None) -> bool:
+    def guardar_a_ndjson(self, archivo: Optional[str] = None) -> bool:
+        """Escribe una cabecera y luego un registro por nodo en preorden, con el id de su padre."""
         if archivo is None:
             archivo = self.archivo_persistencia
         
-        if os.path.exists(archivo):
-            self._crear_backup(archivo)
-        
-        datos = {
-            "version": self.version,
-            "fecha_guardado": datetime.now().isoformat(),
-            "next_id": self.next_id,
-            "raiz": self.raiz.to_dict()
-        }
-        
+        temporal = archivo + ".tmp"
         try:
-            with open(archivo, "w", encoding="utf-8") as f:
-                json.dump(datos, f, indent=2, ensure_ascii=False)
-            
-            self.papelera.guardar()
-            
-            self.historial.append({
-                "accion": "guardar",
-                "archivo": archivo,
-                "fecha": datetime.now().isoformat(),
-                "nodos_totales": self.raiz.calcular_tamano()
-            })
+            with open(temporal, "w", encoding="utf-8", buffering=1 << 20) as f:
+                f.write(json.dumps({
+                    "formato": "ndjson",
+                    "version": self.version,
+                    "fecha_guardado": datetime.now().isoformat(),
+                    "next_id": self.next_id
+                }, ensure_ascii=False) + "\n")
+                
+                for registro in self._registros_planos():
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            os.replace(temporal, archivo)
             
-            self._log(f"Sistema guardado en {archivo}")
-            print(f"{Colors.GREEN}Sistema guardado exitosamente en '{archivo}'.{Colors.RESET}")
+            self._tras_guardar(archivo)
             return True
         except Exception as e:
-            self._manejar_error(e, "guardar_a_json")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            self._manejar_error(e, "guardar_a_ndjson")
             return False
     
-    def cargar_desde_json(self, archivo: Optional[str] = None) -> bool:
+    def cargar_desde_ndjson(self, archivo: Optional[str] = None) -> bool:
+        """Lee nodo a nodo: valida cada registro, lo enlaza a su padre y lo indexa en la misma pasada."""
         if archivo is None:
             archivo = self.archivo_persistencia
         
         if not os.path.exists(archivo):
-            print(f"{Colors.YELLOW}Archivo '{archivo}' no encontrado. Se inicia sistema vacío.{Colors.RESET}")
+            self._notificar(f"Archivo '{archivo}' no encontrado. Se inicia sistema vacío.", Colors.YELLOW)
             return False
         
+        estado_anterior = self._guardar_indices()
+        self._reiniciar_indices()
+        
         try:
             with open(archivo, "r", encoding="utf-8") as f:
-                datos = json.load(f)
-            
-            if not self._validar_estructura_json(datos):
-                print(f"{Colors.RED}Error: El archivo JSON tiene estructura inválida.{Colors.RESET}")
-                return False
-            
-            self.trie = Trie()
-            self.indice_nombre = defaultdict(set)
-            self.indice_id = {}
+                cabecera = json.loads(f.readline() or "{}")
+                if cabecera.get("formato") != "ndjson" or "next_id" not in cabecera:
+                    raise self.SistemaError(ErrorType.INVALID_PATH, f"Cabecera NDJSON inválida en '{archivo}'")
+                
+                raiz = self._construir_desde_registros(
+                    ((numero_linea, json.loads(linea)) for numero_linea, linea in enumerate(f, start=2)
+                     if linea.strip()), archivo)
             
-            self.version = datos.get("version", "1.0")
-            self.next_id = datos["next_id"]
-            self.raiz = Nodo.from_dict(datos["raiz"])
+            self._soltar_instantanea(conservar_arbol=False)
+            self._indices_pendientes = False
+            self.version = cabecera.get("version", "1.0")
+            self.next_id = cabecera["next_id"]
+            self.raiz = raiz
             self.nodo_actual = self.raiz
             self.ruta_actual = ["root"]
+            self._tras_cargar(archivo)
+            return True
             
-            self._actualizar_indices(self.raiz)
-            self.papelera.cargar()
+        except Exception as e:
+            self._devolver_indices(estado_anterior)
+            self._manejar_error(e, "cargar_desde_ndjson")
+            return False
+    
+    def _registros_planos(self) -> Iterable[Dict[str, Any]]:
+        """Un registro por nodo en preorden, con el id de su padre (NDJSON y JSON plano)."""
+        for nodo in self.raiz.recorrer():
+            yield {
+                "id": nodo.id,
+                "nombre": nodo.nombre,
+                "tipo": nodo.tipo,
+                "contenido": nodo.contenido,
+                "padre": nodo.parent.id if nodo.parent else None
+            }
+    
+    def _construir_desde_registros(self, registros: Iterable[Tuple[int, Dict[str, Any]]], archivo: str) -> Nodo:
+        """Enlaza e indexa los registros (número, registro) en preorden; devuelve la raíz."""
+        raiz = None
+        carpetas = []
+        for numero_linea, registro in registros:
+            nodo = self._nodo_desde_registro(registro, raiz is None, numero_linea)
             
-            self.historial.append({
-                "accion": "cargar",
-                "archivo": archivo,
-                "fecha": datetime.now().isoformat(),
-                "nodos_totales": self.raiz.calcular_tamano()
-            })
+            if raiz is None:
+                raiz = nodo
+            else:
+                padre = self.indice_id[registro["padre"]]
+                padre.agregar_hijo(nodo, propagar=False)
             
-            self._log(f"Sistema cargado desde {archivo}")
-            print(f"{Colors.GREEN}Sistema cargado exitosamente desde '{archivo}'.{Colors.RESET}")
+            self._indexar(nodo)
+            if nodo.tipo == NodeType.FOLDER.value:
+                carpetas.append(nodo)
+        
+        if raiz is None:
+            raise self.SistemaError(ErrorType.NOT_FOUND, f"Nodo raíz en '{archivo}'")
+        
+        # Preorden invertido: cada carpeta se calcula después de todas sus descendientes
+        for carpeta in reversed(carpetas):
+            carpeta.recalcular_agregados()
+        return raiz
+    
+    def _nodo_desde_registro(self, registro: Dict[str, Any], es_raiz: bool, numero_linea: int) -> Nodo:
+        """Valida un registro plano contra lo ya leído y crea su nodo."""
+        def invalido(motivo: str):
+            return self.SistemaError(ErrorType.INVALID_PATH, f"Línea {numero_linea}: {motivo}")
+        
+        if not isinstance(registro, dict) or not all(k in registro for k in ("id", "nombre", "tipo", "padre")):
+            raise invalido("faltan campos obligatorios")
+        if registro["tipo"] not in _TIPOS:
+            raise invalido(f"tipo '{registro['tipo']}' desconocido")
+        if registro["id"] in self.indice_id:
+            raise invalido(f"id '{registro['id']}' duplicado")
+        
+        if es_raiz:
+            if registro["padre"] is not None or registro["tipo"] != NodeType.FOLDER.value:
+                raise invalido("el primer nodo debe ser la carpeta raíz")
+        else:
+            padre = self.indice_id.get(registro["padre"])
+            if padre is None:
+                raise invalido(f"padre '{registro['padre']}' no definido antes que el hijo")
+            if padre.tipo != NodeType.FOLDER.value:
+                raise invalido(f"el padre '{registro['padre']}' no es carpeta")
+            if padre.buscar_por_nombre(registro["nombre"]):
+                raise invalido(f"nombre '{registro['nombre']}' repetido en la misma carpeta")
+        
+        return Nodo(registro["id"], registro["nombre"], registro["tipo"], registro.get("contenido"))
+    
+    def crear_backup(self) -> bool:
+        """Backup a petición del estado en memoria, sin esperar al intervalo automático."""
+        return self._crear_backup(self.diario.base if self.diario else self.archivo_persistencia)
+    
+    def _crear_backup(self, archivo_original: str) -> bool:
+        """Guarda el estado recién escrito en `archivo_original` como backup deduplicado."""
+        try:
+            manifiesto = self.backups.crear(self.raiz, self.next_id, self.version, archivo_original)
+            borrados, _ = self.backups.aplicar_retencion()
+            self._notificar(f"Backup creado: {manifiesto['nombre']} "
+                            f"({manifiesto['bloques_nuevos']} bloques nuevos)", Colors.YELLOW)
+            if borrados:
+                self._notificar(f"{borrados} backups antiguos eliminados.", Colors.YELLOW)
             return True
-            
         except Exception as e:
-            self._manejar_error(e, "cargar_desde_json")
+            self._notificar(f"Error al crear backup: {e}", Colors.RED)
             return False
     
-    def _crear_backup(self, archivo_original: str) -> bool:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"backup_{timestamp}_{os.path.basename(archivo_original)}"
+    def mostrar_backups(self) -> List[Dict[str, Any]]:
+        manifiestos = self.backups.listar()
+        if self.presentador is not None:
+            self.presentador.backups(manifiestos)
+        return manifiestos
+    
+    def restaurar_backup(self, indice: int) -> bool:
+        """Sustituye el árbol en memoria por el del backup `indice` (0 = el más reciente)."""
+        estado_anterior = None
         try:
-            shutil.copy2(archivo_original, backup_file)
-            print(f"{Colors.YELLOW}Backup creado: {backup_file}{Colors.RESET}")
+            manifiestos = self.backups.listar()
+            if not 0 <= indice < len(manifiestos):
+                raise self.SistemaError(ErrorType.NOT_FOUND, f"Backup {indice}")
+            manifiesto = manifiestos[indice]
+            raiz = self.backups.restaurar(manifiesto)
+            
+            estado_anterior = self._guardar_indices()
+            self._reiniciar_indices()
+            self._soltar_instantanea(conservar_arbol=False)
+            self._indices_pendientes = False
+            self.version = manifiesto["version"]
+            self.next_id = manifiesto["next_id"]
+            self.raiz = raiz
+            self.nodo_actual = self.raiz
+            self.ruta_actual = ["root"]
+            self._actualizar_indices(self.raiz)
+            # El diario ya no describe este árbol: el próximo guardado será completo
+            self.diario = None
+            
+            self._log(f"Backup restaurado: {manifiesto['nombre']}")
+            self._notificar(f"Backup '{manifiesto['nombre']}' restaurado "
+                            f"({manifiesto['nodos']} nodos).", Colors.GREEN)
             return True
         except Exception as e:
-            print(f"{Colors.RED}Error al crear backup: {e}{Colors.RESET}")
+            if estado_anterior is not None:
+                self._devolver_indices(estado_anterior)
+            self._manejar_error(e, "restaurar_backup")
             return False
     
+    def podar_backups(self):
+        borrados, bloques = self.backups.aplicar_retencion()
+        self._notificar(f"{borrados} backups y {bloques} bloques sin uso eliminados.", Colors.YELLOW)
+    
     def _validar_estructura_json(self, datos: Dict[str, Any]) -> bool:
+        if "nodos" in datos:
+            # Formato plano: cada registro se valida al enlazarlo
+            return "next_id" in datos and isinstance(datos["nodos"], list)
+        
         required_keys = ["version", "next_id", "raiz"]
         if not all(key in datos for key in required_keys):
             return False
         
-        def validar_nodo(nodo_dict: Dict[str, Any]) -> bool:
+        pila = [datos["raiz"]]
+        while pila:
+            nodo_dict = pila.pop()
             if not all(k in nodo_dict for k in ["id", "nombre", "tipo"]):
                 return False
             if nodo_dict["tipo"] not in [NodeType.FOLDER.value, NodeType.FILE.value]:
@@ -843,22 +3274,133 @@ class SistemaArchivos:
             if nodo_dict["tipo"] == NodeType.FOLDER.value:
                 if "children" not in nodo_dict:
                     return False
-                for child in nodo_dict["children"]:
-                    if not validar_nodo(child):
-                        return False
-            return True
-        
-        return validar_nodo(datos["raiz"])
+                pila.extend(nodo_dict["children"])
+        return True
     
     # ==================== LOG ====================
     def toggle_log(self, activar: Optional[bool] = None):
         if activar is None:
             activar = not self.log_activo
         
+        if not activar and self.log_activo:
+            self.registro.volcar()
         self.log_activo = activar
         estado = "activado" if activar else "desactivado"
-        color = Colors.GREEN if activar else Colors.YELLOW
-        print(f"{color}Log {estado}.{Colors.RESET}")
+        self._notificar(f"Log {estado}.", Colors.GREEN if activar else Colors.YELLOW)
+        return activar
+    
+    def nivel_log(self, nivel: str) -> bool:
+        """Fija el nivel mínimo (debug, info, warning, error) de lo que se escribe en el log."""
+        try:
+            self.registro.nivel_minimo = NivelLog[nivel.upper()]
+        except KeyError:
+            self._manejar_error(self.SistemaError(ErrorType.INVALID_TYPE, f"nivel de log '{nivel}'"), "nivel_log")
+            return False
+        self._notificar(f"Nivel de log: {self.registro.nivel_minimo.name}.", Colors.GREEN)
+        return True
+
+# ==================== PRESENTACIÓN EN CONSOLA ====================
+class PresentadorConsola:
+    """Muestra con colores en la terminal lo que devuelve SistemaArchivos; lo usa main_interfaz."""
+    
+    def mensaje(self, texto: str, color: str = Colors.GREEN):
+        print(f"{color}{texto}{Colors.RESET}")
+    
+    def error(self, error: Exception, operacion: str):
+        if isinstance(error, SistemaArchivos.SistemaError):
+            print(f"{Colors.RED}Error: {error}{Colors.RESET}")
+        else:
+            print(f"{Colors.RED}Error inesperado en {operacion}: {error}{Colors.RESET}")
+    
+    def listado(self, hijos: List[Dict[str, Any]], detallado: bool = False):
+        if not hijos:
+            print(f"{Colors.YELLOW}(vacío){Colors.RESET}")
+            return
+        
+        for child in hijos:
+            if child["tipo"] == NodeType.FOLDER.value:
+                icono = "📁"
+                color = Colors.BLUE
+            else:
+                icono = "📄"
+                color = Colors.WHITE
+            
+            if detallado:
+                print(f"{color}{icono} {child['nombre']:<30} {child['tipo']:<10} ID: {child['id']:<8} "
+                      f"Tamaño: {child['tamano']}{Colors.RESET}")
+            else:
+                print(f"{color}{icono} {child['nombre']}{Colors.RESET}")
+    
+    def arbol(self, lineas: Iterable[Tuple[str, Nodo]], nodo_actual: Optional[Nodo] = None):
+        for prefijo, nodo in lineas:
+            if nodo is nodo_actual:
+                color = Colors.GREEN + Colors.BOLD
+            elif nodo.tipo == NodeType.FOLDER.value:
+                color = Colors.BLUE
+            else:
+                color = Colors.WHITE
+            icono = "📁" if nodo.tipo == NodeType.FOLDER.value else "📄"
+            print(f"{prefijo}{color}{icono} {nodo.nombre}{Colors.RESET}")
+    
+    def papelera(self, items: List[Dict[str, Any]]):
+        if not items:
+            print(f"{Colors.YELLOW}La papelera está vacía.{Colors.RESET}")
+            return
+        
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.RESET}")
+        print(f"{Colors.BOLD}PAPELERA ({len(items)} elementos):{Colors.RESET}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.RESET}")
+        
+        for item in items:
+            tipo = "[DIR]" if item["tipo"] == NodeType.FOLDER.value else "[FILE]"
+            color = Colors.BLUE if item["tipo"] == NodeType.FOLDER.value else Colors.WHITE
+            print(f"{Colors.YELLOW}{item['indice']:3}.{Colors.RESET} {color}{tipo} {item['nombre']}{Colors.RESET}")
+            print(f"     Ruta original: {item['ruta_original']}")
+            print(f"     Fecha eliminación: {item['fecha']}")
+            print()
+    
+    def estadisticas(self, datos: Dict[str, Any]):
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.RESET}")
+        print(f"{Colors.BOLD}ESTADÍSTICAS DEL SISTEMA:{Colors.RESET}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.RESET}")
+        print(f"{Colors.WHITE}Altura del árbol: {Colors.GREEN}{datos['altura']}{Colors.RESET}")
+        print(f"{Colors.WHITE}Tamaño total (nodos): {Colors.GREEN}{datos['tamano']}{Colors.RESET}")
+        print(f"{Colors.WHITE}Carpetas: {Colors.BLUE}{datos['carpetas']}{Colors.RESET}")
+        print(f"{Colors.WHITE}Archivos: {Colors.WHITE}{datos['archivos']}{Colors.RESET}")
+        print(f"{Colors.WHITE}Contenido total: {Colors.WHITE}{datos['bytes_contenido']} bytes{Colors.RESET}")
+        print(f"{Colors.WHITE}Elementos en papelera: {Colors.YELLOW}{datos['papelera']}{Colors.RESET}")
+        print(f"{Colors.WHITE}Tamaño del índice: {Colors.MAGENTA}{datos['nombres_unicos']} nombres únicos{Colors.RESET}")
+        print(f"{Colors.WHITE}Trie: {Colors.MAGENTA}{datos['trie']['nodos']} nodos, "
+              f"~{datos['trie']['bytes_estimados'] / 1024:.1f} KB{Colors.RESET}")
+        print(f"{Colors.WHITE}Versión del sistema: {Colors.CYAN}{datos['version']}{Colors.RESET}")
+    
+    def rendimiento(self, datos: Dict[str, Any]):
+        estado = f"{Colors.GREEN}activa" if datos["activo"] else f"{Colors.YELLOW}desactivada"
+        print(f"\n{Colors.CYAN}{'='*96}{Colors.RESET}")
+        print(f"{Colors.BOLD}RENDIMIENTO POR OPERACIÓN{Colors.RESET} (instrumentación {estado}{Colors.RESET})")
+        print(f"{Colors.CYAN}{'='*96}{Colors.RESET}")
+        if not datos["operaciones"]:
+            print(f"{Colors.YELLOW}Sin mediciones todavía.{Colors.RESET}")
+            return
+        print(f"{Colors.BOLD}{'operación':<24}{'llamadas':>9}{'media ms':>10}{'p50 ms':>9}{'p95 ms':>9}"
+              f"{'p99 ms':>9}{'máx ms':>9}{'nodos/op':>9}{'índ/op':>9}{Colors.RESET}")
+        for op in datos["operaciones"]:
+            llamadas = op["count"]
+            print(f"{op['operation']:<24}{llamadas:>9}{op['time_avg_ms']:>10.3f}{op['time_p50_ms']:>9.3f}"
+                  f"{op['time_p95_ms']:>9.3f}{op['time_p99_ms']:>9.3f}{op['time_max_ms']:>9.3f}"
+                  f"{op.get('nodos_visitados', 0) / llamadas:>9.1f}{op.get('entradas_indice', 0) / llamadas:>9.1f}")
+    
+    def backups(self, manifiestos: List[Dict[str, Any]]):
+        if not manifiestos:
+            print(f"{Colors.YELLOW}No hay backups.{Colors.RESET}")
+            return
+        
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.RESET}")
+        print(f"{Colors.BOLD}BACKUPS ({len(manifiestos)}):{Colors.RESET}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.RESET}")
+        for i, manifiesto in enumerate(manifiestos):
+            print(f"{Colors.YELLOW}{i:3}.{Colors.RESET} {manifiesto['fecha']}  {manifiesto['archivo']}  "
+                  f"{manifiesto['nodos']} nodos, {manifiesto['bloques_nuevos']} bloques nuevos")
     
     # ==================== INTERFAZ DE CONSOLA ====================
     def mostrar_ayuda(self, comando_especifico: str = None):
@@ -872,19 +3414,24 @@ class SistemaArchivos:
             "rename": "rename <viejo> <nuevo> - Renombra un nodo",
             "rm": "rm <nombre> [-p] - Elimina un nodo (-p para eliminación permanente)",
             "trash": "trash - Muestra el contenido de la papelera",
-            "restore": "restore <índice> - Restaura un elemento de la papelera",
+            "restore": "restore <índice|id|ruta_original> - Restaura un elemento de la papelera",
             "emptytrash": "emptytrash - Vacía la papelera permanentemente",
             "tree": "tree [ruta] - Muestra la estructura en formato árbol",
-            "search": "search <término> [--exact] [--type dir/file] - Busca nodos",
-            "autocomplete": "autocomplete <prefijo> [límite] - Autocompletado de nombres",
-            "find": "find <nombre_exacto> - Busca nodos con nombre exacto",
-            "export": "export [archivo] - Exporta recorrido en preorden",
+            "search": "search <término|glob> [--exact] [--case] [--type dir/file] [--limit N] - Busca nodos",
+            "autocomplete": "autocomplete <prefijo> [límite] [--popular] - Autocompletado de nombres",
+            "find": "find <nombre_exacto|ruta> - Busca nodos con nombre exacto o resuelve una ruta absoluta",
+            "fuzzy": "fuzzy <nombre> [distancia_máxima] - Busca nombres parecidos (tolera errores de escritura)",
+            "grep": "grep <términos | \"frase\"> [--limit N] - Busca texto dentro de los archivos",
+            "export": "export [archivo] [--orden preorden|postorden|niveles] [--formato txt|csv|ndjson] [--aqui] - Exporta el recorrido del árbol",
             "stats": "stats - Muestra estadísticas del sistema",
+            "perf": "perf [on|off|reset|export <archivo.json|.csv>] - Latencias y contadores por operación",
             "history": "history [límite] - Muestra historial de operaciones",
-            "log": "log [on/off] - Activa/desactiva el registro de log",
+            "log": "log [on/off | debug/info/warning/error] - Activa/desactiva el log o fija su nivel mínimo",
             "clear": "clear - Limpia la pantalla",
-            "save": "save [archivo] - Guarda el sistema en disco",
-            "load": "load [archivo] - Carga el sistema desde disco",
+            "save": "save [archivo] - Guarda el sistema en disco (.ndjson/.jsonl por líneas, .bin/.snap binario)",
+            "load": "load [archivo] - Carga el sistema desde disco (formato según la extensión)",
+            "compact": "compact - Reescribe la instantánea base y vacía su diario de operaciones",
+            "backups": "backups [create | restore <índice> | prune] - Lista, crea, restaura o poda los backups",
             "help": "help [comando] - Muestra esta ayuda",
             "exit": "exit - Sale del sistema (pregunta para guardar)"
         }
@@ -903,9 +3450,9 @@ class SistemaArchivos:
                 "Navegación y visualización": ["ls", "pwd", "cd", "tree"],
                 "Manipulación de archivos": ["mkdir", "touch", "mv", "rename", "rm"],
                 "Papelera": ["trash", "restore", "emptytrash"],
-                "Búsqueda": ["search", "autocomplete", "find"],
-                "Exportación y estadísticas": ["export", "stats"],
-                "Sistema y utilidades": ["history", "log", "clear", "save", "load", "help", "exit"]
+                "Búsqueda": ["search", "autocomplete", "find", "fuzzy", "grep"],
+                "Exportación y estadísticas": ["export", "stats", "perf"],
+                "Sistema y utilidades": ["history", "log", "clear", "save", "load", "compact", "backups", "help", "exit"]
             }
             
             for categoria, comandos in categorias.items():
@@ -919,8 +3466,8 @@ class SistemaArchivos:
     def clear_screen(self):
         os.system('cls' if os.name == 'nt' else 'clear')
     
-    def obtener_prompt(self) -> str:
-        ruta = self.ruta_completa()
+    def obtener_prompt(self, sistema: SistemaArchivos) -> str:
+        ruta = sistema.ruta_completa()
         usuario = os.getenv('USERNAME') or os.getenv('USER') or "usuario"
         
         prompt = f"{Colors.GREEN}{usuario}{Colors.RESET}:"
@@ -930,46 +3477,198 @@ class SistemaArchivos:
         return prompt
 
 # ==================== CLASES DE TESTING (DÍAS 10-11) ====================
-class PerformanceMonitor:
-    """Monitor de performance para operaciones."""
+class LatencyHistogram:
+    """Histograma log-lineal de latencias en ns con memoria constante.
+    
+    Cada potencia de dos se divide en 16 cubetas, así que los percentiles
+    tienen un error relativo menor al 6,25 %; media, mínimo, máximo y
+    desviación son exactos.
+    """
+    
+    NUM_BUCKETS = 64 * 16   # 16 cubetas por potencia de dos hasta 2**64 ns
+    
+    __slots__ = ("buckets", "count", "total_ns", "total_sq", "min_ns", "max_ns")
     
     def __init__(self):
-        self.metrics = defaultdict(list)
+        self.clear()
+    
+    def clear(self):
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.total_sq = 0
+        self.min_ns = 1 << 64
+        self.max_ns = 0
+    
+    @staticmethod
+    def _bucket_mid(index: int) -> float:
+        if index < 32:
+            return float(index)
+        shift = index // 16 - 1
+        return ((index % 16 + 16) << shift) + (1 << shift) / 2
+    
+    def record(self, value_ns: int):
+        if value_ns < 32:
+            if value_ns < 0:
+                value_ns = 0
+            self.buckets[value_ns] += 1
+        else:
+            shift = value_ns.bit_length() - 5
+            self.buckets[(shift << 4) + (value_ns >> shift)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        self.total_sq += value_ns * value_ns
+        if value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+    
+    def percentile(self, q: float) -> float:
+        """Valor en ns por debajo del cual queda la fracción `q` (0-1) de las muestras."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(max(self._bucket_mid(index), self.min_ns), self.max_ns)
+        return float(self.max_ns)
+    
+    def stdev(self) -> float:
+        n = self.count
+        if n < 2:
+            return 0.0
+        return math.sqrt((n * self.total_sq - self.total_ns * self.total_ns) / (n * (n - 1)))
+
+class _Span(ContextDecorator):
+    """Tramo medido por PerformanceMonitor.measure; sirve como `with` y como decorador."""
+    
+    def __init__(self, monitor: 'PerformanceMonitor', name: str):
+        self.monitor = monitor
+        self.name = name
+    
+    def __enter__(self):
+        self.monitor.start_operation(self.name)
+        return self
+    
+    def __exit__(self, *exc):
+        self.monitor._finish(self.name)
+        return False
+
+class PerformanceMonitor:
+    """Monitor de performance para operaciones.
+    
+    Cada hilo tiene su propia pila de tramos abiertos, así que las operaciones
+    anidadas o concurrentes no se pisan. Los tiempos se toman con
+    `perf_counter_ns` y se acumulan en un histograma por operación, de modo
+    que la memoria no crece con el número de muestras.
+    """
+    
+    PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._series = {}   # operación -> (LatencyHistogram, contadores)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    @property
+    def metrics(self) -> Dict[str, LatencyHistogram]:
+        """Histogramas por nombre de operación."""
+        return {name: histogram for name, (histogram, _) in self._series.items()}
+    
+    def _stack(self) -> List[Tuple[str, int]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
     
     def start_operation(self, operation_name: str):
-        self.start_time = time.time()
+        if self.enabled:
+            self._stack().append((operation_name, time.perf_counter_ns()))
+    
+    def _finish(self, operation_name: str) -> Optional[Tuple[int, int, List[Tuple[str, int]]]]:
+        """Cierra el tramo abierto más reciente con ese nombre; devuelve (ns, profundidad, pila)."""
+        fin = time.perf_counter_ns()
+        stack = getattr(self._local, "stack", None)
+        if not stack:
+            return None
+        pos = len(stack) - 1
+        if stack[pos][0] != operation_name:
+            while pos >= 0 and stack[pos][0] != operation_name:
+                pos -= 1
+            if pos < 0:
+                return None
+        elapsed_ns = fin - stack.pop(pos)[1]
+        self.record(operation_name, elapsed_ns)
+        return elapsed_ns, pos, stack
     
     def end_operation(self, operation_name: str) -> Dict[str, Any]:
-        if not hasattr(self, 'start_time') or self.start_time is None:
+        cerrado = self._finish(operation_name)
+        if cerrado is None:
             return {}
         
-        elapsed_time = time.time() - self.start_time
-        
-        metrics = {
+        elapsed_ns, pos, stack = cerrado
+        return {
             'operation': operation_name,
-            'time_ms': elapsed_time * 1000,
-            'timestamp': datetime.now().isoformat()
+            'time_ms': elapsed_ns / 1e6,
+            'timestamp': datetime.now().isoformat(),
+            'depth': pos,
+            'parent': stack[pos - 1][0] if pos else None
         }
+    
+    def series(self, operation_name: str) -> Tuple[LatencyHistogram, Dict[str, int]]:
+        """Histograma y contadores de la operación, creándolos si no existen.
         
-        self.metrics[operation_name].append(metrics)
-        self.start_time = None
-        
-        return metrics
+        Los objetos se reutilizan tras `reset`, así que quien mide en caliente
+        puede guardarlos y actualizarlos directamente.
+        """
+        series = self._series.get(operation_name)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(operation_name, (LatencyHistogram(), {}))
+        return series
+    
+    def record(self, operation_name: str, elapsed_ns: int, **counters: int):
+        """Añade una muestra ya medida (en ns) a la operación y suma los contadores dados."""
+        histogram, totals = self.series(operation_name)
+        with self._lock:
+            histogram.record(elapsed_ns)
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+    
+    def measure(self, operation_name: str) -> _Span:
+        """Mide un bloque (`with monitor.measure("x"):`) o una función (`@monitor.measure("x")`)."""
+        return _Span(self, operation_name)
+    
+    def reset(self):
+        with self._lock:
+            for histogram, totals in self._series.values():
+                histogram.clear()
+                totals.clear()
     
     def get_statistics(self, operation_name: str) -> Dict[str, Any]:
-        if operation_name not in self.metrics or not self.metrics[operation_name]:
-            return {}
-        
-        times = [m['time_ms'] for m in self.metrics[operation_name]]
-        
-        return {
-            'operation': operation_name,
-            'count': len(times),
-            'time_avg_ms': statistics.mean(times),
-            'time_min_ms': min(times),
-            'time_max_ms': max(times),
-            'time_std_ms': statistics.stdev(times) if len(times) > 1 else 0
-        }
+        with self._lock:
+            histogram, totals = self._series.get(operation_name, (None, None))
+            if histogram is None or not histogram.count:
+                return {}
+            
+            stats = {
+                'operation': operation_name,
+                'count': histogram.count,
+                'time_avg_ms': histogram.total_ns / histogram.count / 1e6,
+                'time_min_ms': histogram.min_ns / 1e6,
+                'time_max_ms': histogram.max_ns / 1e6,
+                'time_std_ms': histogram.stdev() / 1e6
+            }
+            for label, q in self.PERCENTILES:
+                stats[f'time_{label}_ms'] = histogram.percentile(q) / 1e6
+            stats.update(totals)
+            return stats
+    
+    def all_statistics(self) -> List[Dict[str, Any]]:
+        return [stats for stats in map(self.get_statistics, sorted(self._series)) if stats]
     
     def generate_report(self) -> str:
         report = []
@@ -977,15 +3676,15 @@ class PerformanceMonitor:
         report.append("REPORTE DE PERFORMANCE DEL SISTEMA DE ARCHIVOS")
         report.append("=" * 80)
         
-        for operation in sorted(self.metrics.keys()):
-            stats = self.get_statistics(operation)
-            if stats:
-                report.append(f"\nOperación: {operation}")
-                report.append(f"  Ejecuciones: {stats['count']}")
-                report.append(f"  Tiempo promedio: {stats['time_avg_ms']:.2f} ms")
-                report.append(f"  Tiempo mínimo: {stats['time_min_ms']:.2f} ms")
-                report.append(f"  Tiempo máximo: {stats['time_max_ms']:.2f} ms")
-                report.append(f"  Desviación estándar: {stats['time_std_ms']:.2f} ms")
+        for stats in self.all_statistics():
+            report.append(f"\nOperación: {stats['operation']}")
+            report.append(f"  Ejecuciones: {stats['count']}")
+            report.append(f"  Tiempo promedio: {stats['time_avg_ms']:.2f} ms")
+            report.append(f"  Tiempo mínimo: {stats['time_min_ms']:.2f} ms")
+            report.append(f"  Tiempo máximo: {stats['time_max_ms']:.2f} ms")
+            report.append(f"  Desviación estándar: {stats['time_std_ms']:.2f} ms")
+            report.append("  Percentiles: " + ", ".join(
+                f"{label} {stats[f'time_{label}_ms']:.3f} ms" for label, _ in self.PERCENTILES))
         
         report.append("\n" + "=" * 80)
         return "\n".join(report)
@@ -994,118 +3693,558 @@ class PerformanceMonitor:
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(self.generate_report())
         print(f"Reporte de performance guardado en '{filename}'")
+    
+    def export_json(self, filename: str = "performance_report.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({"generated": datetime.now().isoformat(), "operations": self.all_statistics()},
+                      f, indent=2, ensure_ascii=False)
+    
+    def export_csv(self, filename: str = "performance_report.csv"):
+        rows = self.all_statistics()
+        columns = ['operation', 'count', 'time_avg_ms', 'time_min_ms', 'time_max_ms', 'time_std_ms']
+        columns += [f'time_{label}_ms' for label, _ in self.PERCENTILES]
+        columns += sorted({key for row in rows for key in row} - set(columns))
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval=0, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
 
 class TreeGenerator:
-    """Generador de árboles aleatorios para testing."""
+    """Generador de árboles aleatorios para testing.
+    
+    Construye los Nodo directamente y los carga con `SistemaArchivos.montar_nodos`,
+    que calcula agregados e índices en una pasada, en vez de llamar a crear_*
+    por cada nodo. Toda la aleatoriedad sale de `self.rng`: una misma semilla
+    da el mismo árbol y el `random` global no se toca.
+    """
+    
+    SHAPES = ("wide", "deep", "balanced", "zipf")
     
     def __init__(self, seed: Optional[int] = None):
-        if seed is not None:
-            random.seed(seed)
+        self.rng = random.Random(seed)
+        self._zipf_weights = {}
+        self._text = None
+    
+    # ---------- distribuciones ----------
+    def sample(self, distribution) -> int:
+        """Entero no negativo según `distribution`.
+        
+        Puede ser un int (valor fijo), ("uniform", a, b), ("geometric", media),
+        ("lognormal", mu, sigma) o ("zipf", s, máximo).
+        """
+        if isinstance(distribution, int):
+            return distribution
+        kind, *params = distribution
+        rng = self.rng
+        if kind == "uniform":
+            return rng.randint(params[0], params[1])
+        if kind == "geometric":
+            p = 1 / (params[0] + 1)
+            return int(math.log(1 - rng.random()) / math.log(1 - p))
+        if kind == "lognormal":
+            return int(rng.lognormvariate(params[0], params[1]))
+        if kind == "zipf":
+            s, maximum = params
+            weights = self._zipf_weights.get((s, maximum))
+            if weights is None:
+                weights = self._zipf_weights[(s, maximum)] = list(
+                    accumulate(1 / k ** s for k in range(1, maximum + 1)))
+            return rng.choices(range(1, maximum + 1), cum_weights=weights)[0]
+        raise ValueError(f"distribución desconocida '{kind}'")
     
     def generate_random_name(self, length: int = 8) -> str:
         letters = string.ascii_lowercase + string.digits
-        return ''.join(random.choice(letters) for _ in range(length))
+        return ''.join(self.rng.choices(letters, k=length))
+    
+    def generate_content(self, size: int) -> str:
+        """Texto de unas `size` letras, trozo de un texto aleatorio de palabras generado una vez."""
+        if size <= 0:
+            return ""
+        if self._text is None:
+            words = [self.generate_random_name(self.rng.randint(3, 9)) for _ in range(500)]
+            self._text = " ".join(self.rng.choices(words, k=8192))
+        text = self._text
+        while len(text) < size:
+            text += " " + self._text
+        start = self.rng.randrange(len(text) - size + 1)
+        return text[start:start + size]
+    
+    # ---------- generación en bloque ----------
+    def _builder(self, sistema):
+        """Devuelve (nuevo, primer_nivel): `nuevo(padre, nombre, es_carpeta, contenido)` crea
+        un Nodo con el siguiente id libre y lo enlaza a `padre`, o a `primer_nivel` si padre es None."""
+        ids = iter(range(sistema.next_id, sys.maxsize))
+        top_level = []
+        
+        def nuevo(padre, nombre, es_carpeta, contenido=None):
+            nodo = Nodo(str(next(ids)), nombre,
+                        NodeType.FOLDER.value if es_carpeta else NodeType.FILE.value, contenido)
+            if padre is None:
+                top_level.append(nodo)
+            else:
+                padre.agregar_hijo(nodo, propagar=False)
+            return nodo
+        
+        return nuevo, top_level
+    
+    @_gc_pausado()
+    def generate(self, sistema, num_nodes: int, parent: Optional[Nodo] = None,
+                 fan_out=("geometric", 8), depth=("uniform", 3, 8), file_probability: float = 0.7,
+                 content_size=("lognormal", 3, 1)) -> int:
+        """Añade exactamente `num_nodes` nodos bajo `parent` (por defecto, la carpeta actual).
+        
+        Se crean ramas de primer nivel `gen_<k>`; cada rama sortea su profundidad
+        máxima con `depth` y cada carpeta su número de hijos con `fan_out`. Bajo
+        esa profundidad un hijo es archivo con probabilidad `file_probability`, y
+        cada archivo lleva un contenido de `content_size` letras. Las carpetas se
+        expanden por niveles y, si la rama se agota, se abre otra. Devuelve los
+        nodos añadidos.
+        """
+        parent = parent or sistema.nodo_actual
+        nuevo, top_level = self._builder(sistema)
+        created = 0
+        branch = 0
+        pending = deque()   # (carpeta, profundidad, profundidad máxima de su rama)
+        
+        while created < num_nodes:
+            if not pending:
+                branch += 1
+                while parent.buscar_por_nombre(f"gen_{branch}"):
+                    branch += 1
+                pending.append((nuevo(None, f"gen_{branch}", True), 1, max(1, self.sample(depth))))
+                created += 1
+                continue
+            
+            folder, level, max_level = pending.popleft()
+            for j in range(self.sample(fan_out)):
+                if created >= num_nodes:
+                    break
+                if level < max_level and self.rng.random() >= file_probability:
+                    pending.append((nuevo(folder, f"dir_{j}", True), level + 1, max_level))
+                else:
+                    nuevo(folder, f"file_{j}.txt", False, self.generate_content(self.sample(content_size)))
+                created += 1
+        
+        sistema.montar_nodos(top_level, parent)
+        return created
+    
+    @_gc_pausado()
+    def build_shape(self, sistema, shape: str, num_nodes: int, fan_out: int = 1000, depth: int = 1000,
+                    zipf_s: float = 1.1) -> int:
+        """Añade `num_nodes` nodos bajo la raíz de `sistema` con la forma pedida.
+        
+        - wide: carpetas con `fan_out` archivos cada una.
+        - deep: cadenas de `depth` carpetas, cada una con un archivo.
+        - balanced: árbol por niveles con 8 hijos por carpeta; las hojas son archivos.
+        - zipf: árbol aleatorio cuyos nombres siguen una ley de Zipf (muchos repetidos).
+        
+        Devuelve el número de nodos añadidos.
+        """
+        if shape not in self.SHAPES:
+            raise ValueError(f"forma desconocida '{shape}'")
+        
+        rng = self.rng
+        nuevo, top_level = self._builder(sistema)
+        created = 0
+        
+        if shape == "wide":
+            carpeta = None
+            for i in range(num_nodes):
+                if i % fan_out == 0:
+                    carpeta = nuevo(None, f"wide_{i // fan_out}", True)
+                else:
+                    nuevo(carpeta, f"file_{i % fan_out}.txt", False)
+            created = num_nodes
+        
+        elif shape == "deep":
+            carpeta = None
+            for i in range(num_nodes):
+                nivel = i // 2 % depth
+                if i % 2:
+                    nuevo(carpeta, f"file_{nivel}.txt", False)
+                elif nivel == 0:
+                    carpeta = nuevo(None, f"deep_{i // (2 * depth)}", True)
+                else:
+                    carpeta = nuevo(carpeta, f"level_{nivel}", True)
+            created = num_nodes
+        
+        elif shape == "balanced":
+            pendientes = deque([nuevo(None, "balanced", True)]) if num_nodes else deque()
+            created = len(pendientes)
+            while pendientes and created < num_nodes:
+                padre = pendientes.popleft()
+                for j in range(8):
+                    restantes = num_nodes - created
+                    if not restantes:
+                        break
+                    # Solo se abren carpetas nuevas mientras las ya pendientes no basten para el resto
+                    if len(pendientes) * 8 < restantes:
+                        pendientes.append(nuevo(padre, f"dir_{j}", True))
+                    else:
+                        nuevo(padre, f"file_{j}.txt", False)
+                    created += 1
+        
+        else:
+            vocabulario = [f"name_{k}" for k in range(max(100, num_nodes // 10))]
+            pesos = list(accumulate(1 / (k + 1) ** zipf_s for k in range(len(vocabulario))))
+            nombres = rng.choices(vocabulario, cum_weights=pesos, k=num_nodes)
+            padres = [None]   # None es el primer nivel, bajo la raíz
+            en_primer_nivel = set()
+            for nombre in nombres:
+                padre = padres[rng.randrange(len(padres))]
+                base, n = nombre, 1
+                while nombre in en_primer_nivel if padre is None else padre.buscar_por_nombre(nombre):
+                    n += 1
+                    nombre = f"{base}~{n}"
+                if padre is None:
+                    en_primer_nivel.add(nombre)
+                if rng.random() < 0.2:
+                    padres.append(nuevo(padre, nombre, True))
+                else:
+                    nuevo(padre, nombre, False)
+            created = num_nodes
+        
+        sistema.montar_nodos(top_level, sistema.raiz)
+        return created
     
+    @_gc_pausado()
     def generate_random_tree(self, sistema, max_depth: int = 5, max_children: int = 5, 
                            max_files_per_folder: int = 3, probability_file: float = 0.3):
-        def generate_recursive(current_node, current_depth, path):
-            if current_depth >= max_depth:
-                return
-            
-            num_children = random.randint(0, max_children)
+        """Árbol aleatorio bajo la raíz: hasta `max_children` hijos y `max_files_per_folder` archivos por carpeta.
+        
+        La raíz recibe al menos un hijo, para que ninguna semilla deje el árbol vacío.
+        """
+        nuevo, top_level = self._builder(sistema)
+        pila = [(None, 0)]   # (carpeta, profundidad); None es la raíz
+        
+        while pila:
+            carpeta, profundidad = pila.pop()
+            if profundidad >= max_depth:
+                continue
             
-            for _ in range(num_children):
-                is_file = random.random() < probability_file and current_depth < max_depth - 1
-                
+            usados = set() if carpeta is None else None
+            archivos = 0
+            minimo = min(1, max_children) if carpeta is None else 0
+            for _ in range(self.rng.randint(minimo, max_children)):
+                is_file = (self.rng.random() < probability_file and profundidad < max_depth - 1
+                           and archivos < max_files_per_folder)
                 if is_file:
                     nombre = f"file_{self.generate_random_name(6)}.txt"
-                    contenido = f"Contenido aleatorio {self.generate_random_name(10)}"
-                    
-                    old_node = sistema.nodo_actual
-                    old_path = sistema.ruta_actual.copy()
-                    
-                    sistema.nodo_actual = current_node
-                    sistema.ruta_actual = path.copy()
-                    
-                    sistema.crear_archivo(nombre, contenido)
-                    
-                    sistema.nodo_actual = old_node
-                    sistema.ruta_actual = old_path
                 else:
                     nombre = f"dir_{self.generate_random_name(6)}"
-                    
-                    old_node = sistema.nodo_actual
-                    old_path = sistema.ruta_actual.copy()
-                    
-                    sistema.nodo_actual = current_node
-                    sistema.ruta_actual = path.copy()
-                    
-                    nueva_carpeta = sistema.crear_carpeta(nombre)
-                    
-                    if nueva_carpeta:
-                        new_path = path + [nombre]
-                        generate_recursive(nueva_carpeta, current_depth + 1, new_path)
-                    
-                    sistema.nodo_actual = old_node
-                    sistema.ruta_actual = old_path
-        
-        generate_recursive(sistema.raiz, 0, ["root"])
+                
+                # Como con crear_*, un nombre repetido en la misma carpeta se descarta
+                if carpeta is None:
+                    if nombre in usados or sistema.raiz.buscar_por_nombre(nombre):
+                        continue
+                    usados.add(nombre)
+                elif carpeta.buscar_por_nombre(nombre):
+                    continue
+                
+                if is_file:
+                    nuevo(carpeta, nombre, False, f"Contenido aleatorio {self.generate_random_name(10)}")
+                    archivos += 1
+                else:
+                    pila.append((nuevo(carpeta, nombre, True), profundidad + 1))
+        
+        sistema.montar_nodos(top_level, sistema.raiz)
     
+    @_gc_pausado()
     def generate_stress_tree(self, sistema, num_nodes: int = 1000):
-        print(f"Generando árbol de estrés con {num_nodes} nodos...")
+        sistema._notificar(f"Generando árbol de estrés con {num_nodes} nodos...", Colors.CYAN)
         
+        nuevo, top_level = self._builder(sistema)
         nodes_created = 0
-        current_folder = sistema.raiz
+        current_folder = None   # la raíz
         
         while nodes_created < num_nodes:
             files_to_create = min(10, num_nodes - nodes_created)
             for i in range(files_to_create):
-                nombre = f"stress_file_{nodes_created + i:06d}.txt"
-                contenido = f"Contenido de archivo de estrés {nodes_created + i}"
-                
-                old_node = sistema.nodo_actual
-                sistema.nodo_actual = current_folder
-                
-                sistema.crear_archivo(nombre, contenido)
-                
-                sistema.nodo_actual = old_node
-                nodes_created += 1
+                nuevo(current_folder, f"stress_file_{nodes_created + i:06d}.txt", False,
+                      f"Contenido de archivo de estrés {nodes_created + i}")
+            nodes_created += files_to_create
             
             if nodes_created < num_nodes and nodes_created % 100 == 0:
-                folder_name = f"stress_folder_{nodes_created // 100:04d}"
-                
-                old_node = sistema.nodo_actual
-                sistema.nodo_actual = current_folder
-                
-                nueva_carpeta = sistema.crear_carpeta(folder_name)
-                
-                sistema.nodo_actual = old_node
-                
-                if nueva_carpeta:
-                    current_folder = nueva_carpeta
+                current_folder = nuevo(current_folder, f"stress_folder_{nodes_created // 100:04d}", True)
+        
+        sistema.montar_nodos(top_level, sistema.raiz)
+        sistema._notificar(f"Árbol de estrés generado con {nodes_created} nodos.")
+
+class BenchmarkSuite:
+    """Benchmarks reproducibles de SistemaArchivos sobre árboles de TreeGenerator.
+    
+    Para cada forma y tamaño construye el árbol con una semilla fija, mide cada
+    operación con calentamiento y repeticiones (mediana del tiempo por llamada),
+    opcionalmente el pico de memoria con tracemalloc, y calcula la pendiente de
+    escalado entre tamaños. Los resultados se guardan en JSON y se pueden
+    comparar con una línea base.
+    """
+    
+    DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+    OPERATIONS = ("cd", "buscar_exacto", "buscar_por_patron", "autocompletar", "buscar_difuso",
+                  "crear_archivo", "eliminar_nodo", "exportar", "guardar", "cargar", "backup")
+    # Operaciones que recorren el árbol entero: una llamada por repetición
+    WHOLE_TREE = ("exportar", "guardar", "cargar", "backup")
+    
+    def __init__(self, sizes: Iterable[int] = DEFAULT_SIZES, shapes: Iterable[str] = TreeGenerator.SHAPES,
+                 operations: Iterable[str] = OPERATIONS, warmup: int = 1, repeats: int = 5,
+                 samples: int = 200, seed: int = 42, track_memory: bool = True, verbose: bool = True):
+        self.sizes = tuple(sizes)
+        self.shapes = tuple(shapes)
+        self.operations = tuple(operations)
+        self.warmup = warmup
+        self.repeats = repeats
+        self.samples = samples
+        self.seed = seed
+        self.track_memory = track_memory
+        self.verbose = verbose
+    
+    # ---------- preparación ----------
+    def _context(self, sistema: SistemaArchivos, rng: random.Random) -> Dict[str, Any]:
+        """Entradas de las operaciones, muestreadas una vez por árbol con la semilla del suite."""
+        nodos = [nodo for nodo in sistema.indice_id.values() if nodo is not sistema.raiz]
+        muestra = rng.sample(nodos, min(self.samples, len(nodos)))
+        nombres = [nodo.nombre for nodo in muestra]
+        carpetas = [nodo.parent for nodo in muestra]
+        
+        def variante(nombre):
+            i = rng.randrange(len(nombre))
+            return nombre[:i] + "x" + nombre[i + 1:]
+        
+        return {
+            "rutas": [sistema._obtener_ruta(carpeta) for carpeta in carpetas],
+            "nombres": nombres,
+            "subcadenas": [nombre[len(nombre) // 3:len(nombre) // 3 + 3] for nombre in nombres],
+            "prefijos": [nombre[:2] for nombre in nombres],
+            "difusos": [variante(nombre) for nombre in nombres[:max(1, len(nombres) // 10)]],
+            "temporal": sistema.crear_carpeta("bench_tmp"),
+            "creados": deque(),
+            "contador": 0,
+        }
+    
+    def _operation(self, name: str, sistema: SistemaArchivos, ctx: Dict[str, Any]) -> Tuple[Callable[[], Any], int]:
+        """Devuelve (función que hace una tanda de llamadas, número de llamadas de la tanda)."""
+        if name == "cd":
+            def run():
+                for ruta in ctx["rutas"]:
+                    sistema.cambiar_directorio(ruta)
+            return run, len(ctx["rutas"])
+        if name == "buscar_exacto":
+            return lambda: [sistema.buscar_exacto(n) for n in ctx["nombres"]], len(ctx["nombres"])
+        if name == "buscar_por_patron":
+            return (lambda: [sistema.buscar_por_patron(s, limite=20) for s in ctx["subcadenas"]],
+                    len(ctx["subcadenas"]))
+        if name == "autocompletar":
+            return lambda: [sistema.autocompletar(p, 10) for p in ctx["prefijos"]], len(ctx["prefijos"])
+        if name == "buscar_difuso":
+            return lambda: [sistema.buscar_difuso(n, 1, 10) for n in ctx["difusos"]], len(ctx["difusos"])
+        if name == "crear_archivo":
+            def run():
+                sistema.nodo_actual = ctx["temporal"]
+                for _ in range(self.samples):
+                    ctx["contador"] += 1
+                    nombre = f"bench_{ctx['contador']}.txt"
+                    sistema.crear_archivo(nombre, "x")
+                    ctx["creados"].append(nombre)
+            return run, self.samples
+        if name == "eliminar_nodo":
+            # Cada tanda borra archivos creados antes; si crear_archivo no se midió, se crean ahora
+            sistema.nodo_actual = ctx["temporal"]
+            while len(ctx["creados"]) < self.samples * (self.warmup + self.repeats + 1):
+                ctx["contador"] += 1
+                ctx["creados"].append(f"bench_{ctx['contador']}.txt")
+                sistema.crear_archivo(ctx["creados"][-1], "x")
+            
+            def run():
+                sistema.nodo_actual = ctx["temporal"]
+                for _ in range(min(self.samples, len(ctx["creados"]))):
+                    sistema.eliminar_nodo(ctx["creados"].popleft(), mover_a_papelera=False)
+            return run, self.samples
+        if name == "exportar":
+            return lambda: sistema.exportar("bench_export.ndjson"), 1
+        if name == "guardar":
+            # Los backups automáticos están desactivados: solo se mide la instantánea
+            return lambda: sistema.guardar_a_ndjson("bench_sistema.ndjson"), 1
+        if name == "backup":
+            # Backup completo: cada llamada usa un almacén vacío, sin bloques que reaprovechar
+            def run():
+                ctx["contador"] += 1
+                sistema.backups = GestorBackups(f"bench_backups_{ctx['contador']}", intervalo=None)
+                sistema.crear_backup()
+            return run, 1
+        if name == "cargar":
+            def run():
+                sistema.cargar_desde_ndjson("bench_sistema.ndjson")
+                ctx["temporal"] = sistema.raiz.buscar_por_nombre("bench_tmp")
+            return run, 1
+        raise ValueError(f"operación desconocida '{name}'")
+    
+    # ---------- medición ----------
+    def _measure(self, run: Callable[[], Any], calls: int) -> Dict[str, float]:
+        for _ in range(self.warmup):
+            run()
+        tiempos = []
+        for _ in range(self.repeats):
+            inicio = time.perf_counter_ns()
+            run()
+            tiempos.append((time.perf_counter_ns() - inicio) / calls / 1e6)
+        resultado = {
+            "calls": calls,
+            "median_ms": statistics.median(tiempos),
+            "min_ms": min(tiempos),
+            "max_ms": max(tiempos),
+        }
+        if self.track_memory:
+            tracemalloc.start()
+            run()
+            resultado["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        return resultado
+    
+    def _build(self, shape: str, size: int) -> Tuple[SistemaArchivos, Dict[str, Any]]:
+        sistema = SistemaArchivos(instrumentacion=False)
+        sistema.backups.intervalo = None
+        inicio = time.perf_counter_ns()
+        TreeGenerator(seed=self.seed).build_shape(sistema, shape, size)
+        tiempo_ms = (time.perf_counter_ns() - inicio) / 1e6
+        fila = {"shape": shape, "nodes": size, "operation": "construir", "calls": 1,
+                "median_ms": tiempo_ms, "min_ms": tiempo_ms, "max_ms": tiempo_ms}
+        if self.track_memory:
+            # Segunda construcción, solo para medir memoria: tracemalloc falsea los tiempos
+            tracemalloc.start()
+            TreeGenerator(seed=self.seed).build_shape(SistemaArchivos(instrumentacion=False), shape, size)
+            fila["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        return sistema, fila
+    
+    def run(self) -> Dict[str, Any]:
+        """Ejecuta todas las combinaciones en un directorio temporal y devuelve los resultados."""
+        filas = []
+        directorio_original = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix="bench_") as directorio:
+            os.chdir(directorio)
+            try:
+                for shape in self.shapes:
+                    for size in self.sizes:
+                        sistema, fila = self._build(shape, size)
+                        filas.append(fila)
+                        self._print(fila)
+                        ctx = self._context(sistema, random.Random(self.seed))
+                        for operacion in self.operations:
+                            fila = {"shape": shape, "nodes": size, "operation": operacion}
+                            fila.update(self._measure(*self._operation(operacion, sistema, ctx)))
+                            filas.append(fila)
+                            self._print(fila)
+                        del sistema, ctx
+            finally:
+                os.chdir(directorio_original)
+        
+        return {
+            "meta": {
+                "fecha": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "seed": self.seed,
+                "warmup": self.warmup,
+                "repeats": self.repeats,
+                "samples": self.samples,
+            },
+            "results": filas,
+            "scaling": self.scaling(filas),
+        }
+    
+    @staticmethod
+    def scaling(filas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Pendiente log-log del tiempo frente al número de nodos entre tamaños consecutivos (1 = lineal)."""
+        series = defaultdict(list)
+        for fila in filas:
+            series[(fila["shape"], fila["operation"])].append((fila["nodes"], fila["median_ms"]))
+        curvas = []
+        for (shape, operacion), puntos in series.items():
+            puntos.sort()
+            pendientes = [
+                round(math.log(t2 / t1) / math.log(n2 / n1), 3)
+                for (n1, t1), (n2, t2) in zip(puntos, puntos[1:]) if t1 > 0 and t2 > 0 and n2 > n1
+            ]
+            curvas.append({"shape": shape, "operation": operacion, "points": puntos, "slopes": pendientes})
+        return curvas
+    
+    def _print(self, fila: Dict[str, Any]):
+        if self.verbose:
+            memoria = f"{fila['peak_kb']:>10.1f} KB" if "peak_kb" in fila else ""
+            print(f"{fila['shape']:<9}{fila['nodes']:>9} {fila['operation']:<18}"
+                  f"{fila['median_ms']:>12.4f} ms/llamada{memoria}")
+    
+    # ---------- persistencia y comparación ----------
+    @staticmethod
+    def save(results: Dict[str, Any], filename: str = "benchmark_results.json"):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    
+    @staticmethod
+    def load(filename: str) -> Dict[str, Any]:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    @staticmethod
+    def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.10,
+                min_ms: float = 0.001) -> List[Dict[str, Any]]:
+        """Filas más lentas que la línea base en más de `threshold` (0.10 = 10 %).
         
-        print(f"Árbol de estrés generado con {nodes_created} nodos.")
+        Se comparan medianas por (forma, nodos, operación); las medianas base por
+        debajo de `min_ms` se ignoran porque ahí domina el ruido del reloj.
+        """
+        base = {(f["shape"], f["nodes"], f["operation"]): f["median_ms"] for f in baseline["results"]}
+        regresiones = []
+        for fila in results["results"]:
+            anterior = base.get((fila["shape"], fila["nodes"], fila["operation"]))
+            if anterior is None or anterior < min_ms:
+                continue
+            ratio = fila["median_ms"] / anterior
+            if ratio > 1 + threshold:
+                regresiones.append({"shape": fila["shape"], "nodes": fila["nodes"], "operation": fila["operation"],
+                                    "baseline_ms": anterior, "current_ms": fila["median_ms"], "ratio": ratio})
+        return regresiones
 
 class IntegrationTester:
-    """Ejecutor de pruebas de integración."""
+    """Ejecutor de pruebas de integración.
+    
+    Cada prueba es un método `test_*` registrado en TESTS con su grupo y su
+    nombre; así `run_parallel` puede lanzarlas por nombre en otros procesos.
+    """
+    
+    TESTS = (
+        ("edge", "Nombres especiales", "test_nombres_especiales"),
+        ("edge", "Rutas profundas (20 niveles)", "test_rutas_profundas"),
+        ("edge", "Papelera bajo estrés", "test_papelera_estres"),
+        ("edge", "Búsqueda en árbol grande", "test_busqueda_masiva"),
+        ("performance", "Performance árbol pequeño", "test_performance_pequeno"),
+        ("performance", "Performance árbol mediano", "test_performance_mediano"),
+        ("performance", "Operaciones individuales", "test_operaciones_individuales"),
+        ("performance", "Suite de benchmarks (1k nodos)", "test_suite_benchmarks"),
+        ("integration", "Integración completa", "test_integracion"),
+    )
     
     def __init__(self, sistema_class):
         self.sistema_class = sistema_class
         self.test_results = []
         self.performance_monitor = PerformanceMonitor()
     
+    def _tests(self, group: str) -> List[Tuple[str, str]]:
+        return [(name, method) for grupo, name, method in self.TESTS if grupo == group]
+    
     def run_test(self, test_name: str, test_func: Callable, *args, **kwargs) -> bool:
         print(f"\n{'='*60}")
         print(f"Ejecutando prueba: {test_name}")
         print(f"{'='*60}")
-        
+    
         try:
             self.performance_monitor.start_operation(test_name)
-            
+    
             result = test_func(*args, **kwargs)
-            
+    
             metrics = self.performance_monitor.end_operation(test_name)
-            
+    
             if result:
                 print(f"✅ {test_name}: PASÓ")
                 self.test_results.append((test_name, True, metrics))
@@ -1114,252 +4253,246 @@ class IntegrationTester:
                 print(f"❌ {test_name}: FALLÓ")
                 self.test_results.append((test_name, False, metrics))
                 return False
-                
+    
         except Exception as e:
             self.performance_monitor.end_operation(test_name)
             print(f"❌ {test_name}: ERROR - {e}")
             self.test_results.append((test_name, False, {"error": str(e)}))
             return False
     
+    # ---------- casos límite ----------
+    
+    def test_nombres_especiales(self):
+        sistema = self.sistema_class()
+    
+        valid_names = ["normal", "con_guion", "con.pto", "123", "a"*50]
+        for name in valid_names:
+            if not sistema.crear_carpeta(name):
+                return False
+    
+        invalid_names = ["", "con/slash", "/raiz", "..", ".", " "*5]
+        for name in invalid_names:
+            sistema.crear_carpeta(name)
+            if sistema.nodo_actual.buscar_por_nombre(name):
+                return False
+    
+        return True
+    
+    def test_rutas_profundas(self):
+        sistema = self.sistema_class()
+    
+        depth = 20
+        current = sistema.raiz
+        path = ["root"]
+    
+        for i in range(depth):
+            folder_name = f"nivel_{i}"
+            sistema.nodo_actual = current
+            sistema.ruta_actual = path
+    
+            nueva = sistema.crear_carpeta(folder_name)
+            if not nueva:
+                return False
+    
+            current = nueva
+            path.append(folder_name)
+    
+        sistema.cambiar_directorio("/")
+        return sistema.ruta_completa() == "/root"
+    
+    def test_papelera_estres(self):
+        sistema = self.sistema_class()
+    
+        num_files = 20
+        for i in range(num_files):
+            sistema.crear_archivo(f"temp_{i}.txt", f"content {i}")
+            sistema.eliminar_nodo(f"temp_{i}.txt")
+    
+        items = sistema.papelera.listar()
+        if len(items) != num_files:
+            return False
+    
+        for i in range(5):
+            if not sistema.restaurar_de_papelera(0):
+                return False
+    
+        if not sistema.vaciar_papelera():
+            return False
+    
+        return len(sistema.papelera.items) == 0
+    
+    def test_busqueda_masiva(self):
+        sistema = self.sistema_class()
+        generator = TreeGenerator(seed=42)
+    
+        generator.generate_random_tree(sistema, max_depth=6, max_children=6,
+                                     max_files_per_folder=3)
+        nodos = list(sistema.raiz.recorrer())
+        if len(nodos) < 2:
+            return False
+    
+        # Los índices deben dar lo mismo que recorrer el árbol, sea cual sea la semilla
+        esperados = {n.id for n in nodos if "file" in n.nombre.lower()}
+        if {r["id"] for r in sistema.buscar_por_patron("file")} != esperados:
+            return False
+    
+        for nombre in {n.nombre for n in nodos}:
+            if {n.id for n in sistema.buscar_exacto(nombre)} != {n.id for n in nodos if n.nombre == nombre}:
+                return False
+    
+        prefijados = sorted({n.nombre for n in nodos if n.nombre.startswith("dir")})
+        return sistema.autocompletar("dir") == prefijados[:10]
+    
+    # ---------- performance ----------
+    
+    def test_performance_pequeno(self):
+        sistema = self.sistema_class()
+        generator = TreeGenerator(seed=1)
+    
+        generator.generate_random_tree(sistema, max_depth=3, max_children=3)
+    
+        sistema.buscar_por_patron("file")
+        sistema.autocompletar("dir")
+        sistema.exportar_preorden("test_small_perf.txt")
+    
+        if os.path.exists("test_small_perf.txt"):
+            os.remove("test_small_perf.txt")
+    
+        return True
+    
+    def test_performance_mediano(self):
+        sistema = self.sistema_class()
+        generator = TreeGenerator(seed=2)
+    
+        generator.generate_random_tree(sistema, max_depth=4, max_children=4)
+    
+        sistema.buscar_por_patron("file")
+        sistema.autocompletar("dir")
+    
+        return True
+    
+    def test_operaciones_individuales(self):
+        sistema = self.sistema_class()
+    
+        for i in range(50):
+            sistema.crear_archivo(f"perf_file_{i}.txt", "test")
+    
+        for i in range(10):
+            sistema.buscar_por_patron(f"perf_file_{i}")
+    
+        sistema.crear_carpeta("perf_folder")
+        for i in range(20):
+            sistema.mover_nodo(f"perf_file_{i}.txt", "perf_folder")
+    
+        return True
+    
+    def test_suite_benchmarks(self):
+        # Suite de benchmarks reducida: todas las formas y operaciones con 1000 nodos
+        suite = BenchmarkSuite(sizes=(1_000,), warmup=0, repeats=1, samples=20,
+                               track_memory=False, verbose=False)
+        resultados = suite.run()
+        esperadas = len(suite.shapes) * (len(suite.operations) + 1)
+        return len(resultados["results"]) == esperadas and all(
+            fila["median_ms"] >= 0 for fila in resultados["results"])
+    
+    # ---------- integración ----------
+    
+    def test_integracion(self):
+        sistema = self.sistema_class()
+        sistema.archivo_persistencia = "integration_test.json"
+        sistema.backups.intervalo = None
+    
+        sistema.crear_carpeta("Docs")
+        sistema.crear_carpeta("Media")
+    
+        sistema.cambiar_directorio("Docs")
+        sistema.crear_archivo("report.pdf", "PDF content")
+        sistema.crear_archivo("notes.txt", "Important notes")
+        sistema.crear_carpeta("Projects")
+    
+        sistema.cambiar_directorio("Projects")
+        sistema.crear_archivo("project1.txt", "Project 1")
+        sistema.crear_archivo("project2.txt", "Project 2")
+    
+        sistema.cambiar_directorio("/Docs/Projects")
+        sistema.renombrar_nodo("project1.txt", "project1_renamed.txt")
+        sistema.mover_nodo("project2.txt", "..")
+    
+        sistema.cambiar_directorio("/Docs")
+        if not sistema.nodo_actual.buscar_por_nombre("project2.txt"):
+            return False
+    
+        sistema.eliminar_nodo("project2.txt")
+        sistema.eliminar_nodo("notes.txt")
+    
+        if len(sistema.papelera.items) != 2:
+            return False
+    
+        sistema.restaurar_de_papelera(0)
+    
+        resultados = sistema.buscar_por_patron("proj")
+        if len(resultados) == 0:
+            return False
+    
+        if not sistema.guardar_a_json():
+            return False
+    
+        sistema2 = self.sistema_class()
+        sistema2.archivo_persistencia = "integration_test.json"
+    
+        if not sistema2.cargar_desde_json():
+            return False
+    
+        if sistema2.raiz.calcular_tamano() != sistema.raiz.calcular_tamano():
+            return False
+    
+        if not sistema2.exportar_preorden("integration_export.txt"):
+            return False
+    
+        for f in ["integration_test.json", "integration_export.txt", "trash.json", "trash.json.log"]:
+            if os.path.exists(f):
+                os.remove(f)
+    
+        return True
+    
+    # ---------- ejecución en serie ----------
+    
     def run_edge_case_tests(self):
         print(f"\n{'#'*80}")
         print("PRUEBAS DE CASOS LÍMITE")
         print(f"{'#'*80}")
-        
+    
         tests_passed = 0
         tests_total = 0
-        
-        # Test 1: Nombre con caracteres especiales
-        def test_nombres_especiales():
-            sistema = self.sistema_class()
-            
-            valid_names = ["normal", "con_guion", "con.pto", "123", "a"*50]
-            for name in valid_names:
-                if not sistema.crear_carpeta(name):
-                    return False
-            
-            invalid_names = ["", "con/slash", "/raiz", "..", ".", " "*5]
-            for name in invalid_names:
-                sistema.crear_carpeta(name)
-                if sistema.nodo_actual.buscar_por_nombre(name):
-                    return False
-            
-            return True
-        
-        tests_total += 1
-        if self.run_test("Nombres especiales", test_nombres_especiales):
-            tests_passed += 1
-        
-        # Test 2: Rutas muy profundas
-        def test_rutas_profundas():
-            sistema = self.sistema_class()
-            
-            depth = 20
-            current = sistema.raiz
-            path = ["root"]
-            
-            for i in range(depth):
-                folder_name = f"nivel_{i}"
-                sistema.nodo_actual = current
-                sistema.ruta_actual = path
-                
-                nueva = sistema.crear_carpeta(folder_name)
-                if not nueva:
-                    return False
-                
-                current = nueva
-                path.append(folder_name)
-            
-            sistema.cambiar_directorio("/")
-            return sistema.ruta_completa() == "/root"
-        
-        tests_total += 1
-        if self.run_test("Rutas profundas (20 niveles)", test_rutas_profundas):
-            tests_passed += 1
-        
-        # Test 3: Papelera con muchos elementos
-        def test_papelera_estres():
-            sistema = self.sistema_class()
-            
-            num_files = 20
-            for i in range(num_files):
-                sistema.crear_archivo(f"temp_{i}.txt", f"content {i}")
-                sistema.eliminar_nodo(f"temp_{i}.txt")
-            
-            items = sistema.papelera.listar()
-            if len(items) != num_files:
-                return False
-            
-            for i in range(5):
-                if not sistema.restaurar_de_papelera(0):
-                    return False
-            
-            if not sistema.vaciar_papelera():
-                return False
-            
-            return len(sistema.papelera.items) == 0
-        
-        tests_total += 1
-        if self.run_test("Papelera bajo estrés", test_papelera_estres):
-            tests_passed += 1
-        
-        # Test 4: Búsqueda en árbol grande
-        def test_busqueda_masiva():
-            sistema = self.sistema_class()
-            generator = TreeGenerator(seed=42)
-            
-            generator.generate_random_tree(sistema, max_depth=4, max_children=3, 
-                                         max_files_per_folder=2)
-            
-            resultados = sistema.buscar_por_patron("file")
-            if len(resultados) == 0:
-                return False
-            
-            all_nodes = sistema.indice_nombre
-            if not all_nodes:
-                return False
-            
-            some_name = list(all_nodes.keys())[0]
-            exact_results = sistema.buscar_exacto(some_name)
-            if len(exact_results) == 0:
-                return False
-            
-            suggestions = sistema.autocompletar("dir")
-            if len(suggestions) == 0:
-                return False
-            
-            return True
-        
-        tests_total += 1
-        if self.run_test("Búsqueda en árbol grande", test_busqueda_masiva):
-            tests_passed += 1
-        
+    
+        for test_name, method in self._tests("edge"):
+            tests_total += 1
+            if self.run_test(test_name, getattr(self, method)):
+                tests_passed += 1
+    
         print(f"\n{'#'*80}")
         print(f"RESUMEN CASOS LÍMITE: {tests_passed}/{tests_total} pruebas pasadas")
         print(f"{'#'*80}")
-        
+    
         return tests_passed, tests_total
     
     def run_performance_tests(self):
         print(f"\n{'#'*80}")
         print("PRUEBAS DE PERFORMANCE")
         print(f"{'#'*80}")
-        
-        # Test de performance con árbol pequeño
-        def test_performance_pequeno():
-            sistema = self.sistema_class()
-            generator = TreeGenerator(seed=1)
-            
-            generator.generate_random_tree(sistema, max_depth=3, max_children=3)
-            
-            sistema.search("file")
-            sistema.autocompletar("dir")
-            sistema.exportar_preorden("test_small_perf.txt")
-            
-            if os.path.exists("test_small_perf.txt"):
-                os.remove("test_small_perf.txt")
-            
-            return True
-        
-        self.run_test("Performance árbol pequeño", test_performance_pequeno)
-        
-        # Test de performance con árbol mediano
-        def test_performance_mediano():
-            sistema = self.sistema_class()
-            generator = TreeGenerator(seed=2)
-            
-            generator.generate_random_tree(sistema, max_depth=4, max_children=4)
-            
-            sistema.search("file")
-            sistema.autocompletar("dir")
-            
-            return True
-        
-        self.run_test("Performance árbol mediano", test_performance_mediano)
-        
-        # Test de operaciones individuales
-        def test_operaciones_individuales():
-            sistema = self.sistema_class()
-            
-            for i in range(50):
-                sistema.crear_archivo(f"perf_file_{i}.txt", "test")
-            
-            for i in range(10):
-                sistema.search(f"perf_file_{i}")
-            
-            sistema.crear_carpeta("perf_folder")
-            for i in range(20):
-                sistema.mover_nodo(f"perf_file_{i}.txt", "perf_folder")
-            
-            return True
-        
-        self.run_test("Operaciones individuales", test_operaciones_individuales)
-        
+    
+        for test_name, method in self._tests("performance"):
+            self.run_test(test_name, getattr(self, method))
+    
         self.performance_monitor.save_report("performance_tests_report.txt")
     
     def run_integration_test(self):
         print(f"\n{'#'*80}")
         print("PRUEBA DE INTEGRACIÓN COMPLETA")
         print(f"{'#'*80}")
-        
-        def integration_test():
-            sistema = self.sistema_class()
-            sistema.archivo_persistencia = "integration_test.json"
-            
-            sistema.crear_carpeta("Docs")
-            sistema.crear_carpeta("Media")
-            
-            sistema.cd("Docs")
-            sistema.crear_archivo("report.pdf", "PDF content")
-            sistema.crear_archivo("notes.txt", "Important notes")
-            sistema.crear_carpeta("Projects")
-            
-            sistema.cd("Projects")
-            sistema.crear_archivo("project1.txt", "Project 1")
-            sistema.crear_archivo("project2.txt", "Project 2")
-            
-            sistema.cd("/Docs/Projects")
-            sistema.renombrar_nodo("project1.txt", "project1_renamed.txt")
-            sistema.mover_nodo("project2.txt", "..")
-            
-            sistema.cd("/Docs")
-            if not sistema.buscar_por_nombre("project2.txt"):
-                return False
-            
-            sistema.eliminar_nodo("project2.txt")
-            sistema.eliminar_nodo("notes.txt")
-            
-            if len(sistema.papelera.items) != 2:
-                return False
-            
-            sistema.restaurar_de_papelera(0)
-            
-            resultados = sistema.search("proj")
-            if len(resultados) == 0:
-                return False
-            
-            if not sistema.guardar_a_json():
-                return False
-            
-            sistema2 = self.sistema_class()
-            sistema2.archivo_persistencia = "integration_test.json"
-            
-            if not sistema2.cargar_desde_json():
-                return False
-            
-            if sistema2.raiz.calcular_tamano() != sistema.raiz.calcular_tamano():
-                return False
-            
-            if not sistema2.exportar_preorden("integration_export.txt"):
-                return False
-            
-            for f in ["integration_test.json", "integration_export.txt", "trash.json"]:
-                if os.path.exists(f):
-                    os.remove(f)
-            
-            return True
-        
-        if self.run_test("Integración completa", integration_test):
+    
+        if all([self.run_test(test_name, getattr(self, method))
+                for test_name, method in self._tests("integration")]):
             print(f"\n✅ PRUEBA DE INTEGRACIÓN COMPLETADA EXITOSAMENTE")
             return True
         else:
@@ -1370,19 +4503,108 @@ class IntegrationTester:
         print(f"\n{'='*80}")
         print("SUITE COMPLETA DE PRUEBAS - DÍAS 10-11")
         print(f"{'='*80}")
-        
+    
         start_time = time.time()
-        
+    
         edge_results = self.run_edge_case_tests()
         self.run_performance_tests()
         integration_result = self.run_integration_test()
-        
+    
         total_time = time.time() - start_time
-        
+    
         self.generate_final_report(total_time, edge_results, integration_result)
     
+    # ---------- ejecución en paralelo ----------
+    
+    def run_parallel(self, workers: Optional[int] = None, timeout: float = 300.0) -> bool:
+        """Ejecuta todas las pruebas en procesos aparte, cada una en su propio directorio temporal.
+    
+        Hay como mucho `workers` procesos a la vez (por defecto uno por núcleo).
+        Cada prueba usa un proceso nuevo, de modo que ni el directorio de trabajo
+        ni el estado global se comparten; la que supera `timeout` segundos se
+        termina y cuenta como fallida. Genera el mismo reporte final que
+        `run_all_tests` y devuelve True si todas pasaron.
+        """
+        workers = max(1, min(workers or os.cpu_count() or 1, len(self.TESTS)))
+    
+        print(f"\n{'='*80}")
+        print(f"SUITE COMPLETA DE PRUEBAS - EN PARALELO ({workers} procesos)")
+        print(f"{'='*80}")
+    
+        start_time = time.time()
+    
+        pendientes = deque(enumerate(self.TESTS))
+        activos = {}   # conexión -> (índice, proceso, instante límite)
+        resultados = [None] * len(self.TESTS)
+    
+        while pendientes or activos:
+            while pendientes and len(activos) < workers:
+                indice, (_, _, method) = pendientes.popleft()
+                recibir, enviar = multiprocessing.Pipe(duplex=False)
+                proceso = multiprocessing.Process(target=_ejecutar_prueba_aislada,
+                                                  args=(type(self), self.sistema_class, method, enviar),
+                                                  name=f"prueba-{method}", daemon=True)
+                proceso.start()
+                enviar.close()
+                activos[recibir] = (indice, proceso, time.monotonic() + timeout)
+    
+            espera = max(0.0, min(limite for _, _, limite in activos.values()) - time.monotonic())
+            for conexion in multiprocessing.connection.wait(list(activos), espera):
+                indice, proceso, _ = activos.pop(conexion)
+                try:
+                    resultado = conexion.recv()
+                except EOFError:
+                    proceso.join()
+                    resultado = (False, 0, f"el proceso terminó con código {proceso.exitcode}", "")
+                conexion.close()
+                proceso.join()
+                resultados[indice] = resultado
+                self._print_parallel_result(self.TESTS[indice][1], resultado)
+    
+            ahora = time.monotonic()
+            for conexion, (indice, proceso, limite) in list(activos.items()):
+                if ahora >= limite:
+                    proceso.terminate()
+                    proceso.join()
+                    conexion.close()
+                    del activos[conexion]
+                    resultado = (False, int(timeout * 1e9), f"superó el límite de {timeout:g} s", "")
+                    resultados[indice] = resultado
+                    self._print_parallel_result(self.TESTS[indice][1], resultado)
+    
+        total_time = time.time() - start_time
+    
+        # Se agregan en el orden de TESTS, no en el de finalización
+        edge_passed = edge_total = 0
+        integration_result = True
+        for (group, test_name, _), (passed, elapsed_ns, error, _) in zip(self.TESTS, resultados):
+            self.performance_monitor.record(test_name, elapsed_ns)
+            metrics = {"error": error} if error else {"operation": test_name, "time_ms": elapsed_ns / 1e6}
+            self.test_results.append((test_name, passed, metrics))
+            if group == "edge":
+                edge_total += 1
+                edge_passed += passed
+            elif group == "integration":
+                integration_result = integration_result and passed
+    
+        self.performance_monitor.save_report("performance_tests_report.txt")
+        self.generate_final_report(total_time, (edge_passed, edge_total), integration_result, workers)
+    
+        return all(passed for _, passed, _ in self.test_results)
+    
+    def _print_parallel_result(self, test_name: str, resultado: tuple):
+        passed, elapsed_ns, error, salida = resultado
+        if passed:
+            print(f"✅ {test_name}: PASÓ ({elapsed_ns / 1e6:.2f} ms)")
+            return
+        print(f"❌ {test_name}: " + (f"ERROR - {error}" if error else "FALLÓ") +
+              f" ({elapsed_ns / 1e6:.2f} ms)")
+        lineas = salida.rstrip().splitlines()
+        for linea in lineas[-20:]:
+            print(f"    | {linea}")
+    
     def generate_final_report(self, total_time: float, edge_results: tuple, 
-                            integration_result: bool):
+                            integration_result: bool, workers: Optional[int] = None):
         edge_passed, edge_total = edge_results
         
         report = []
@@ -1391,6 +4613,8 @@ class IntegrationTester:
         report.append("=" * 80)
         report.append(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         report.append(f"Tiempo total de ejecución: {total_time:.2f} segundos")
+        if workers:
+            report.append(f"Ejecución en paralelo: {workers} procesos, un directorio temporal por prueba")
         report.append("")
         
         report.append("RESUMEN DE PRUEBAS:")
@@ -1439,19 +4663,49 @@ class IntegrationTester:
         
         print(f"\nReporte final guardado en 'test_final_report.txt'")
 
+def _ejecutar_prueba_aislada(tester_class, sistema_class, method: str, conexion):
+    """Proceso hijo de IntegrationTester.run_parallel: corre una prueba en un directorio temporal.
+    
+    Envía por `conexion` (pasó, ns, error, salida capturada).
+    """
+    salida = io.StringIO()
+    passed, error, elapsed_ns = False, None, 0
+    with tempfile.TemporaryDirectory(prefix="prueba_") as directorio:
+        anterior = os.getcwd()
+        os.chdir(directorio)
+        try:
+            with redirect_stdout(salida), redirect_stderr(salida):
+                tester = tester_class(sistema_class)
+                inicio = time.perf_counter_ns()
+                try:
+                    passed = bool(getattr(tester, method)())
+                except Exception as e:
+                    error = str(e)
+                elapsed_ns = time.perf_counter_ns() - inicio
+                RegistroAsincrono.cerrar_todos()
+        finally:
+            os.chdir(anterior)
+    conexion.send((passed, elapsed_ns, error, salida.getvalue()))
+    conexion.close()
+
 # ==================== FUNCIONES PRINCIPALES ====================
 def limpiar_archivos_prueba():
     """Limpia archivos generados por las pruebas."""
     test_files = [
         "test_stress.json", "test_fast_operations.txt", "test_small_perf.txt",
-        "integration_test.json", "integration_export.txt", "trash.json",
+        "integration_test.json", "integration_export.txt", "trash.json", "trash.json.log",
         "performance_tests_report.txt", "test_final_report.txt",
-        "test_interfaz.json", "test_busqueda.json", "sistema.log",
+        "test_interfaz.json", "test_busqueda.json", "sistema.log", "sistema.log.1",
+        "sistema.log.2", "sistema.log.3",
         "preorden.txt", "sistema.json"
     ]
     
     test_files += [f for f in os.listdir() if f.startswith("backup_")]
     
+    if os.path.isdir("backups"):
+        shutil.rmtree("backups")
+        print("Eliminado: backups/")
+    
     for file in test_files:
         if os.path.exists(file):
             try:
@@ -1460,20 +4714,189 @@ def limpiar_archivos_prueba():
             except Exception as e:
                 print(f"No se pudo eliminar {file}: {e}")
 
-def ejecutar_pruebas_completas():
-    """Ejecuta la suite completa de pruebas."""
+def ejecutar_pruebas_completas(procesos: Optional[int] = None, limite: float = 300.0):
+    """Ejecuta la suite completa de pruebas.
+    
+    Con `procesos` distinto de None las pruebas se reparten en procesos aislados
+    (0 = uno por núcleo), cada una con `limite` segundos como máximo.
+    """
     tester = IntegrationTester(SistemaArchivos)
     
     try:
+        if procesos is not None:
+            return tester.run_parallel(procesos or None, limite)
         tester.run_all_tests()
         return True
     except Exception as e:
         print(f"Error ejecutando pruebas: {e}")
         return False
 
+def _escribir_json_sintetico(archivo: str, num_nodos: int, archivos_por_carpeta: int = 1000):
+    """Escribe un sistema.json de `num_nodos` nodos sin construir el diccionario en memoria."""
+    with open(archivo, "w", encoding="utf-8") as f:
+        f.write('{"version": "1.0", "next_id": %d, "raiz": ' % (num_nodos + 1))
+        f.write('{"id": "0", "nombre": "root", "tipo": "carpeta", "contenido": null, "children": [')
+        creados = 1
+        carpeta = 0
+        while creados < num_nodos:
+            if carpeta:
+                f.write(", ")
+            f.write('{"id": "%d", "nombre": "carpeta_%d", "tipo": "carpeta", "contenido": null, "children": ['
+                    % (creados, carpeta))
+            creados += 1
+            hijos = min(archivos_por_carpeta, num_nodos - creados)
+            f.write(", ".join(
+                '{"id": "%d", "nombre": "archivo_%d.txt", "tipo": "archivo", "contenido": ""}'
+                % (creados + i, i) for i in range(hijos)
+            ))
+            creados += hijos
+            f.write("]}")
+            carpeta += 1
+        f.write("]}}")
+
+def _arbol_sintetico(num_nodos: int, archivos_por_carpeta: int = 1000) -> Nodo:
+    """Árbol de dos niveles (carpetas con archivos) construido directamente con Nodo."""
+    raiz = Nodo("0", "root", NodeType.FOLDER.value)
+    carpeta = raiz
+    for i in range(1, num_nodos):
+        if i % archivos_por_carpeta == 1:
+            carpeta = Nodo(str(i), f"carpeta_{i // archivos_por_carpeta}", NodeType.FOLDER.value)
+            raiz.agregar_hijo(carpeta)
+        else:
+            carpeta.agregar_hijo(Nodo(str(i), f"archivo_{i % archivos_por_carpeta}.txt",
+                                      NodeType.FILE.value, f"contenido {i}"))
+    return raiz
+
+def benchmark_almacenamiento(tamanos: Tuple[int, ...] = (1_000_000, 5_000_000)):
+    """Mide bytes por nodo y tiempo de carga de `cargar_desde_json` para cada tamaño."""
+    resultados = []
+    for num_nodos in tamanos:
+        tracemalloc.start()
+        raiz = _arbol_sintetico(num_nodos)
+        bytes_arbol, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del raiz
+        
+        archivo = f"bench_almacenamiento_{num_nodos}.json"
+        _escribir_json_sintetico(archivo, num_nodos)
+        sistema = SistemaArchivos()
+        inicio = time.perf_counter()
+        sistema.cargar_desde_json(archivo)
+        tiempo_carga = time.perf_counter() - inicio
+        os.remove(archivo)
+        del sistema
+        
+        resultado = {
+            "nodos": num_nodos,
+            "bytes_por_nodo": bytes_arbol / num_nodos,
+            "tiempo_carga_s": tiempo_carga
+        }
+        resultados.append(resultado)
+        print(f"{Colors.CYAN}{num_nodos:>10} nodos: {resultado['bytes_por_nodo']:.1f} bytes/nodo "
+              f"(árbol sin índices), carga JSON en {tiempo_carga:.2f} s{Colors.RESET}")
+    
+    return resultados
+
+def benchmark_arranque(tamanos: Tuple[int, ...] = (100_000, 1_000_000)):
+    """Compara el tiempo hasta el primer prompt (cargar + ls) entre JSON e instantánea binaria."""
+    resultados = []
+    for num_nodos in tamanos:
+        origen = SistemaArchivos()
+        origen.raiz = origen.nodo_actual = _arbol_sintetico(num_nodos)
+        origen.next_id = num_nodos + 1
+        tiempos = {}
+        for extension in (".json", ".bin"):
+            archivo = f"bench_arranque_{num_nodos}{extension}"
+            origen.guardar(archivo)
+            inicio = time.perf_counter()
+            sistema = SistemaArchivos()
+            sistema.cargar(archivo)
+            sistema.listar_hijos()
+            tiempos[extension] = time.perf_counter() - inicio
+            del sistema
+            os.remove(archivo)
+        
+        resultado = {"nodos": num_nodos, "json_s": tiempos[".json"], "binario_s": tiempos[".bin"]}
+        resultados.append(resultado)
+        print(f"{Colors.CYAN}{num_nodos:>10} nodos: JSON {resultado['json_s']:.3f} s, "
+              f"binario {resultado['binario_s']:.3f} s "
+              f"(x{resultado['json_s'] / max(resultado['binario_s'], 1e-9):.0f}){Colors.RESET}")
+    
+    return resultados
+
+def benchmark_rutas(profundidad: int = 1000, anchura: int = 100_000, repeticiones: int = 10_000):
+    """Mide resolución de rutas (fría y cacheada) en una cadena profunda y en una carpeta ancha."""
+    sistema = SistemaArchivos()
+    profunda = sistema.raiz
+    for i in range(profundidad):
+        carpeta = Nodo(str(sistema.next_id), f"nivel_{i}", NodeType.FOLDER.value)
+        sistema.next_id += 1
+        profunda.agregar_hijo(carpeta)
+        sistema._indexar(carpeta)
+        profunda = carpeta
+    ancha = Nodo(str(sistema.next_id), "ancha", NodeType.FOLDER.value)
+    sistema.next_id += 1
+    sistema.raiz.agregar_hijo(ancha)
+    sistema._indexar(ancha)
+    for i in range(anchura):
+        archivo = Nodo(str(sistema.next_id), f"archivo_{i}", NodeType.FILE.value)
+        sistema.next_id += 1
+        ancha.agregar_hijo(archivo)
+        sistema._indexar(archivo)
+    
+    ruta_profunda = "/" + "/".join(f"nivel_{i}" for i in range(profundidad))
+    rng = random.Random(42)
+    rutas_anchas = [f"/ancha/archivo_{rng.randrange(anchura)}" for _ in range(repeticiones)] if anchura else []
+    
+    def medir(funcion, argumentos) -> float:
+        inicio = time.perf_counter()
+        for argumento in argumentos:
+            funcion(argumento)
+        return (time.perf_counter() - inicio) / max(len(argumentos), 1) * 1e6
+    
+    resultados = {}
+    resultados["ruta_profunda_fria_us"] = medir(sistema._obtener_ruta, [profunda])
+    resultados["ruta_profunda_cache_us"] = medir(sistema._obtener_ruta, [profunda] * repeticiones)
+    sistema._invalidar_rutas(sistema.raiz.buscar_por_nombre("nivel_0"))
+    resultados["cd_profundo_frio_us"] = medir(sistema.cambiar_directorio, [ruta_profunda])
+    resultados["cd_profundo_cache_us"] = medir(sistema.cambiar_directorio, [ruta_profunda] * repeticiones)
+    resultados["resolver_ancha_frio_us"] = medir(sistema.buscar_por_ruta, rutas_anchas)
+    resultados["resolver_ancha_cache_us"] = medir(sistema.buscar_por_ruta, rutas_anchas)
+    
+    print(f"{Colors.CYAN}Profundidad {profundidad}, anchura {anchura}:{Colors.RESET}")
+    for clave, valor in resultados.items():
+        print(f"  {clave:<26} {valor:>10.2f}")
+    return resultados
+
+def benchmark_suite(tamanos: Tuple[int, ...] = BenchmarkSuite.DEFAULT_SIZES,
+                    formas: Tuple[str, ...] = TreeGenerator.SHAPES, repeticiones: int = 5,
+                    salida: str = "benchmark_results.json", base: Optional[str] = None,
+                    umbral: float = 0.10) -> bool:
+    """Ejecuta BenchmarkSuite, guarda el JSON y, con `base`, falla si hay regresiones mayores que `umbral`."""
+    suite = BenchmarkSuite(sizes=tamanos, shapes=formas, repeats=repeticiones)
+    resultados = suite.run()
+    BenchmarkSuite.save(resultados, salida)
+    print(f"{Colors.GREEN}Resultados guardados en '{salida}'{Colors.RESET}")
+    
+    for curva in resultados["scaling"]:
+        if curva["slopes"]:
+            print(f"  {curva['shape']:<9} {curva['operation']:<18} pendientes "
+                  + ", ".join(f"{p:.2f}" for p in curva["slopes"]))
+    
+    if base is None:
+        return True
+    regresiones = BenchmarkSuite.compare(resultados, BenchmarkSuite.load(base), umbral)
+    for r in regresiones:
+        print(f"{Colors.RED}REGRESIÓN {r['shape']} {r['nodes']} {r['operation']}: "
+              f"{r['baseline_ms']:.4f} -> {r['current_ms']:.4f} ms (x{r['ratio']:.2f}){Colors.RESET}")
+    if not regresiones:
+        print(f"{Colors.GREEN}Sin regresiones frente a '{base}' (umbral {umbral:.0%}){Colors.RESET}")
+    return not regresiones
+
 def main_interfaz():
     """Función principal del programa - Modo interactivo."""
-    sistema = SistemaArchivos()
+    presentador = PresentadorConsola()
+    sistema = SistemaArchivos(presentador)
     
     print(f"\n{Colors.CYAN}{'='*70}{Colors.RESET}")
     print(f"{Colors.BOLD}SISTEMA DE ARCHIVOS JERÁRQUICO - DÍAS 1-11 COMPLETOS{Colors.RESET}")
@@ -1484,10 +4907,18 @@ def main_interfaz():
     if os.path.exists(sistema.archivo_persistencia):
         respuesta = input(f"¿Cargar sistema existente desde '{sistema.archivo_persistencia}'? (s/n): ").lower()
         if respuesta == 's':
-            sistema.cargar_desde_json()
+            sistema.cargar()
     else:
         print(f"{Colors.YELLOW}No se encontró sistema existente. Iniciando nuevo sistema.{Colors.RESET}")
     
+    def _opcion(args, bandera, defecto=None):
+        """Valor que sigue a `bandera` en los argumentos, o `defecto`."""
+        if bandera in args:
+            idx = args.index(bandera)
+            if idx + 1 < len(args):
+                return args[idx + 1]
+        return defecto
+    
     # Diccionario de comandos
     comandos = {
         # Navegación y visualización
@@ -1505,35 +4936,77 @@ def main_interfaz():
         
         # Papelera
         "trash": lambda args: sistema.mostrar_papelera(),
-        "restore": lambda args: sistema.restaurar_de_papelera(int(args[0])) if args and args[0].isdigit() else print(f"{Colors.RED}Uso: restore <índice>{Colors.RESET}"),
+        "restore": lambda args: (
+            sistema.restaurar_de_papelera(int(args[0]) if args[0].isdigit() else args[0])
+            if args else print(f"{Colors.RED}Uso: restore <índice|id|ruta_original>{Colors.RESET}")
+        ),
         "emptytrash": lambda args: sistema.vaciar_papelera(),
         
         # Búsqueda
         "search": lambda args: print("Ejecute 'search' desde la interfaz interactiva o use --test"),
         "autocomplete": lambda args: (
-            sistema.autocomplete(args[0], int(args[1]) if len(args) > 1 else 5) 
-            if args else print(f"{Colors.RED}Uso: autocomplete <prefijo> [límite]{Colors.RESET}")
+            print("\n".join(sistema.autocompletar(
+                args[0],
+                int(args[1]) if len(args) > 1 and args[1].isdigit() else 5,
+                Trie.ORDEN_POPULARIDAD if "--popular" in args else Trie.ORDEN_LEXICOGRAFICO
+            )) or f"{Colors.YELLOW}Sin sugerencias para '{args[0]}'{Colors.RESET}")
+            if args else print(f"{Colors.RED}Uso: autocomplete <prefijo> [límite] [--popular]{Colors.RESET}")
+        ),
+        "fuzzy": lambda args: (
+            print("\n".join(f"{r['ruta']} {Colors.MAGENTA}(distancia {r['distancia']}){Colors.RESET}"
+                            for r in sistema.buscar_difuso(args[0], int(args[1]) if len(args) > 1 and args[1].isdigit() else 2))
+                  or f"{Colors.YELLOW}Sin nombres parecidos a '{args[0]}'{Colors.RESET}")
+            if args else print(f"{Colors.RED}Uso: fuzzy <nombre> [distancia_máxima]{Colors.RESET}")
+        ),
+        "find": lambda args: (
+            print("\n".join(f"{r['ruta']} {Colors.MAGENTA}({r['tipo']}){Colors.RESET}" for r in sistema.encontrar(args[0]))
+                  or f"{Colors.YELLOW}No se encontró '{args[0]}'{Colors.RESET}")
+            if args else print(f"{Colors.RED}Uso: find <nombre_exacto|ruta>{Colors.RESET}")
         ),
-        "find": lambda args: sistema.find(args[0]) if args else print(f"{Colors.RED}Uso: find <nombre_exacto>{Colors.RESET}"),
         
         # Exportación y estadísticas
-        "export": lambda args: sistema.exportar_preorden(args[0] if args else "preorden.txt"),
+        "export": lambda args: sistema.exportar(
+            args[0] if args and not args[0].startswith("--") else "preorden.txt",
+            _opcion(args, "--orden", Nodo.RECORRIDO_PREORDEN),
+            _opcion(args, "--formato"),
+            subarbol=("--aqui" in args)
+        ),
         "stats": lambda args: sistema.mostrar_estadisticas(),
+        "perf": lambda args: (
+            sistema.mostrar_rendimiento() if not args
+            else print(f"{Colors.GREEN}Instrumentación "
+                       f"{'activada' if sistema.instrumentar(args[0] == 'on') else 'desactivada'}.{Colors.RESET}")
+            if args[0] in ("on", "off")
+            else sistema.reiniciar_rendimiento() if args[0] == "reset"
+            else sistema.exportar_rendimiento(args[1] if len(args) > 1 else "rendimiento.json") if args[0] == "export"
+            else print(f"{Colors.RED}Uso: perf [on|off|reset|export <archivo>]{Colors.RESET}")
+        ),
         "history": lambda args: sistema.history(int(args[0]) if args and args[0].isdigit() else 5),
         
         # Sistema
-        "log": lambda args: sistema.toggle_log({"on": True, "off": False}.get(args[0] if args else None)),
-        "clear": lambda args: sistema.clear_screen(),
-        "save": lambda args: sistema.guardar_a_json(args[0] if args else None),
-        "load": lambda args: sistema.cargar_desde_json(args[0] if args else None),
-        "help": lambda args: sistema.mostrar_ayuda(args[0] if args else None),
+        "log": lambda args: (
+            sistema.nivel_log(args[0]) if args and args[0] not in ("on", "off")
+            else sistema.toggle_log({"on": True, "off": False}.get(args[0] if args else None))
+        ),
+        "clear": lambda args: presentador.clear_screen(),
+        "save": lambda args: sistema.guardar(args[0] if args else None),
+        "compact": lambda args: sistema.compactar_diario(),
+        "backups": lambda args: (
+            sistema.restaurar_backup(int(args[1])) if len(args) == 2 and args[0] == "restore" and args[1].isdigit()
+            else sistema.podar_backups() if args == ["prune"]
+            else sistema.crear_backup() if args == ["create"]
+            else sistema.mostrar_backups() if not args
+            else print(f"{Colors.RED}Uso: backups [create | restore <índice> | prune]{Colors.RESET}")
+        ),
+        "load": lambda args: sistema.cargar(args[0] if args else None),
+        "help": lambda args: presentador.mostrar_ayuda(args[0] if args else None),
         "exit": None,
     }
     
     # Bucle principal
     while True:
         try:
-            entrada = input(sistema.obtener_prompt()).strip()
+            entrada = input(presentador.obtener_prompt(sistema)).strip()
             if not entrada:
                 continue
             
@@ -1541,12 +5014,19 @@ def main_interfaz():
             if entrada.startswith("search "):
                 partes = entrada.split()
                 if len(partes) < 2:
-                    print(f"{Colors.RED}Uso: search <término> [--exact] [--type dir/file]{Colors.RESET}")
+                    print(f"{Colors.RED}Uso: search <término|glob> [--exact] [--case] [--type dir/file] [--limit N]{Colors.RESET}")
                     continue
                 
                 termino = partes[1]
                 exacto = "--exact" in partes
+                sensible = "--case" in partes
                 tipo = None
+                limite = None
+                
+                if "--limit" in partes:
+                    idx = partes.index("--limit")
+                    if idx + 1 < len(partes) and partes[idx + 1].isdigit():
+                        limite = int(partes[idx + 1])
                 
                 if "--type" in partes:
                     idx = partes.index("--type")
@@ -1561,7 +5041,7 @@ def main_interfaz():
                 if exacto:
                     resultados = sistema.buscar_exacto(termino)
                 else:
-                    resultados_dict = sistema.buscar_por_patron(termino, tipo)
+                    resultados_dict = sistema.buscar_por_patron(termino, tipo, limite, sensible)
                     resultados = [sistema.buscar_por_id(r["id"]) for r in resultados_dict]
                 
                 if not resultados:
@@ -1581,6 +5061,25 @@ def main_interfaz():
                             print(f"    Contenido: {contenido_preview}")
                 continue
             
+            # Manejo especial para grep: la consulta puede llevar frases entre comillas
+            if entrada.startswith("grep "):
+                consulta = entrada[5:]
+                limite = 10
+                coincidencia = re.search(r"\s--limit\s+(\d+)\s*$", consulta)
+                if coincidencia:
+                    limite = int(coincidencia.group(1))
+                    consulta = consulta[:coincidencia.start()]
+                
+                resultados = sistema.buscar_contenido(consulta, limite)
+                if not resultados:
+                    print(f"{Colors.YELLOW}Ningún archivo contiene '{consulta}'{Colors.RESET}")
+                    continue
+                
+                print(f"\n{Colors.CYAN}Archivos que contienen '{consulta}':{Colors.RESET}")
+                for i, r in enumerate(resultados, 1):
+                    print(f"{Colors.YELLOW}{i:2}.{Colors.RESET} {r['ruta']} {Colors.MAGENTA}({r['puntuacion']:.2f}){Colors.RESET}")
+                continue
+            
             # Comandos normales
             partes = entrada.split()
             comando = partes[0]
@@ -1589,7 +5088,7 @@ def main_interfaz():
             if comando == "exit":
                 respuesta = input(f"{Colors.YELLOW}¿Guardar cambios antes de salir? (s/n): {Colors.RESET}").lower()
                 if respuesta == 's':
-                    sistema.guardar_a_json()
+                    sistema.guardar()
                 print(f"{Colors.GREEN}Saliendo...{Colors.RESET}")
                 break
             elif comando in comandos:
@@ -1603,7 +5102,7 @@ def main_interfaz():
             print(f"\n{Colors.YELLOW}\nInterrupción detectada.{Colors.RESET}")
             respuesta = input(f"{Colors.YELLOW}¿Guardar cambios antes de salir? (s/n): {Colors.RESET}").lower()
             if respuesta == 's':
-                sistema.guardar_a_json()
+                sistema.guardar()
             print(f"{Colors.GREEN}Saliendo...{Colors.RESET}")
             break
         except Exception as e:
@@ -1618,6 +5117,21 @@ if __name__ == "__main__":
     parser.add_argument('--clean', action='store_true', help='Limpiar archivos de prueba')
     parser.add_argument('--mode', choices=['interactive', 'test'], default='interactive',
                        help='Modo de ejecución (interactive/test)')
+    parser.add_argument('--bench', choices=['almacenamiento', 'arranque', 'rutas', 'suite'],
+                       help='Ejecutar un benchmark')
+    parser.add_argument('--nodos', type=int, nargs='+',
+                       help='Tamaños de árbol para --bench (en rutas: profundidad y anchura)')
+    parser.add_argument('--formas', nargs='+', choices=TreeGenerator.SHAPES,
+                       help='Formas de árbol para --bench suite')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por operación en --bench suite')
+    parser.add_argument('--salida', default='benchmark_results.json', help='JSON de resultados de --bench suite')
+    parser.add_argument('--base', help='JSON de una ejecución anterior con el que comparar --bench suite')
+    parser.add_argument('--umbral', type=float, default=0.10,
+                       help='Empeoramiento relativo tolerado frente a --base (0.10 = 10%%)')
+    parser.add_argument('--paralelo', type=int, nargs='?', const=0, metavar='N',
+                       help='Con --test: repartir las pruebas en N procesos aislados (sin N, uno por núcleo)')
+    parser.add_argument('--limite-tiempo', type=float, default=300.0, metavar='SEG',
+                       help='Segundos máximos por prueba con --paralelo')
     
     args = parser.parse_args()
     
@@ -1625,9 +5139,27 @@ if __name__ == "__main__":
         limpiar_archivos_prueba()
         sys.exit(0)
     
+    if args.bench == 'almacenamiento':
+        benchmark_almacenamiento(tuple(args.nodos) if args.nodos else (1_000_000, 5_000_000))
+        sys.exit(0)
+    
+    if args.bench == 'arranque':
+        benchmark_arranque(tuple(args.nodos) if args.nodos else (100_000, 1_000_000))
+        sys.exit(0)
+    
+    if args.bench == 'rutas':
+        benchmark_rutas(*(args.nodos or ())[:2])
+        sys.exit(0)
+    
+    if args.bench == 'suite':
+        correcto = benchmark_suite(tuple(args.nodos) if args.nodos else BenchmarkSuite.DEFAULT_SIZES,
+                                   tuple(args.formas) if args.formas else TreeGenerator.SHAPES,
+                                   args.repeticiones, args.salida, args.base, args.umbral)
+        sys.exit(0 if correcto else 1)
+    
     if args.test or args.mode == 'test':
         print(f"{Colors.CYAN}Ejecutando pruebas automáticas...{Colors.RESET}")
-        if ejecutar_pruebas_completas():
+        if ejecutar_pruebas_completas(args.paralelo, args.limite_tiempo):
             print(f"{Colors.GREEN} Todas las pruebas completadas exitosamente{Colors.RESET}")
         else:
             print(f"{Colors.RED} Algunas pruebas fallaron{Colors.RESET}")